@@ -11,11 +11,15 @@ from pydantic import BaseModel
 from datetime import datetime
 
 # Importar utilidades locales
-from utils.leer_excel import procesar_archivo_excel
-from utils.categorizar import aplicar_categorizacion
+from utils.leer_excel import procesar_archivo_excel, procesar_archivos_en_paralelo
+from utils.categorizar import aplicar_categorizacion, registro_reglas
 from utils.fechas import agregar_columnas_tiempo, obtener_rango_fechas, obtener_periodos_disponibles
 from utils.agregaciones import calcular_todas_agregaciones
 from utils.bd import DatabaseManager
+from utils.clasificador import registro_clasificador
+
+# Archivo del modelo aprendido de sobrescrituras manuales (junto a la base de datos)
+RUTA_MODELO_CATEGORIAS = "data/modelo_categorias.npz"
 
 # Modelos Pydantic para requests
 class CategoriaUpdate(BaseModel):
@@ -71,6 +75,12 @@ async def lifespan(app: FastAPI):
     # Startup
     try:
         db_manager = DatabaseManager()
+        # Las reglas personalizadas se leen con esta misma conexión, una vez por cambio
+        registro_reglas.configurar_origen(db_manager.obtener_categorias_custom)
+        # Modelo aprendido de las sobrescrituras manuales; se entrena si aún no existe
+        registro_clasificador.configurar_ruta(RUTA_MODELO_CATEGORIAS)
+        if not registro_clasificador.existe_archivo:
+            db_manager.entrenar_clasificador()
         print("Base de datos inicializada correctamente")
     except Exception as e:
         print(f"Warning: No se pudo inicializar la base de datos: {e}")
@@ -151,7 +161,7 @@ async def procesar_archivo(
             )
         
         # 2. Aplicar categorización
-        df = aplicar_categorizacion(df)
+        df = aplicar_categorizacion(df, db_manager=db_manager)
         
         # 3. Agregar columnas de tiempo
         df = agregar_columnas_tiempo(df)
@@ -344,10 +354,13 @@ async def obtener_estadisticas():
         })
 
 @app.post("/cargar-tef-locales/")
-async def cargar_archivos_tef_locales():
+async def cargar_archivos_tef_locales(
+    max_procesos: Optional[int] = Query(None, ge=1, description="Procesos para leer los archivos (por defecto, todos los núcleos)")
+):
     """
     Endpoint para cargar automáticamente todos los archivos TEF 
     que están en la carpeta data/load_excels/
+    Los archivos se leen en paralelo; la respuesta incluye filas, tiempo y error de cada uno.
     """
     load_excels_path = os.path.join(os.path.dirname(__file__), "data", "load_excels")
     
@@ -370,20 +383,10 @@ async def cargar_archivos_tef_locales():
         )
     
     try:
-        # Lista para almacenar todos los DataFrames
-        dataframes = []
-        archivos_procesados = []
-        
-        # Procesar cada archivo
-        for archivo_path in archivos_excel:
-            try:
-                df = procesar_archivo_excel(archivo_path)
-                if not df.empty:
-                    dataframes.append(df)
-                    archivos_procesados.append(os.path.basename(archivo_path))
-            except Exception as e:
-                print(f"Error procesando {archivo_path}: {e}")
-                continue
+        # Procesar los archivos en un pool de procesos
+        dataframes, estadisticas_archivos = procesar_archivos_en_paralelo(archivos_excel, max_procesos=max_procesos)
+        archivos_procesados = [e['archivo'] for e in estadisticas_archivos if not e['error'] and e['filas'] > 0]
+        archivos_con_error = [{'archivo': e['archivo'], 'error': e['error']} for e in estadisticas_archivos if e['error']]
         
         if not dataframes:
             raise HTTPException(
@@ -399,7 +402,8 @@ async def cargar_archivos_tef_locales():
         df_completo = df_completo.drop_duplicates(subset=columnas_clave, keep='first')
         
         # 2. Aplicar categorización
-        df_completo = aplicar_categorizacion(df_completo)
+        # Cargas grandes (varios años) se categorizan en paralelo; las pequeñas no pagan el pool
+        df_completo = aplicar_categorizacion(df_completo, db_manager=db_manager, paralelo=True)
         
         # 3. Agregar columnas de tiempo
         df_completo = agregar_columnas_tiempo(df_completo)
@@ -437,6 +441,8 @@ async def cargar_archivos_tef_locales():
             "status": "success",
             "message": f"Se procesaron {len(archivos_procesados)} archivos TEF correctamente",
             "archivos_procesados": archivos_procesados,
+            "estadisticas_archivos": estadisticas_archivos,
+            "archivos_con_error": archivos_con_error,
             "bd_status": bd_status,
             "rango_fechas": rango_fechas,
             "periodos_disponibles": periodos_disponibles,
@@ -532,6 +538,9 @@ async def obtener_transacciones(
                 'tipo': str(row['tipo']) if pd.notna(row['tipo']) else '',
                 'categoria': str(row['categoria']) if pd.notna(row['categoria']) else 'Sin categorizar',
                 'tipo_regla': str(row['tipo_regla']) if 'tipo_regla' in row and pd.notna(row['tipo_regla']) else 'mapeo_por_palabra_clave',
+                'palabra_regla': str(row['palabra_regla']) if 'palabra_regla' in row and pd.notna(row['palabra_regla']) else None,
+                'campo_regla': str(row['campo_regla']) if 'campo_regla' in row and pd.notna(row['campo_regla']) else None,
+                'posicion_regla': int(row['posicion_regla']) if 'posicion_regla' in row and pd.notna(row['posicion_regla']) else None,
                 'fecha_modificacion': row['fecha_modificacion'].strftime('%Y-%m-%d %H:%M:%S') if 'fecha_modificacion' in row and pd.notna(row['fecha_modificacion']) else None
             })
         
@@ -659,19 +668,48 @@ async def actualizar_categoria_transaccion(transaccion_id: int, categoria_update
 @app.get("/categorias/reglas/")
 async def obtener_reglas_categorizacion():
     """
-    Obtiene las reglas de categorización actuales (diccionario de palabras clave).
+    Obtiene las reglas de categorización vigentes: palabras clave predefinidas y
+    personalizadas, reglas condicionales y de expresiones regulares, con los
+    contadores de uso de la última corrida de categorización.
     """
     try:
-        from utils.categorizar import CATEGORIA_KEYWORDS
-        
-        # Convertir el diccionario a una estructura más amigable para el frontend
-        reglas = []
-        for categoria, palabras in CATEGORIA_KEYWORDS.items():
-            reglas.append({
-                'categoria': categoria,
-                'palabras_clave': palabras,
-                'total_palabras': len(palabras)
-            })
+        from utils.categorizar import aplica_a_tipos, particion_categoria
+        
+        # Contadores de uso de cada regla (si hay base de datos)
+        estadisticas = db_manager.obtener_estadisticas_reglas() if db_manager else {}
+        vigentes = registro_reglas.obtener()
+        
+        # Una entrada por categoría, con todas sus reglas
+        por_categoria = {}
+        
+        def entrada(categoria):
+            if categoria not in por_categoria:
+                particion = particion_categoria(categoria)
+                por_categoria[categoria] = {
+                    'categoria': categoria,
+                    'palabras_clave': [],
+                    'total_palabras': 0,
+                    'condiciones': None,
+                    'patrones': [],
+                    'particion': particion,
+                    'aplica_a_tipos': aplica_a_tipos(particion),
+                    'estadisticas': estadisticas.get(categoria, {
+                        'aciertos': 0, 'evaluaciones': 0, 'fallos': 0,
+                        'tasa_acierto': 0.0, 'palabras_mas_usadas': []
+                    })
+                }
+            return por_categoria[categoria]
+        
+        for categoria, palabras in vigentes.categorias.items():
+            entrada(categoria)['palabras_clave'] = list(palabras)
+        for categoria, palabras, condiciones in vigentes.condicionales:
+            entrada(categoria).update({'palabras_clave': list(palabras), 'condiciones': condiciones})
+        for _, categoria, patrones in vigentes.expresiones:
+            entrada(categoria)['patrones'] = list(patrones)
+        
+        reglas = list(por_categoria.values())
+        for regla in reglas:
+            regla['total_palabras'] = len(regla['palabras_clave'])
         
         # Ordenar por categoría
         reglas.sort(key=lambda x: x['categoria'])
@@ -693,9 +731,8 @@ async def obtener_transacciones_sin_categorizar():
         if not db_manager:
             raise HTTPException(status_code=503, detail="Base de datos no disponible")
         
-        # Obtener transacciones sin categorizar
-        df = db_manager.obtener_todas_transacciones()
-        df_sin_cat = df[df['categoria'] == "Sin categorizar"]
+        # Obtener transacciones sin categorizar (filtradas en la base de datos)
+        df_sin_cat = db_manager.obtener_transacciones_sin_categorizar()
         
         if df_sin_cat.empty:
             return JSONResponse(content={
@@ -705,12 +742,13 @@ async def obtener_transacciones_sin_categorizar():
             })
         
         # Importar función de sugerencias
-        from utils.categorizar import sugerir_categoria
+        from utils.categorizar import sugerir_categorias_lote
+        
+        # Sugerencias para todos los detalles en una pasada
+        lote = sugerir_categorias_lote(df_sin_cat['detalle'])
         
         transacciones = []
-        for _, row in df_sin_cat.iterrows():
-            # Generar sugerencia para cada transacción
-            sugerencia = sugerir_categoria(row['detalle'])
+        for row, sugerencia in zip(df_sin_cat.to_dict('records'), lote['sugerencias']):
             transacciones.append({
                 'id': int(row['id']) if 'id' in row and pd.notna(row['id']) else None,
                 'fecha': row['fecha'].strftime('%Y-%m-%d') if pd.notna(row['fecha']) and hasattr(row['fecha'], 'strftime') else str(row['fecha']) if pd.notna(row['fecha']) else None,
@@ -722,14 +760,46 @@ async def obtener_transacciones_sin_categorizar():
                 'tipo_regla': str(row['tipo_regla']) if 'tipo_regla' in row and pd.notna(row['tipo_regla']) else 'sin_coincidencias'
             })
         
+        # Ids de transacciones agrupados por categoría sugerida
+        sugerencias_por_categoria = {
+            categoria: [transacciones[posicion]['id'] for posicion in posiciones]
+            for categoria, posiciones in lote['por_categoria'].items()
+        }
+        
         return JSONResponse(content={
             "transacciones": transacciones,
-            "total": len(transacciones)
+            "total": len(transacciones),
+            "sugerencias_por_categoria": sugerencias_por_categoria
         })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener transacciones sin categorizar: {str(e)}")
 
+@app.get("/transacciones/sin-categorizar/analisis/")
+async def analizar_sin_categorizar():
+    """
+    Resume las transacciones sin categorizar por categoría sugerida: cantidad,
+    monto total y algunos ejemplos.
+    """
+    try:
+        if not db_manager:
+            raise HTTPException(status_code=503, detail="Base de datos no disponible")
+        
+        from utils.categorizar import analizar_transacciones_sin_categorizar
+        
+        df_sin_cat = db_manager.obtener_detalles_sin_categorizar()
+        analisis = analizar_transacciones_sin_categorizar(df_sin_cat)
+        
+        return JSONResponse(content={
+            "status": "success",
+            **analisis
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al analizar transacciones sin categorizar: {str(e)}")
+
 # =================== ENDPOINTS PARA CATEGORÍAS PERSONALIZADAS ===================
 
 @app.get("/categorias-custom/")
@@ -760,8 +830,17 @@ async def crear_categoria_custom(categoria_data: dict):
     Body JSON: {
         "nombre_categoria": "Gasto - Mascotas",
         "palabras_clave": ["veterinario", "comida perro", "petshop"],
-        "descripcion": "Gastos relacionados con mascotas"
+        "descripcion": "Gastos relacionados con mascotas",
+        "condiciones": {"monto_max": 50000, "dias_semana": [5, 6]},   (opcional)
+        "patrones": ["^PAGO\\s+TC\\s+\\d{4}"]   (opcional)
     }
+    
+    Condiciones disponibles: monto_min, monto_max, dias_mes, dias_semana (0 = lunes),
+    tipos, canales y prioridad. Con condiciones, las palabras clave solo aplican a
+    las transacciones que las cumplen y la regla prevalece sobre las demás.
+    Los patrones son expresiones regulares (sin distinguir mayúsculas) que se buscan
+    en el detalle, nombre de destino y comentario; prevalecen sobre las palabras
+    clave. Los patrones que pueden tardar demasiado se rechazan.
     """
     try:
         if not db_manager:
@@ -778,6 +857,12 @@ async def crear_categoria_custom(categoria_data: dict):
         if not isinstance(categoria_data["palabras_clave"], list):
             raise HTTPException(status_code=400, detail="Campo 'palabras_clave' debe ser una lista")
         
+        if not isinstance(categoria_data.get("condiciones") or {}, dict):
+            raise HTTPException(status_code=400, detail="Campo 'condiciones' debe ser un objeto")
+        
+        if not isinstance(categoria_data.get("patrones") or [], list):
+            raise HTTPException(status_code=400, detail="Campo 'patrones' debe ser una lista")
+        
         nombre_categoria = categoria_data["nombre_categoria"]
         palabras_clave = categoria_data["palabras_clave"]
         descripcion = categoria_data.get("descripcion", "")
@@ -786,7 +871,9 @@ async def crear_categoria_custom(categoria_data: dict):
         nueva_categoria = db_manager.crear_categoria_custom(
             nombre_categoria=nombre_categoria,
             palabras_clave=palabras_clave,
-            descripcion=descripcion
+            descripcion=descripcion,
+            condiciones=categoria_data.get("condiciones"),
+            patrones=categoria_data.get("patrones")
         )
         
         return JSONResponse(content={
@@ -800,6 +887,49 @@ async def crear_categoria_custom(categoria_data: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear categoría: {str(e)}")
 
+@app.post("/categorias-custom/simular/")
+async def simular_categoria_custom(simulacion_data: dict):
+    """
+    Muestra qué transacciones cambiarían de categoría al agregar o quitar palabras
+    clave de una categoría, sin modificar la base de datos. Compara las reglas
+    vigentes con las hipotéticas (incluidas las condicionales y las de expresiones
+    regulares), así una categoría guardada desactualizada no cuenta como cambio.
+    
+    Body JSON: {
+        "nombre_categoria": "Gasto - Mascotas",
+        "agregar": ["veterinario"],
+        "quitar": ["petshop"],
+        "max_ejemplos": 10
+    }
+    """
+    try:
+        if not db_manager:
+            raise HTTPException(status_code=503, detail="Base de datos no disponible")
+        
+        if "nombre_categoria" not in simulacion_data:
+            raise HTTPException(status_code=400, detail="Campo 'nombre_categoria' requerido")
+        
+        for campo in ("agregar", "quitar"):
+            if not isinstance(simulacion_data.get(campo, []), list):
+                raise HTTPException(status_code=400, detail=f"Campo '{campo}' debe ser una lista")
+        
+        simulacion = db_manager.simular_cambio_palabras(
+            nombre_categoria=simulacion_data["nombre_categoria"],
+            agregar=simulacion_data.get("agregar", []),
+            quitar=simulacion_data.get("quitar", []),
+            max_ejemplos=int(simulacion_data.get("max_ejemplos", 10))
+        )
+        
+        return JSONResponse(content={
+            "status": "success",
+            "simulacion": simulacion
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al simular cambio de categoría: {str(e)}")
+
 @app.put("/categorias-custom/{categoria_id}")
 async def actualizar_categoria_custom(categoria_id: int, categoria_data: dict):
     """
@@ -808,7 +938,9 @@ async def actualizar_categoria_custom(categoria_id: int, categoria_data: dict):
     Body JSON: {
         "nombre_categoria": "Nuevo nombre",
         "palabras_clave": ["nueva", "lista", "palabras"],
-        "descripcion": "Nueva descripción"
+        "descripcion": "Nueva descripción",
+        "condiciones": {"monto_max": 5000},   (opcional; {} quita las condiciones)
+        "patrones": ["^PAGO\\s+TC"]   (opcional; [] quita los patrones)
     }
     """
     try:
@@ -819,17 +951,27 @@ async def actualizar_categoria_custom(categoria_id: int, categoria_data: dict):
         nombre_categoria = categoria_data.get("nombre_categoria")
         palabras_clave = categoria_data.get("palabras_clave")
         descripcion = categoria_data.get("descripcion")
+        condiciones = categoria_data.get("condiciones")
+        patrones = categoria_data.get("patrones")
         
         # Validar que palabras_clave sea una lista si se proporciona
         if palabras_clave is not None and not isinstance(palabras_clave, list):
             raise HTTPException(status_code=400, detail="Campo 'palabras_clave' debe ser una lista")
         
+        if condiciones is not None and not isinstance(condiciones, dict):
+            raise HTTPException(status_code=400, detail="Campo 'condiciones' debe ser un objeto")
+        
+        if patrones is not None and not isinstance(patrones, list):
+            raise HTTPException(status_code=400, detail="Campo 'patrones' debe ser una lista")
+        
         # Actualizar la categoría
         categoria_actualizada = db_manager.actualizar_categoria_custom(
             categoria_id=categoria_id,
             nombre_categoria=nombre_categoria,
             palabras_clave=palabras_clave,
-            descripcion=descripcion
+            descripcion=descripcion,
+            condiciones=condiciones,
+            patrones=patrones
         )
         
         return JSONResponse(content={
@@ -906,24 +1048,26 @@ async def recategorizar_transacciones():
         if df.empty:
             raise HTTPException(status_code=400, detail="No hay transacciones para recategorizar")
         
+        # Las sobrescrituras manuales conservan su categoría
+        manuales = df['tipo_regla'] == "sobrescritura_manual"
+        df_automaticas = df[~manuales].copy()
+        
         # Aplicar nueva categorización
-        df_recategorizado = aplicar_categorizacion(df)
-        
-        # Actualizar cada transacción en la base de datos
-        transacciones_actualizadas = 0
-        for _, row in df_recategorizado.iterrows():
-            if 'id' in row and pd.notna(row['id']):
-                resultado = db_manager.actualizar_categoria_transaccion(
-                    transaccion_id=int(row['id']),
-                    nueva_categoria=row['categoria']
-                )
-                if resultado:
-                    transacciones_actualizadas += 1
+        df_recategorizado = aplicar_categorizacion(df_automaticas, db_manager=db_manager)
+        
+        # Escribir solo los cambios, en una única transacción
+        resumen = db_manager.actualizar_categorias_en_lote(zip(
+            df_recategorizado['id'], df_recategorizado['categoria'], df_recategorizado['tipo_regla'],
+            df_recategorizado['palabra_regla'], df_recategorizado['campo_regla'], df_recategorizado['posicion_regla']
+        ))
+        transacciones_actualizadas = resumen['actualizadas']
         
         return JSONResponse(content={
             "status": "success",
             "message": f"Se recategorizaron {transacciones_actualizadas} transacciones",
             "transacciones_actualizadas": transacciones_actualizadas,
+            "transacciones_sin_cambios": resumen['sin_cambios'],
+            "transacciones_manuales": int(manuales.sum()),
             "total_transacciones": len(df)
         })
         
@@ -944,6 +1088,9 @@ class TransaccionResponse(BaseModel):
     tipo: str
     categoria: str
     tipo_regla: str
+    palabra_regla: Optional[str] = None
+    campo_regla: Optional[str] = None
+    posicion_regla: Optional[int] = None
     fecha_modificacion: str
 
 if __name__ == "__main__":
@@ -1,31 +1,43 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, UniqueConstraint, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import pandas as pd
 import os
 
+from utils.comercios import normalizar_comercio, normalizar_texto_comercio
+from utils.condiciones import normalizar_condiciones
+from utils.patrones import combinar_patrones, validar_patron
+
 Base = declarative_base()
 
 
 class Transaccion(Base):
     """
     Modelo SQLAlchemy para la tabla transacciones.
-    Campos: fecha, detalle, monto, tipo, categoria, año, mes, semana, tipo_regla, fecha_modificacion.
+    Campos: fecha, detalle, merchant_key, monto, tipo, canal, categoria, año, mes, semana, tipo_regla,
+    palabra_regla, campo_regla, posicion_regla, fecha_modificacion.
     """
     __tablename__ = 'transacciones'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     fecha = Column(Date, nullable=False)
     detalle = Column(String(500), nullable=False)
+    merchant_key = Column(String(500), index=True)  # Clave de comercio (ver normalizar_comercio)
     monto = Column(Float, nullable=False)
     tipo = Column(String(50), nullable=False)
+    canal = Column(String(100))  # Canal o sucursal, usado por las reglas condicionales
     categoria = Column(String(100), nullable=False)
     año = Column(Integer, nullable=False)
     mes = Column(Integer, nullable=False)
     dia = Column(Integer, nullable=False)
     semana = Column(Integer, nullable=False)
     tipo_regla = Column(String(100), default="mapeo_por_palabra_clave")
+    # Explicación registrada al categorizar: palabra que coincidió, campo donde se
+    # encontró (detalle, nombre_destino, comentario) y posición en su texto normalizado
+    palabra_regla = Column(String(200))
+    campo_regla = Column(String(50))
+    posicion_regla = Column(Integer)
     created_at = Column(DateTime, default=datetime.now)
     fecha_modificacion = Column(DateTime, default=datetime.now)
     
@@ -35,14 +47,19 @@ class Transaccion(Base):
             'id': self.id,
             'fecha': self.fecha.strftime('%Y-%m-%d') if self.fecha else None,
             'detalle': self.detalle,
+            'merchant_key': self.merchant_key,
             'monto': self.monto,
             'tipo': self.tipo,
+            'canal': self.canal,
             'categoria': self.categoria,
             'año': self.año,
             'mes': self.mes,
             'dia': self.dia,
             'semana': self.semana,
             'tipo_regla': self.tipo_regla,
+            'palabra_regla': self.palabra_regla,
+            'campo_regla': self.campo_regla,
+            'posicion_regla': self.posicion_regla,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
             'fecha_modificacion': self.fecha_modificacion.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_modificacion else None
         }
@@ -52,12 +69,18 @@ class CategoriaCustom(Base):
     """
     Modelo SQLAlchemy para categorías personalizadas.
     Permite a los usuarios agregar sus propias categorías y palabras clave.
+    Con condiciones (ver utils.condiciones) la categoría es una regla condicional:
+    sus palabras clave solo aplican si la transacción cumple las condiciones.
+    Con patrones (expresiones regulares, ver utils.patrones) la categoría se asigna
+    a las transacciones cuyo texto coincide con alguno de ellos.
     """
     __tablename__ = 'categorias_custom'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     nombre_categoria = Column(String(100), nullable=False, unique=True)
     palabras_clave = Column(String(1000), nullable=False)  # JSON string con lista de palabras
+    condiciones = Column(String(1000))  # JSON string con las condiciones (vacío si no tiene)
+    patrones = Column(String(2000))  # JSON string con lista de expresiones regulares (vacío si no tiene)
     descripcion = Column(String(500))
     activa = Column(Integer, default=1)  # 1 = activa, 0 = inactiva
     created_at = Column(DateTime, default=datetime.now)
@@ -70,6 +93,8 @@ class CategoriaCustom(Base):
             'id': self.id,
             'nombre_categoria': self.nombre_categoria,
             'palabras_clave': json.loads(self.palabras_clave) if self.palabras_clave else [],
+            'condiciones': json.loads(self.condiciones) if self.condiciones else {},
+            'patrones': json.loads(self.patrones) if self.patrones else [],
             'descripcion': self.descripcion,
             'activa': bool(self.activa),
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
@@ -77,6 +102,51 @@ class CategoriaCustom(Base):
         }
 
 
+class CacheCategorizacion(Base):
+    """
+    Modelo SQLAlchemy para el cache persistente de categorización.
+    Guarda el resultado de categorizar un texto normalizado bajo una versión de reglas.
+    """
+    __tablename__ = 'cache_categorizacion'
+    __table_args__ = (UniqueConstraint('version_reglas', 'clave'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    version_reglas = Column(String(32), nullable=False)
+    clave = Column(String(1600), nullable=False)  # detalle|nombre_destino|comentario normalizados
+    categoria = Column(String(100), nullable=False)
+    tipo_regla = Column(String(100), nullable=False)
+    palabra_regla = Column(String(200))
+    campo_regla = Column(String(50))
+    posicion_regla = Column(Integer)
+    ultimo_uso = Column(DateTime, default=datetime.now, index=True)
+
+
+class EstadisticaRegla(Base):
+    """
+    Modelo SQLAlchemy para los contadores de uso de las reglas de categorización,
+    por corrida de categorización (una carga o una recategorización). Una fila por
+    categoría (palabra_clave vacía) con sus aciertos y evaluaciones, y una fila por
+    palabra clave o patrón con sus aciertos.
+    """
+    __tablename__ = 'estadisticas_reglas'
+    __table_args__ = (UniqueConstraint('corrida', 'categoria', 'palabra_clave'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    corrida = Column(String(32), nullable=False)
+    categoria = Column(String(100), nullable=False)
+    palabra_clave = Column(String(200), nullable=False, default='')
+    aciertos = Column(Integer, nullable=False, default=0)
+    evaluaciones = Column(Integer, nullable=False, default=0)
+    actualizado = Column(DateTime, default=datetime.now)
+
+
+# Máximo de entradas en el cache de categorización antes de desalojar
+MAX_ENTRADAS_CACHE = 100000
+
+# Corridas de categorización cuyas estadísticas de reglas se conservan
+MAX_CORRIDAS_ESTADISTICAS = 20
+
+
 class DatabaseManager:
     """
     Clase para manejar la base de datos SQLite.
@@ -94,6 +164,9 @@ class DatabaseManager:
         
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
+        
+        # Índice palabra clave -> transacciones (se construye al primer uso)
+        self._indice_palabras = None
     
     def guardar_dataframe(self, df, modo='append'):
         """
@@ -108,12 +181,22 @@ class DatabaseManager:
                 # Borrar todas las transacciones existentes
                 self.session.query(Transaccion).delete()
                 self.session.commit()
+                self._indice_palabras = None
+            
+            nuevas = []
             
             # Convertir DataFrame a registros
             for _, row in df.iterrows():
-                # Verificar si ya existe (para evitar duplicados en modo append)
+                if 'merchant_key' in row and pd.notna(row['merchant_key']):
+                    merchant_key = row['merchant_key']
+                else:
+                    merchant_key = normalizar_comercio(row['detalle'])
+                
+                # Verificar si ya existe (para evitar duplicados en modo append);
+                # merchant_key está indexada y acota la búsqueda
                 if modo == 'append':
                     existe = self.session.query(Transaccion).filter(
+                        Transaccion.merchant_key == merchant_key,
                         Transaccion.fecha == row['fecha'].date(),
                         Transaccion.detalle == row['detalle'],
                         Transaccion.monto == row['monto'],
@@ -124,31 +207,81 @@ class DatabaseManager:
                         continue  # Saltar si ya existe
                 
                 # Crear nueva transacción
-                # Determinar tipo_regla basado en si la categoría es "Sin categorizar"
-                tipo_regla = "sin_coincidencias" if row['categoria'] == "Sin categorizar" else "mapeo_por_palabra_clave"
+                # Usar el tipo_regla entregado por la categorización; si no viene,
+                # determinarlo según si la categoría es "Sin categorizar"
+                if 'tipo_regla' in row and pd.notna(row['tipo_regla']):
+                    tipo_regla = row['tipo_regla']
+                else:
+                    tipo_regla = "sin_coincidencias" if row['categoria'] == "Sin categorizar" else "mapeo_por_palabra_clave"
+                
+                # Explicación de la categorización, si el DataFrame la trae
+                palabra_regla, campo_regla, posicion_regla = (
+                    row[columna] if columna in row and pd.notna(row[columna]) else None
+                    for columna in ('palabra_regla', 'campo_regla', 'posicion_regla')
+                )
                 
                 transaccion = Transaccion(
                     fecha=row['fecha'].date(),
                     detalle=row['detalle'],
+                    merchant_key=merchant_key,
                     monto=row['monto'],
                     tipo=row['tipo'],
+                    canal=row['canal'] if 'canal' in row and pd.notna(row['canal']) else None,
                     categoria=row['categoria'],
                     año=row['año'],
                     mes=row['mes'],
                     dia=row['dia'],
                     semana=row['semana'],
-                    tipo_regla=tipo_regla
+                    tipo_regla=tipo_regla,
+                    palabra_regla=palabra_regla,
+                    campo_regla=campo_regla,
+                    posicion_regla=int(posicion_regla) if posicion_regla is not None else None
                 )
                 
                 self.session.add(transaccion)
+                nuevas.append(transaccion)
             
             self.session.commit()
+            
+            # Mantener el índice de palabras al día con las filas insertadas
+            if self._indice_palabras is not None:
+                self._indice_palabras.agregar([t.id for t in nuevas], [t.detalle for t in nuevas])
+            
             return True
             
         except Exception as e:
             self.session.rollback()
             raise Exception(f"Error al guardar en base de datos: {str(e)}")
     
+    def guardar_flujo(self, fragmentos, modo='append'):
+        """
+        Guarda un flujo de DataFrames categorizados (por ejemplo los que entrega
+        categorizar_en_flujo) fragmento a fragmento, sin juntarlos en memoria.
+        
+        Args:
+            fragmentos: Iterador de DataFrames categorizados
+            modo: 'append' para agregar, 'replace' para reemplazar todo (solo se
+                borra antes del primer fragmento)
+        
+        Returns:
+            dict con la cantidad de fragmentos y filas recibidas
+        """
+        try:
+            from utils.fechas import agregar_columnas_tiempo
+            
+            resumen = {'fragmentos': 0, 'filas': 0}
+            for fragmento in fragmentos:
+                if 'año' not in fragmento.columns:
+                    fragmento = agregar_columnas_tiempo(fragmento)
+                self.guardar_dataframe(fragmento, modo=modo if resumen['fragmentos'] == 0 else 'append')
+                resumen['fragmentos'] += 1
+                resumen['filas'] += len(fragmento)
+            
+            return resumen
+            
+        except Exception as e:
+            raise Exception(f"Error al guardar flujo de transacciones: {str(e)}")
+    
     def obtener_todas_transacciones(self):
         """
         Obtiene todas las transacciones de la base de datos.
@@ -220,6 +353,7 @@ class DatabaseManager:
         try:
             self.session.query(Transaccion).delete()
             self.session.commit()
+            self._indice_palabras = None
             return True
         except Exception as e:
             self.session.rollback()
@@ -249,17 +383,123 @@ class DatabaseManager:
             if not transaccion:
                 return False
             
+            # Si ya tenía una sobrescritura, el modelo debe olvidar esa categoría
+            categoria_anterior = transaccion.categoria if transaccion.tipo_regla == "sobrescritura_manual" else None
+            
             transaccion.categoria = nueva_categoria
             transaccion.tipo_regla = "sobrescritura_manual"
+            transaccion.palabra_regla = None
+            transaccion.campo_regla = None
+            transaccion.posicion_regla = None
             transaccion.fecha_modificacion = datetime.now()
             
             self.session.commit()
+            self._aprender_sobrescritura(transaccion.detalle, nueva_categoria, categoria_anterior)
             return True
             
         except Exception as e:
             self.session.rollback()
             raise Exception(f"Error al actualizar categoría de transacción: {str(e)}")
     
+    def _aprender_sobrescritura(self, detalle, categoria, categoria_anterior=None):
+        """
+        Actualiza el modelo aprendido con una sobrescritura manual. Un error aquí no
+        debe impedir la actualización de la transacción.
+        """
+        try:
+            from utils.clasificador import registro_clasificador
+            registro_clasificador.aprender(detalle, categoria, categoria_anterior)
+        except Exception as e:
+            print(f"Warning: No se pudo actualizar el modelo de categorías: {e}")
+    
+    def entrenar_clasificador(self):
+        """
+        Entrena desde cero el modelo aprendido con todas las transacciones que
+        tienen una sobrescritura manual.
+        
+        Returns:
+            dict con la cantidad de ejemplos y de categorías usadas
+        """
+        try:
+            from utils.clasificador import registro_clasificador
+            
+            filas = self.session.query(Transaccion.detalle, Transaccion.categoria).filter(
+                Transaccion.tipo_regla == "sobrescritura_manual"
+            ).all()
+            
+            registro_clasificador.entrenar([f.detalle for f in filas], [f.categoria for f in filas])
+            
+            return {
+                'ejemplos': len(filas),
+                'categorias': len({f.categoria for f in filas})
+            }
+            
+        except Exception as e:
+            raise Exception(f"Error al entrenar el modelo de categorías: {str(e)}")
+    
+    def actualizar_categorias_en_lote(self, cambios, respetar_manual=True):
+        """
+        Actualiza en una sola transacción la categoría, el tipo de regla y la
+        explicación de muchas transacciones. Solo se escriben las filas cuyo valor
+        realmente cambia.
+        
+        Args:
+            cambios: Iterable de tuplas (transaccion_id, categoria, tipo_regla) o
+                (transaccion_id, categoria, tipo_regla, palabra, campo, posicion);
+                sin explicación, esas columnas quedan vacías
+            respetar_manual: Si es True, no toca filas con sobrescritura manual
+            
+        Returns:
+            dict con el total recibido, las filas actualizadas y las que no cambiaron
+        """
+        try:
+            ahora = datetime.now()
+            parametros = []
+            for transaccion_id, categoria, tipo_regla, *explicacion in cambios:
+                palabra, campo, posicion = (
+                    None if valor is None or pd.isna(valor) else valor
+                    for valor in (explicacion or (None, None, None))
+                )
+                parametros.append({
+                    'id': int(transaccion_id),
+                    'categoria': categoria,
+                    'tipo_regla': tipo_regla,
+                    'palabra': palabra,
+                    'campo': campo,
+                    'posicion': int(posicion) if posicion is not None else None,
+                    'ahora': ahora
+                })
+            
+            if not parametros:
+                return {'total': 0, 'actualizadas': 0, 'sin_cambios': 0}
+            
+            filtro_manual = "AND tipo_regla IS NOT 'sobrescritura_manual'" if respetar_manual else ""
+            resultado = self.session.execute(
+                text(f"""
+                    UPDATE transacciones
+                    SET categoria = :categoria, tipo_regla = :tipo_regla, palabra_regla = :palabra,
+                        campo_regla = :campo, posicion_regla = :posicion, fecha_modificacion = :ahora
+                    WHERE id = :id
+                      AND (categoria IS NOT :categoria OR tipo_regla IS NOT :tipo_regla
+                           OR palabra_regla IS NOT :palabra OR campo_regla IS NOT :campo
+                           OR posicion_regla IS NOT :posicion)
+                      {filtro_manual}
+                """),
+                parametros
+            )
+            self.session.commit()
+            
+            actualizadas = max(resultado.rowcount, 0)
+            return {
+                'total': len(parametros),
+                'actualizadas': actualizadas,
+                'sin_cambios': len(parametros) - actualizadas
+            }
+            
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error al actualizar categorías en lote: {str(e)}")
+    
     def obtener_transaccion_por_id(self, transaccion_id):
         """
         Obtiene una transacción específica por su ID.
@@ -319,6 +559,28 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Error al obtener transacciones sin categorizar: {str(e)}")
     
+    def obtener_detalles_sin_categorizar(self):
+        """
+        Obtiene solo las columnas necesarias para analizar las transacciones sin
+        categorizar (sin construir los objetos del ORM).
+        
+        Returns:
+            DataFrame con id, detalle, merchant_key, monto y categoria
+        """
+        try:
+            columnas = ['id', 'detalle', 'merchant_key', 'monto', 'categoria']
+            filas = self.session.query(
+                Transaccion.id, Transaccion.detalle, Transaccion.merchant_key,
+                Transaccion.monto, Transaccion.categoria
+            ).filter(
+                Transaccion.categoria == "Sin categorizar"
+            ).all()
+            
+            return pd.DataFrame(filas, columns=columnas)
+            
+        except Exception as e:
+            raise Exception(f"Error al obtener detalles sin categorizar: {str(e)}")
+    
     def obtener_resumen_por_categoria(self, fecha_desde=None, fecha_hasta=None):
         """
         Obtiene un resumen de transacciones agrupadas por categoría.
@@ -437,6 +699,40 @@ class DatabaseManager:
     
     # =================== MÉTODOS PARA CATEGORÍAS PERSONALIZADAS ===================
     
+    @staticmethod
+    def _validar_condiciones(condiciones, palabras_clave):
+        """
+        Normaliza las condiciones de una categoría personalizada. Una regla
+        condicional necesita palabras clave: sin ellas coincidiría con todo.
+        """
+        try:
+            condiciones = normalizar_condiciones(condiciones)
+        except ValueError as e:
+            raise Exception(f"Condiciones inválidas: {str(e)}")
+        
+        if condiciones and not palabras_clave:
+            raise Exception("Una categoría con condiciones necesita al menos una palabra clave")
+        return condiciones
+    
+    @staticmethod
+    def _validar_patrones(patrones, condiciones):
+        """
+        Valida las expresiones regulares de una categoría personalizada (ver
+        utils.patrones.validar_patron): los patrones que pueden tardar demasiado
+        se rechazan al guardar. Quita duplicados manteniendo el orden.
+        """
+        if not patrones:
+            return []
+        if not isinstance(patrones, list):
+            raise Exception("Los patrones deben ser una lista de expresiones regulares")
+        if condiciones:
+            raise Exception("Una categoría no puede tener condiciones y patrones a la vez")
+        
+        try:
+            return list(dict.fromkeys(validar_patron(patron) for patron in patrones))
+        except ValueError as e:
+            raise Exception(f"Patrones inválidos: {str(e)}")
+    
     def obtener_categorias_custom(self):
         """
         Obtiene todas las categorías personalizadas activas.
@@ -450,7 +746,8 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Error al obtener categorías personalizadas: {str(e)}")
     
-    def crear_categoria_custom(self, nombre_categoria, palabras_clave, descripcion=""):
+    def crear_categoria_custom(self, nombre_categoria, palabras_clave, descripcion="", condiciones=None,
+                               patrones=None):
         """
         Crea una nueva categoría personalizada.
         
@@ -458,11 +755,16 @@ class DatabaseManager:
             nombre_categoria: Nombre de la categoría
             palabras_clave: Lista de palabras clave
             descripcion: Descripción opcional
+            condiciones: dict opcional con condiciones de monto, día, tipo o canal
+            patrones: Lista opcional de expresiones regulares
         """
         try:
             import json
             from datetime import datetime
             
+            condiciones = self._validar_condiciones(condiciones, palabras_clave)
+            patrones = self._validar_patrones(patrones, condiciones)
+            
             # Verificar si ya existe
             existe = self.session.query(CategoriaCustom).filter(
                 CategoriaCustom.nombre_categoria == nombre_categoria
@@ -475,6 +777,8 @@ class DatabaseManager:
             nueva_categoria = CategoriaCustom(
                 nombre_categoria=nombre_categoria,
                 palabras_clave=json.dumps(palabras_clave, ensure_ascii=False),
+                condiciones=json.dumps(condiciones, ensure_ascii=False) if condiciones else None,
+                patrones=json.dumps(patrones, ensure_ascii=False) if patrones else None,
                 descripcion=descripcion,
                 activa=1,
                 created_at=datetime.now(),
@@ -483,14 +787,21 @@ class DatabaseManager:
             
             self.session.add(nueva_categoria)
             self.session.commit()
+            self._invalidar_reglas()
+            
+            resultado = nueva_categoria.to_dict()
             
-            return nueva_categoria.to_dict()
+            # Recategorizar solo las transacciones que contienen las nuevas palabras o patrones
+            resultado['recategorizacion'] = self._recategorizar_tras_edicion(palabras_clave, patrones)
+            
+            return resultado
             
         except Exception as e:
             self.session.rollback()
             raise Exception(f"Error al crear categoría personalizada: {str(e)}")
     
-    def actualizar_categoria_custom(self, categoria_id, nombre_categoria=None, palabras_clave=None, descripcion=None):
+    def actualizar_categoria_custom(self, categoria_id, nombre_categoria=None, palabras_clave=None, descripcion=None,
+                                    condiciones=None, patrones=None):
         """
         Actualiza una categoría personalizada existente.
         
@@ -499,6 +810,8 @@ class DatabaseManager:
             nombre_categoria: Nuevo nombre (opcional)
             palabras_clave: Nueva lista de palabras clave (opcional)
             descripcion: Nueva descripción (opcional)
+            condiciones: Nuevas condiciones (opcional; un dict vacío las quita)
+            patrones: Nueva lista de expresiones regulares (opcional; una lista vacía las quita)
         """
         try:
             import json
@@ -511,6 +824,11 @@ class DatabaseManager:
             if not categoria:
                 raise Exception(f"Categoría con ID {categoria_id} no encontrada")
             
+            nombre_anterior = categoria.nombre_categoria
+            palabras_anteriores = set(json.loads(categoria.palabras_clave) if categoria.palabras_clave else [])
+            condiciones_anteriores = json.loads(categoria.condiciones) if categoria.condiciones else {}
+            patrones_anteriores = json.loads(categoria.patrones) if categoria.patrones else []
+            
             # Actualizar campos si se proporcionan
             if nombre_categoria is not None:
                 # Verificar que no exista otra categoría con el mismo nombre
@@ -527,13 +845,47 @@ class DatabaseManager:
             if palabras_clave is not None:
                 categoria.palabras_clave = json.dumps(palabras_clave, ensure_ascii=False)
             
+            if condiciones is not None or palabras_clave is not None:
+                condiciones = self._validar_condiciones(
+                    condiciones_anteriores if condiciones is None else condiciones,
+                    json.loads(categoria.palabras_clave) if categoria.palabras_clave else []
+                )
+                categoria.condiciones = json.dumps(condiciones, ensure_ascii=False) if condiciones else None
+            
+            if patrones is not None or condiciones is not None:
+                patrones = self._validar_patrones(
+                    patrones_anteriores if patrones is None else patrones,
+                    json.loads(categoria.condiciones) if categoria.condiciones else {}
+                )
+                categoria.patrones = json.dumps(patrones, ensure_ascii=False) if patrones else None
+            
             if descripcion is not None:
                 categoria.descripcion = descripcion
             
             categoria.updated_at = datetime.now()
             
             self.session.commit()
-            return categoria.to_dict()
+            self._invalidar_reglas()
+            
+            resultado = categoria.to_dict()
+            
+            # Palabras afectadas por la edición: las agregadas y las quitadas, o todas
+            # si cambió el nombre o las condiciones (las filas de la categoría deben moverse)
+            palabras_nuevas = set(resultado['palabras_clave'])
+            patrones_nuevos = resultado['patrones']
+            if (categoria.nombre_categoria != nombre_anterior or
+                    resultado['condiciones'] != condiciones_anteriores):
+                palabras_afectadas = palabras_anteriores | palabras_nuevas
+                patrones_afectados = patrones_anteriores + patrones_nuevos
+            else:
+                palabras_afectadas = palabras_anteriores ^ palabras_nuevas
+                patrones_afectados = [] if patrones_nuevos == patrones_anteriores else patrones_anteriores + patrones_nuevos
+            
+            resultado['recategorizacion'] = self._recategorizar_tras_edicion(
+                palabras_afectadas, list(dict.fromkeys(patrones_afectados))
+            )
+            
+            return resultado
             
         except Exception as e:
             self.session.rollback()
@@ -547,6 +899,7 @@ class DatabaseManager:
             categoria_id: ID de la categoría a eliminar
         """
         try:
+            import json
             from datetime import datetime
             
             categoria = self.session.query(CategoriaCustom).filter(
@@ -560,12 +913,24 @@ class DatabaseManager:
             categoria.updated_at = datetime.now()
             
             self.session.commit()
+            self._invalidar_reglas()
+            
+            # Las transacciones con sus palabras o patrones vuelven a las reglas restantes
+            palabras = json.loads(categoria.palabras_clave) if categoria.palabras_clave else []
+            patrones = json.loads(categoria.patrones) if categoria.patrones else []
+            self._recategorizar_tras_edicion(palabras, patrones)
+            
             return True
             
         except Exception as e:
             self.session.rollback()
             raise Exception(f"Error al eliminar categoría personalizada: {str(e)}")
     
+    def _invalidar_reglas(self):
+        """Avisa al registro de reglas que las categorías personalizadas cambiaron"""
+        from utils.categorizar import registro_reglas
+        registro_reglas.invalidar()
+    
     def obtener_todas_categorias_con_custom(self):
         """
         Obtiene todas las categorías (predefinidas + personalizadas) en un formato unificado.
@@ -606,3 +971,440 @@ class DatabaseManager:
             
         except Exception as e:
             raise Exception(f"Error al obtener todas las categorías: {str(e)}")
+    
+    # =================== MÉTODOS PARA CACHE DE CATEGORIZACIÓN ===================
+    
+    def obtener_categorias_vigentes(self):
+        """
+        Combina las categorías predefinidas con las personalizadas activas
+        (las personalizadas tienen prioridad si comparten nombre).
+        Las reglas condicionales y de expresiones regulares no se incluyen (ver obtener_reglas_vigentes).
+        """
+        return self._reglas_custom_vigentes()[0]
+    
+    def _reglas_custom_vigentes(self):
+        """Devuelve (categorias, condicionales, expresiones) como los separa separar_categorias_custom"""
+        from utils.categorizar import definir_categorias, separar_categorias_custom
+        
+        categorias = definir_categorias()
+        simples, condicionales, expresiones = separar_categorias_custom(self.obtener_categorias_custom())
+        categorias.update(simples)
+        return categorias, condicionales, expresiones
+    
+    def obtener_reglas_vigentes(self):
+        """Devuelve las reglas compiladas vigentes, incluidas las condicionales y las de expresiones regulares"""
+        from utils.categorizar import compilar_reglas
+        
+        return compilar_reglas(*self._reglas_custom_vigentes())
+    
+    def obtener_version_reglas(self):
+        """
+        Calcula la versión de las reglas vigentes: cubre las categorías predefinidas
+        y las personalizadas activas, por lo que cambia al editar cualquiera de ellas.
+        """
+        try:
+            from utils.categorizar import calcular_version_reglas
+            
+            return calcular_version_reglas(*self._reglas_custom_vigentes())
+            
+        except Exception as e:
+            raise Exception(f"Error al calcular versión de reglas: {str(e)}")
+    
+    def buscar_cache_categorizacion(self, version_reglas, claves, tam_lote=500):
+        """
+        Busca en el cache los resultados de las claves indicadas para una versión de reglas.
+        
+        Args:
+            version_reglas: Versión de reglas vigente
+            claves: Lista de claves normalizadas
+            tam_lote: Cantidad de claves por consulta (límite de parámetros de SQLite)
+            
+        Returns:
+            dict clave -> (categoria, tipo_regla, explicacion) con las claves encontradas,
+            donde explicacion es (palabra, campo, posicion) o None
+        """
+        try:
+            encontrados = {}
+            ahora = datetime.now()
+            
+            for inicio in range(0, len(claves), tam_lote):
+                lote = claves[inicio:inicio + tam_lote]
+                filtro = (
+                    (CacheCategorizacion.version_reglas == version_reglas) &
+                    (CacheCategorizacion.clave.in_(lote))
+                )
+                filas = self.session.query(
+                    CacheCategorizacion.clave,
+                    CacheCategorizacion.categoria,
+                    CacheCategorizacion.tipo_regla,
+                    CacheCategorizacion.palabra_regla,
+                    CacheCategorizacion.campo_regla,
+                    CacheCategorizacion.posicion_regla
+                ).filter(filtro).all()
+                
+                if filas:
+                    # Marcar uso para que el desalojo conserve las entradas frecuentes
+                    self.session.query(CacheCategorizacion).filter(filtro).update(
+                        {CacheCategorizacion.ultimo_uso: ahora}, synchronize_session=False
+                    )
+                
+                for clave, categoria, tipo_regla, palabra, campo, posicion in filas:
+                    explicacion = (palabra, campo, posicion) if campo is not None else None
+                    encontrados[clave] = (categoria, tipo_regla, explicacion)
+            
+            self.session.commit()
+            return encontrados
+            
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error al buscar en cache de categorización: {str(e)}")
+    
+    def guardar_cache_categorizacion(self, version_reglas, resultados, max_entradas=MAX_ENTRADAS_CACHE):
+        """
+        Guarda resultados de categorización en el cache y desaloja entradas si se
+        supera el tamaño máximo: primero las de versiones antiguas y luego las menos usadas.
+        
+        Args:
+            version_reglas: Versión de reglas con la que se calcularon los resultados
+            resultados: dict clave -> (categoria, tipo_regla) o (categoria, tipo_regla, explicacion)
+            max_entradas: Tamaño máximo del cache
+        """
+        try:
+            from sqlalchemy.dialects.sqlite import insert
+            
+            if resultados:
+                ahora = datetime.now()
+                registros = []
+                for clave, (categoria, tipo_regla, *explicacion) in resultados.items():
+                    palabra, campo, posicion = (explicacion and explicacion[0]) or (None, None, None)
+                    registros.append({
+                        'version_reglas': version_reglas,
+                        'clave': clave,
+                        'categoria': categoria,
+                        'tipo_regla': tipo_regla,
+                        'palabra_regla': palabra,
+                        'campo_regla': campo,
+                        'posicion_regla': posicion,
+                        'ultimo_uso': ahora
+                    })
+                sentencia = insert(CacheCategorizacion).on_conflict_do_nothing(
+                    index_elements=['version_reglas', 'clave']
+                )
+                self.session.execute(sentencia, registros)
+            
+            total = self.session.query(CacheCategorizacion).count()
+            if total > max_entradas:
+                self.session.execute(
+                    text("""
+                        DELETE FROM cache_categorizacion WHERE id IN (
+                            SELECT id FROM cache_categorizacion
+                            ORDER BY (version_reglas = :version), ultimo_uso
+                            LIMIT :exceso
+                        )
+                    """),
+                    {'version': version_reglas, 'exceso': total - max_entradas}
+                )
+            
+            self.session.commit()
+            return True
+            
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error al guardar en cache de categorización: {str(e)}")
+    
+    # =================== ESTADÍSTICAS DE REGLAS ===================
+    
+    def registrar_estadisticas_reglas(self, estadisticas, corrida):
+        """
+        Suma contadores de uso a las reglas dentro de una corrida de categorización
+        (crea la fila si no existe). Las corridas no se suman entre sí: volver a
+        categorizar las mismas transacciones es una corrida nueva, así no se cuentan
+        dos veces. Se conservan las últimas MAX_CORRIDAS_ESTADISTICAS corridas.
+        
+        Args:
+            estadisticas: Lista de dicts con categoria, palabra_clave, aciertos y evaluaciones
+            corrida: Identificador de la corrida (los fragmentos de un mismo flujo la comparten)
+        """
+        try:
+            from sqlalchemy import func
+            from sqlalchemy.dialects.sqlite import insert
+            
+            if not estadisticas:
+                return True
+            
+            ahora = datetime.now()
+            registros = [dict(fila, corrida=corrida, actualizado=ahora) for fila in estadisticas]
+            sentencia = insert(EstadisticaRegla)
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=['corrida', 'categoria', 'palabra_clave'],
+                set_={
+                    'aciertos': EstadisticaRegla.aciertos + sentencia.excluded.aciertos,
+                    'evaluaciones': EstadisticaRegla.evaluaciones + sentencia.excluded.evaluaciones,
+                    'actualizado': sentencia.excluded.actualizado
+                }
+            )
+            self.session.execute(sentencia, registros)
+            
+            recientes = self.session.query(EstadisticaRegla.corrida).group_by(EstadisticaRegla.corrida).order_by(
+                func.max(EstadisticaRegla.actualizado).desc()
+            ).limit(MAX_CORRIDAS_ESTADISTICAS)
+            self.session.query(EstadisticaRegla).filter(
+                ~EstadisticaRegla.corrida.in_(recientes.scalar_subquery())
+            ).delete(synchronize_session=False)
+            self.session.commit()
+            return True
+            
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error al registrar estadísticas de reglas: {str(e)}")
+    
+    def obtener_estadisticas_reglas(self, max_palabras=5):
+        """
+        Obtiene los contadores de uso por categoría de la última corrida de categorización.
+        
+        Args:
+            max_palabras: Cantidad de palabras clave más usadas a incluir por categoría
+            
+        Returns:
+            dict categoria -> {aciertos, evaluaciones, fallos, tasa_acierto, palabras_mas_usadas}
+        """
+        try:
+            ultima = self.session.query(EstadisticaRegla.corrida).order_by(
+                EstadisticaRegla.actualizado.desc(), EstadisticaRegla.id.desc()
+            ).first()
+            if ultima is None:
+                return {}
+            filas = self.session.query(EstadisticaRegla).filter(
+                EstadisticaRegla.corrida == ultima.corrida
+            ).order_by(EstadisticaRegla.aciertos.desc()).all()
+            
+            estadisticas = {}
+            for fila in filas:
+                categoria = estadisticas.setdefault(fila.categoria, {
+                    'aciertos': 0,
+                    'evaluaciones': 0,
+                    'fallos': 0,
+                    'tasa_acierto': 0.0,
+                    'palabras_mas_usadas': []
+                })
+                if fila.palabra_clave == '':
+                    categoria['aciertos'] = fila.aciertos
+                    categoria['evaluaciones'] = fila.evaluaciones
+                    categoria['fallos'] = max(fila.evaluaciones - fila.aciertos, 0)
+                    categoria['tasa_acierto'] = round(fila.aciertos / fila.evaluaciones, 4) if fila.evaluaciones else 0.0
+                elif len(categoria['palabras_mas_usadas']) < max_palabras:
+                    categoria['palabras_mas_usadas'].append({
+                        'palabra_clave': fila.palabra_clave,
+                        'aciertos': fila.aciertos
+                    })
+            
+            return estadisticas
+            
+        except Exception as e:
+            raise Exception(f"Error al obtener estadísticas de reglas: {str(e)}")
+    
+    # =================== RECATEGORIZACIÓN INCREMENTAL ===================
+    
+    def obtener_indice_palabras(self):
+        """
+        Devuelve el índice palabra clave -> transacciones, construyéndolo desde la
+        base de datos la primera vez. Luego se mantiene al insertar transacciones.
+        """
+        if self._indice_palabras is None:
+            from utils.indice_palabras import IndicePalabrasTransacciones
+            
+            indice = IndicePalabrasTransacciones()
+            filas = self.session.query(Transaccion.id, Transaccion.detalle).all()
+            indice.agregar([fila.id for fila in filas], [fila.detalle for fila in filas])
+            self._indice_palabras = indice
+        
+        return self._indice_palabras
+    
+    def _recategorizar_tras_edicion(self, palabras, patrones=()):
+        """
+        Recategoriza las transacciones afectadas por la edición de una categoría.
+        Un error aquí no debe deshacer la edición ya guardada.
+        """
+        try:
+            return self.recategorizar_por_palabras(palabras, patrones=patrones)
+        except Exception as e:
+            print(f"Warning: No se pudieron recategorizar las transacciones afectadas: {e}")
+            return {'error': str(e)}
+    
+    def _ids_por_patrones(self, patrones):
+        """
+        Ids de las transacciones automáticas cuyo detalle coincide con alguna de las
+        expresiones regulares. Cada detalle distinto se revisa una sola vez.
+        """
+        if not patrones:
+            return set()
+        
+        filas = self.session.query(Transaccion.id, Transaccion.detalle).filter(
+            Transaccion.tipo_regla != "sobrescritura_manual"
+        ).all()
+        if not filas:
+            return set()
+        
+        expresion = combinar_patrones(patrones)
+        ids, detalles = zip(*filas)
+        codigos, unicos = pd.factorize(pd.Series(detalles, dtype=object).fillna('').astype(str))
+        coincide = [expresion.search(detalle.upper().strip()) is not None for detalle in unicos]
+        return {id_ for id_, codigo in zip(ids, codigos) if coincide[codigo]}
+    
+    def _cargar_automaticas_por_ids(self, ids, tam_lote=500):
+        """
+        Carga las transacciones indicadas que no tienen sobrescritura manual, con
+        las columnas necesarias para recategorizarlas.
+        
+        Returns:
+            DataFrame con id, fecha, detalle, merchant_key, monto, tipo, canal,
+            categoria_anterior y tipo_regla_anterior
+        """
+        filas = []
+        for inicio in range(0, len(ids), tam_lote):
+            filas.extend(self.session.query(
+                Transaccion.id, Transaccion.fecha, Transaccion.detalle, Transaccion.merchant_key,
+                Transaccion.monto, Transaccion.tipo, Transaccion.canal,
+                Transaccion.categoria, Transaccion.tipo_regla
+            ).filter(
+                Transaccion.id.in_(ids[inicio:inicio + tam_lote]),
+                Transaccion.tipo_regla != "sobrescritura_manual"
+            ).all())
+        
+        return pd.DataFrame(filas, columns=[
+            'id', 'fecha', 'detalle', 'merchant_key', 'monto', 'tipo', 'canal', 'categoria_anterior', 'tipo_regla_anterior'
+        ])
+    
+    def simular_cambio_palabras(self, nombre_categoria, agregar=(), quitar=(), max_ejemplos=10):
+        """
+        Calcula qué transacciones cambiarían de categoría si se agregan o quitan
+        palabras clave de una categoría, sin guardar nada. Solo se recategorizan
+        (en memoria) las transacciones que el índice de palabras asocia a las
+        palabras modificadas; las sobrescrituras manuales no se mueven.
+        Cada transacción afectada se categoriza dos veces, con las reglas vigentes
+        y con las hipotéticas (ambas con las reglas condicionales y de expresiones
+        regulares), y solo se informan las diferencias: una categoría guardada
+        desactualizada no cuenta como cambio.
+        
+        Args:
+            nombre_categoria: Categoría a modificar (si no existe, se simula como nueva)
+            agregar: Palabras clave que se agregarían
+            quitar: Palabras clave que se quitarían
+            max_ejemplos: Cantidad máxima de transacciones de ejemplo
+            
+        Returns:
+            dict con las transacciones afectadas, las que cambian, los movimientos
+            entre categorías (desde, hacia, cantidad), ejemplos, las afectadas cuya
+            categoría guardada no coincide con las reglas vigentes y la cantidad de
+            reglas de expresiones regulares evaluadas
+        """
+        try:
+            from utils.categorizar import aplicar_categorizacion, compilar_reglas
+            
+            agregar = [p for p in agregar if normalizar_texto_comercio(p)]
+            quitar = {normalizar_texto_comercio(p) for p in quitar} - {''}
+            
+            reglas_vigentes = self.obtener_reglas_vigentes()
+            
+            # Reglas hipotéticas: las vigentes con la categoría modificada (simple o condicional)
+            categorias, condicionales, expresiones = self._reglas_custom_vigentes()
+            nombres_condicionales = [nombre for nombre, _, _ in condicionales]
+            if nombre_categoria in nombres_condicionales:
+                posicion = nombres_condicionales.index(nombre_categoria)
+                palabras = list(condicionales[posicion][1])
+            else:
+                palabras = list(categorias.get(nombre_categoria, []))
+            palabras = [p for p in palabras if normalizar_texto_comercio(p) not in quitar]
+            vistas = {normalizar_texto_comercio(p) for p in palabras}
+            palabras.extend(p for p in dict.fromkeys(agregar) if normalizar_texto_comercio(p) not in vistas)
+            if nombre_categoria in nombres_condicionales:
+                condicionales[posicion] = (nombre_categoria, palabras, condicionales[posicion][2])
+            else:
+                categorias[nombre_categoria] = palabras
+            
+            resultado = {
+                'categoria': nombre_categoria,
+                'transacciones_afectadas': 0,
+                'transacciones_que_cambian': 0,
+                'movimientos': [],
+                'ejemplos': [],
+                'transacciones_desactualizadas': 0,
+                'reglas_regex_evaluadas': len(expresiones)
+            }
+            
+            ids = sorted(self.obtener_indice_palabras().buscar_varias(list(agregar) + list(quitar)))
+            df = self._cargar_automaticas_por_ids(ids) if ids else pd.DataFrame()
+            resultado['transacciones_afectadas'] = len(df)
+            if df.empty:
+                return resultado
+            
+            # Sin db_manager: no se escribe en el cache ni en las estadísticas de reglas
+            actual = aplicar_categorizacion(df.copy(), reglas=reglas_vigentes)['categoria']
+            df = aplicar_categorizacion(df, reglas=compilar_reglas(categorias, condicionales, expresiones))
+            resultado['transacciones_desactualizadas'] = int((actual != df['categoria_anterior']).sum())
+            df['categoria_actual'] = actual
+            cambios = df[df['categoria'] != df['categoria_actual']]
+            resultado['transacciones_que_cambian'] = len(cambios)
+            
+            movimientos = cambios.groupby(['categoria_actual', 'categoria'], sort=False).size()
+            resultado['movimientos'] = [
+                {'desde': desde, 'hacia': hacia, 'transacciones': int(cantidad)}
+                for (desde, hacia), cantidad in movimientos.sort_values(ascending=False, kind='stable').items()
+            ]
+            resultado['ejemplos'] = [
+                {
+                    'id': int(fila.id),
+                    'detalle': fila.detalle,
+                    'categoria_actual': fila.categoria_actual,
+                    'categoria_nueva': fila.categoria
+                }
+                for fila in cambios.head(max_ejemplos).itertuples(index=False)
+            ]
+            
+            return resultado
+            
+        except Exception as e:
+            raise Exception(f"Error al simular cambio de palabras clave: {str(e)}")
+    
+    def recategorizar_por_palabras(self, palabras, tam_lote=500, patrones=()):
+        """
+        Recategoriza solo las transacciones cuyo detalle contiene alguna de las palabras
+        indicadas, usando las reglas vigentes. Las sobrescrituras manuales se respetan.
+        
+        Args:
+            palabras: Palabras clave agregadas o quitadas de alguna categoría
+            tam_lote: Cantidad de ids por consulta (límite de parámetros de SQLite)
+            patrones: Expresiones regulares agregadas o quitadas; como el índice de
+                palabras no sirve para ellas, se revisan los detalles de las
+                transacciones automáticas
+            
+        Returns:
+            dict con el total de transacciones afectadas y actualizadas
+        """
+        try:
+            from utils.categorizar import aplicar_categorizacion
+            
+            ids = set(self.obtener_indice_palabras().buscar_varias(palabras))
+            ids = sorted(ids | self._ids_por_patrones(patrones))
+            if not ids:
+                return {'transacciones_afectadas': 0, 'transacciones_actualizadas': 0}
+            
+            df = self._cargar_automaticas_por_ids(ids, tam_lote)
+            if df.empty:
+                return {'transacciones_afectadas': len(ids), 'transacciones_actualizadas': 0}
+            
+            df = aplicar_categorizacion(df, db_manager=self, reglas=self.obtener_reglas_vigentes())
+            
+            resumen = self.actualizar_categorias_en_lote(zip(
+                df['id'], df['categoria'], df['tipo_regla'],
+                df['palabra_regla'], df['campo_regla'], df['posicion_regla']
+            ))
+            
+            return {
+                'transacciones_afectadas': len(ids),
+                'transacciones_actualizadas': resumen['actualizadas']
+            }
+            
+        except Exception as e:
+            self.session.rollback()
+            raise Exception(f"Error al recategorizar transacciones afectadas: {str(e)}")
@@ -1,5 +1,15 @@
 import pandas as pd
+import numpy as np
 import re
+import hashlib
+import json
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.clasificador import registro_clasificador
+from utils.comercios import normalizar_texto_comercio, normalizar_textos_comercio, origenes_texto_comercio
+from utils.condiciones import TablaCondiciones, resolver_prioridad
+from utils.patrones import compilar_alternancia, version_patrones
 
 
 def definir_categorias():
@@ -101,126 +111,1317 @@ def definir_categorias():
     return categorias
 
 
-def obtener_categorias_custom_desde_bd():
-    """
-    Obtiene las categorías personalizadas desde la base de datos.
-    """
+def _leer_categorias_custom_bd():
+    """Lee la lista de categorías personalizadas activas de la base de datos por defecto"""
     try:
         from utils.bd import DatabaseManager
         db_manager = DatabaseManager()
         categorias_custom = db_manager.obtener_categorias_custom()
         db_manager.cerrar_conexion()
-        
-        # Convertir a formato compatible
-        categorias_dict = {}
-        for categoria in categorias_custom:
-            categorias_dict[categoria['nombre_categoria']] = categoria['palabras_clave']
-        
-        return categorias_dict
+        return categorias_custom
     except Exception as e:
         print(f"Warning: No se pudieron cargar categorías personalizadas: {e}")
-        return {}
+        return []
+
+
+def obtener_categorias_custom_desde_bd():
+    """
+    Obtiene las categorías personalizadas desde la base de datos.
+    Las reglas condicionales no se incluyen (ver separar_categorias_custom).
+    """
+    return separar_categorias_custom(_leer_categorias_custom_bd())[0]
+
+
+def separar_categorias_custom(categorias_custom):
+    """
+    Separa las categorías personalizadas en las de solo palabras clave, las que
+    tienen condiciones (monto, día, tipo, canal) y las que tienen expresiones regulares.
+    
+    Returns:
+        Tupla (categorias, condicionales, expresiones): dict nombre -> palabras clave,
+        lista de (nombre, palabras_clave, condiciones) y lista de (id, nombre, patrones),
+        ambas en el orden recibido
+    """
+    categorias = {}
+    condicionales = []
+    expresiones = []
+    for categoria in categorias_custom:
+        if categoria.get('patrones'):
+            expresiones.append((categoria.get('id'), categoria['nombre_categoria'], categoria['patrones']))
+        if categoria.get('condiciones'):
+            condicionales.append(
+                (categoria['nombre_categoria'], categoria['palabras_clave'], categoria['condiciones'])
+            )
+        else:
+            categorias[categoria['nombre_categoria']] = categoria['palabras_clave']
+    return categorias, condicionales, expresiones
 
 
 def obtener_todas_las_categorias():
     """
     Combina categorías predefinidas con categorías personalizadas.
+    Usa el registro de reglas, por lo que no consulta la base de datos en cada llamada.
+    """
+    return {categoria: list(palabras) for categoria, palabras in registro_reglas.obtener().categorias.items()}
+
+
+class MatcherPalabrasClave:
+    """
+    Autómata Aho-Corasick construido sobre todas las palabras clave de las categorías.
+    Cada palabra conserva su prioridad (orden de declaración de la categoría y de la
+    palabra dentro de ella), así una sola pasada por el texto entrega la misma
+    categoría que recorrer categoría por categoría y palabra por palabra.
+    Las palabras se normalizan igual que los detalles (ver normalizar_texto_comercio).
     """
-    categorias_predefinidas = definir_categorias()
-    categorias_custom = obtener_categorias_custom_desde_bd()
     
-    # Combinar ambos diccionarios (las custom tienen prioridad)
-    todas_categorias = {**categorias_predefinidas, **categorias_custom}
-    return todas_categorias
+    def __init__(self, categorias):
+        # Patrones en orden de prioridad: (categoria, palabra)
+        self.patrones = []
+        for categoria, palabras_clave in categorias.items():
+            for palabra in palabras_clave:
+                palabra = normalizar_texto_comercio(palabra)
+                if palabra:
+                    self.patrones.append((categoria, palabra))
+        
+        self._sin_coincidencia = len(self.patrones)
+        self._goto = [{}]
+        self._fail = [0]
+        self._mejor = [self._sin_coincidencia]
+        self._salidas = [[]]
+        
+        # 1. Trie con el patrón de mayor prioridad que termina en cada nodo
+        for indice, (_, palabra) in enumerate(self.patrones):
+            nodo = 0
+            for caracter in palabra:
+                siguiente = self._goto[nodo].get(caracter)
+                if siguiente is None:
+                    siguiente = len(self._goto)
+                    self._goto[nodo][caracter] = siguiente
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._mejor.append(self._sin_coincidencia)
+                    self._salidas.append([])
+                nodo = siguiente
+            self._mejor[nodo] = min(self._mejor[nodo], indice)
+            self._salidas[nodo].append(indice)
+        
+        # 2. Enlaces de falla por anchura; cada nodo hereda la mejor salida de su sufijo
+        #    y apunta al sufijo más largo que termina alguna palabra (enlace de salida)
+        self._enlace_salida = [0] * len(self._goto)
+        cola = list(self._goto[0].values())
+        for nodo in cola:
+            for caracter, hijo in self._goto[nodo].items():
+                falla = self._fail[nodo]
+                while falla and caracter not in self._goto[falla]:
+                    falla = self._fail[falla]
+                self._fail[hijo] = self._goto[falla].get(caracter, 0)
+                self._mejor[hijo] = min(self._mejor[hijo], self._mejor[self._fail[hijo]])
+                falla = self._fail[hijo]
+                self._enlace_salida[hijo] = falla if self._salidas[falla] else self._enlace_salida[falla]
+                cola.append(hijo)
+    
+    def buscar(self, texto):
+        """
+        Recorre el texto una sola vez y devuelve (indice_patron, posicion_final) de la
+        palabra clave de mayor prioridad contenida en él, o (None, None) si no hay ninguna.
+        """
+        goto = self._goto
+        fail = self._fail
+        mejor = self._mejor
+        hallado = self._sin_coincidencia
+        fin = None
+        estado = 0
+        
+        for posicion, caracter in enumerate(texto):
+            while estado and caracter not in goto[estado]:
+                estado = fail[estado]
+            estado = goto[estado].get(caracter, 0)
+            
+            if mejor[estado] < hallado:
+                hallado = mejor[estado]
+                fin = posicion
+                if hallado == 0:
+                    break  # Nada puede superar a la primera regla
+        
+        if fin is None:
+            return None, None
+        return hallado, fin
+    
+    def buscar_todas(self, texto):
+        """
+        Recorre el texto una sola vez y devuelve la lista ordenada de índices de
+        todas las palabras clave contenidas en él.
+        """
+        goto = self._goto
+        fail = self._fail
+        salidas = self._salidas
+        enlace_salida = self._enlace_salida
+        visitados = set()
+        encontrados = []
+        estado = 0
+        
+        for caracter in texto:
+            while estado and caracter not in goto[estado]:
+                estado = fail[estado]
+            estado = goto[estado].get(caracter, 0)
+            
+            nodo = estado if salidas[estado] else enlace_salida[estado]
+            while nodo and nodo not in visitados:
+                visitados.add(nodo)
+                encontrados.extend(salidas[nodo])
+                nodo = enlace_salida[nodo]
+        
+        encontrados.sort()
+        return encontrados
+
+
+# Léxico de nombres de pila y apellidos frecuentes en Chile para detectar transferencias
+# a personas. Se excluyen palabras que también son comercios, marcas, lugares o meses
+# (LUZ, PAZ, ISABEL por Santa Isabel, CRUZ por Cruz Verde, GLORIA, CARLOS, MARTIN y
+# PABLO por las comunas y farmacias San Carlos, San Martín y San Pablo, JULIO, etc.).
+NOMBRES_COMUNES = [
+    'HERNIA', 'MAXIMILIANO', 'JUAN', 'MARIA', 'ANA', 'LUIS', 'CARMEN', 'JOSE',
+    'PATRICIA', 'FRANCISCO', 'ROSA', 'JORGE', 'MANUEL', 'PEDRO', 'MIGUEL', 'SERGIO',
+    'RODRIGO', 'CRISTIAN', 'CHRISTIAN', 'PATRICIO', 'RICARDO', 'HECTOR', 'MARIO', 'VICTOR',
+    'CLAUDIO', 'EDUARDO', 'DANIEL', 'JAIME', 'ALEJANDRO', 'FERNANDO', 'RAUL',
+    'ROBERTO', 'FELIPE', 'SEBASTIAN', 'NICOLAS', 'MATIAS', 'DIEGO', 'IGNACIO', 'BENJAMIN',
+    'VICENTE', 'TOMAS', 'JOAQUIN', 'AGUSTIN', 'CRISTOBAL', 'GONZALO', 'ANDRES', 'MAURICIO',
+    'MARCELO', 'ALVARO', 'OSCAR', 'GUILLERMO', 'ENRIQUE', 'ARTURO', 'HUGO', 'NELSON',
+    'LUCAS', 'GABRIEL', 'SAMUEL', 'BASTIAN', 'FABIAN', 'ESTEBAN', 'FRANCO',
+    'EMILIO', 'CESAR', 'ALBERTO', 'ANTONIO', 'RAMON', 'ALFREDO', 'GUSTAVO',
+    'RENE', 'IVAN', 'BORIS', 'ERIK', 'ERICK', 'DAVID', 'JAVIER', 'RAFAEL', 'RUBEN',
+    'OMAR', 'ADOLFO', 'ARMANDO', 'LEONARDO', 'RENATO', 'HERNAN', 'GERMAN', 'OSVALDO',
+    'WALDO', 'ALEXIS', 'ELIAS', 'ISAAC', 'JONATHAN', 'KEVIN', 'BRYAN', 'ALONSO',
+    'AMARO', 'GASPAR', 'FACUNDO', 'RENATA', 'JUANA', 'MARGARITA', 'ELIANA',
+    'SANDRA', 'CLAUDIA', 'CAROLINA', 'FRANCISCA', 'CONSTANZA', 'JAVIERA', 'CATALINA',
+    'VALENTINA', 'CAMILA', 'FERNANDA', 'DANIELA', 'PAULINA', 'MACARENA', 'ANDREA',
+    'ALEJANDRA', 'VERONICA', 'XIMENA', 'LORENA', 'MONICA', 'SILVIA', 'TERESA', 'SOFIA',
+    'ISIDORA', 'AGUSTINA', 'EMILIA', 'FLORENCIA', 'MARTINA', 'ANTONELLA', 'JOSEFA',
+    'AMANDA', 'BARBARA', 'NATALIA', 'PAMELA', 'KARINA', 'MARCELA', 'ELIZABETH',
+    'JACQUELINE', 'CECILIA', 'ANGELICA', 'VIVIANA', 'PAOLA', 'GABRIELA', 'VALERIA',
+    'NICOLE', 'BEATRIZ', 'ELENA', 'LUCIA', 'JULIA', 'LAURA', 'SARA', 'RAQUEL', 'HILDA',
+    'NORMA', 'INES', 'ELSA', 'OLGA', 'RUTH', 'GRACIELA', 'MIRIAM', 'SUSANA', 'YOLANDA',
+    'ALICIA', 'ADRIANA', 'BERNARDITA', 'ANTONIA', 'MAITE', 'IGNACIA', 'TAMARA', 'JESSICA',
+    'KATHERINE', 'DENISSE', 'YESENIA', 'MARISOL', 'ROXANA',
+]
+
+APELLIDOS_COMUNES = [
+    'PEREZ', 'GONZALEZ', 'RODRIGUEZ', 'LOPEZ', 'MARTINEZ', 'GARCIA', 'FERNANDEZ',
+    'SANCHEZ', 'MORALES', 'SILVA', 'CASTRO', 'ROJAS', 'GALLARDO', 'MUNOZ', 'DIAZ', 'SOTO',
+    'CONTRERAS', 'SEPULVEDA', 'FUENTES', 'HERNANDEZ', 'TORRES', 'ARAYA',
+    'ESPINOZA', 'VALENZUELA', 'CASTILLO', 'TAPIA', 'REYES', 'GUTIERREZ', 'PIZARRO',
+    'ALVAREZ', 'VASQUEZ', 'RAMIREZ', 'CARRASCO', 'GOMEZ', 'CORTES', 'HERRERA', 'NUNEZ',
+    'JARA', 'VERGARA', 'RIVERA', 'FIGUEROA', 'RIQUELME', 'MIRANDA', 'BRAVO', 'VERA',
+    'MOLINA', 'SANDOVAL', 'ORELLANA', 'CARDENAS', 'OLIVARES', 'ALARCON', 'ORTIZ',
+    'GARRIDO', 'SALAZAR', 'GUZMAN', 'HENRIQUEZ', 'SAAVEDRA', 'NAVARRO', 'AGUILERA',
+    'PARRA', 'ROMERO', 'ARAVENA', 'VARGAS', 'CACERES', 'YANEZ', 'LEIVA', 'ESCOBAR',
+    'MORENO', 'ACUNA', 'MENDEZ', 'TOLEDO', 'OSORIO', 'MEDINA', 'PENA', 'URIBE',
+    'ZUNIGA', 'DONOSO', 'POBLETE', 'BUSTOS', 'OYARZUN', 'BECERRA',
+    'ALVARADO', 'INOSTROZA', 'MATURANA', 'VIDAL', 'VILLARROEL', 'PACHECO', 'JIMENEZ',
+    'RUIZ', 'AGUILAR', 'GALLEGOS', 'CORNEJO', 'ESPINOSA', 'ARANCIBIA', 'ROBLES', 'MARIN',
+    'VENEGAS', 'SALGADO', 'FARIAS', 'MONTECINOS', 'OPAZO', 'ULLOA', 'RIVAS', 'SALINAS',
+    'CARVAJAL', 'QUEZADA', 'CIFUENTES', 'MELLA', 'ORTEGA', 'BARRIENTOS', 'VALDES',
+    'SOTOMAYOR', 'LEAL', 'MENA', 'GUERRERO', 'PAREDES', 'VILLEGAS', 'BUSTAMANTE',
+    'SEGOVIA', 'HIDALGO', 'ZAMORA', 'CERDA', 'MONTOYA', 'MANRIQUEZ', 'BASCUNAN',
+    'CARRENO', 'ESPINDOLA', 'FUENZALIDA', 'LATORRE', 'LIZAMA', 'MALDONADO',
+    'OLAVE', 'PAILLALEF', 'PONCE', 'QUIROZ', 'SALDIVIA', 'TRONCOSO', 'URRUTIA', 'VALDIVIA',
+    'YEVENES', 'ZAPATA', 'ZAMBRANO', 'CATALAN', 'ABARCA', 'AHUMADA', 'ASTUDILLO',
+]
+
+# Quita tildes y la Ñ para comparar tokens contra el léxico
+_TABLA_SIN_TILDES = str.maketrans('ÁÉÍÓÚÜÑ', 'AEIOUUN')
+_PATRON_TOKEN = re.compile(r"[A-Z]+")
+
+# Palabras tras las que un nombre es un lugar o comercio (San Miguel, Santa Rosa...)
+_PREFIJOS_LUGAR = frozenset({'SAN', 'SANTA', 'SANTO'})
 
 
-def categorizar_transaccion(detalle, nombre_destino="", comentario="", monto=0):
+class DetectorNombresPersona:
     """
-    Categoriza una transacción basándose en múltiples campos.
-    Específicamente adaptado para datos de transferencias bancarias.
+    Detecta si un texto parece el nombre de una persona buscando sus palabras en un
+    léxico de nombres y apellidos guardado en conjuntos (una búsqueda por palabra).
+    El léxico es configurable y puede cargarse desde archivos con miles de entradas.
     """
-    detalle_upper = str(detalle).upper()
-    nombre_destino_upper = str(nombre_destino).upper()
-    comentario_upper = str(comentario).upper()
     
-    # Detectar transferencias personales por patrones de nombres
-    def es_nombre_persona(texto):
-        """Detecta si el texto parece ser un nombre de persona"""
-        texto = texto.strip()
-        if not texto or texto.isdigit():
-            return False
+    def __init__(self, nombres=None, apellidos=None):
+        nombres = NOMBRES_COMUNES if nombres is None else nombres
+        apellidos = APELLIDOS_COMUNES if apellidos is None else apellidos
+        
+        self.nombres = frozenset(self._normalizar(n) for n in nombres if str(n).strip())
+        self.apellidos = frozenset(self._normalizar(a) for a in apellidos if str(a).strip())
+        self._lexico = self.nombres | self.apellidos
+        
+        contenido = json.dumps([sorted(self.nombres), sorted(self.apellidos)])
+        self.version = hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def _normalizar(palabra):
+        return str(palabra).strip().upper().translate(_TABLA_SIN_TILDES)
+    
+    @classmethod
+    def desde_archivos(cls, ruta_nombres, ruta_apellidos):
+        """
+        Crea un detector a partir de archivos de texto con una palabra por línea.
+        """
+        with open(ruta_nombres, encoding='utf-8') as archivo:
+            nombres = archivo.read().split()
+        with open(ruta_apellidos, encoding='utf-8') as archivo:
+            apellidos = archivo.read().split()
+        return cls(nombres, apellidos)
+    
+    def ubicar(self, texto):
+        """
+        Devuelve (palabra, posicion) de la primera palabra del texto que coincide con
+        el léxico, o (None, None) si el texto no parece un nombre de persona.
+        Se exige un nombre de pila y un apellido, como en "nombre apellido"; los
+        nombres tras SAN, SANTA o SANTO (lugares y comercios) no cuentan.
+        """
+        texto = str(texto).upper()
+        if len(texto.split()) < 2:
+            return None, None
         
-        # Patrones comunes de nombres chilenos
-        nombres_comunes = ['HERNIA', 'MAXIMILIANO', 'JUAN', 'MARIA', 'CARLOS', 'ANA', 
-                          'LUIS', 'CARMEN', 'JOSE', 'PATRICIA', 'FRANCISCO', 'ROSA']
-        apellidos_comunes = ['PEREZ', 'GONZALEZ', 'RODRIGUEZ', 'LOPEZ', 'MARTINEZ', 
-                           'GARCIA', 'FERNANDEZ', 'SANCHEZ', 'MORALES', 'SILVA', 
-                           'CASTRO', 'ROJAS', 'GALLARDO']
+        # Quitar tildes no cambia el largo del texto, así la posición vale para el original
+        primera = None
+        con_nombre = con_apellido = False
+        anterior = None
+        for token in _PATRON_TOKEN.finditer(texto.translate(_TABLA_SIN_TILDES)):
+            palabra = token.group()
+            if anterior not in _PREFIJOS_LUGAR:
+                if palabra in self.nombres and not con_nombre:
+                    con_nombre = True
+                elif palabra in self.apellidos:
+                    con_apellido = True
+                else:
+                    anterior = palabra
+                    continue
+                if primera is None:
+                    primera = (palabra, token.start())
+                if con_nombre and con_apellido:
+                    return primera
+            anterior = palabra
         
-        palabras = texto.split()
-        if len(palabras) >= 2:  # Al menos nombre y apellido
-            for nombre in nombres_comunes:
-                if nombre in texto:
-                    return True
-            for apellido in apellidos_comunes:
-                if apellido in texto:
-                    return True
+        return None, None
+    
+    def buscar(self, texto):
+        """
+        Devuelve la palabra del texto que coincide con el léxico (para explicar la
+        categorización) o None si el texto no parece un nombre de persona.
+        """
+        return self.ubicar(texto)[0]
+
+
+# Detector usado por defecto al compilar reglas
+detector_nombres_persona = DetectorNombresPersona()
+
+
+def configurar_detector_nombres(detector):
+    """
+    Reemplaza el detector de nombres usado por las reglas (por ejemplo, uno cargado
+    con DetectorNombresPersona.desde_archivos) e invalida las reglas vigentes.
+    """
+    global detector_nombres_persona
+    detector_nombres_persona = detector
+    registro_reglas.invalidar()
+
+
+# Se incrementa cuando cambia la lógica de categorización, para invalidar resultados guardados
+VERSION_LOGICA_CATEGORIZACION = 7
+
+
+def calcular_version_reglas(categorias, condicionales=(), expresiones=()):
+    """
+    Calcula un hash estable del conjunto de reglas (categorías y palabras clave en orden,
+    y las reglas condicionales y de expresiones regulares si las hay).
+    Cambia cada vez que se agrega, quita o reordena una palabra o categoría, y también
+    si cambia el léxico del detector de nombres.
+    """
+    partes = [VERSION_LOGICA_CATEGORIZACION, detector_nombres_persona.version]
+    partes += [[categoria, list(palabras)] for categoria, palabras in categorias.items()]
+    if condicionales:
+        partes.append([[categoria, list(palabras), condiciones] for categoria, palabras, condiciones in condicionales])
+    if expresiones:
+        partes.append([[id_regla, categoria, list(patrones)] for id_regla, categoria, patrones in expresiones])
+    contenido = json.dumps(partes, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+# Particiones de reglas según el tipo de movimiento. Las categorías neutrales
+# (Transferencias, Retiros, Impuestos...) se evalúan para cualquier tipo.
+PARTICION_INGRESO = "ingreso"
+PARTICION_GASTO = "gasto"
+PARTICION_NEUTRAL = "neutral"
+
+
+def particion_categoria(categoria):
+    """Devuelve la partición de una categoría según su prefijo ('Ingreso - ', 'Gasto - ')"""
+    if categoria.startswith('Ingreso'):
+        return PARTICION_INGRESO
+    if categoria.startswith('Gasto'):
+        return PARTICION_GASTO
+    return PARTICION_NEUTRAL
+
+
+def particion_tipo(tipo):
+    """
+    Devuelve la partición de reglas que corresponde al tipo de movimiento de una
+    transacción, o None si el tipo no se conoce (se evalúan todas las reglas).
+    """
+    if tipo == 'Ingreso':
+        return PARTICION_INGRESO
+    if tipo == 'Gasto':
+        return PARTICION_GASTO
+    return None
+
+
+class ReglasCompiladas:
+    """
+    Conjunto de reglas listo para categorizar: el diccionario de categorías, su
+    versión, el autómata de palabras clave construido una única vez, el detector
+    de nombres de persona, las reglas condicionales y las de expresiones regulares.
+    """
+    
+    def __init__(self, categorias, condicionales=(), expresiones=()):
+        self.categorias = {categoria: tuple(palabras) for categoria, palabras in categorias.items()}
+        self.condicionales = tuple(
+            (categoria, tuple(palabras), dict(condiciones)) for categoria, palabras, condiciones in condicionales
+        )
+        self.expresiones = tuple(
+            (id_regla, categoria, tuple(patrones)) for id_regla, categoria, patrones in expresiones
+        )
+        self.version = calcular_version_reglas(self.categorias, self.condicionales, self.expresiones)
+        self.matcher = MatcherPalabrasClave(self.categorias)
+        self.detector_nombres = detector_nombres_persona
+        self._matchers_particion = {}
+        self._tabla_condicional = None
+        self._alternancias = {}
+        self._indice_similitud = None
+        self._posiciones_palabras = None
+    
+    @property
+    def indice_similitud(self):
+        """
+        Índice del vocabulario de palabras clave para sugerencias por similitud.
+        Se construye al primer uso a partir del último índice construido, de modo
+        que al editar categorías solo se procesan las palabras que cambiaron.
+        """
+        global _ULTIMO_INDICE_SIMILITUD
         
-        return False
+        if self._indice_similitud is None:
+            from utils.indice_palabras import IndiceSimilitudPalabras
+            
+            vocabulario = [p for palabras in self.categorias.values() for p in palabras]
+            if _ULTIMO_INDICE_SIMILITUD is None:
+                self._indice_similitud = IndiceSimilitudPalabras(vocabulario)
+            else:
+                self._indice_similitud = _ULTIMO_INDICE_SIMILITUD.actualizado(vocabulario)
+            _ULTIMO_INDICE_SIMILITUD = self._indice_similitud
+        return self._indice_similitud
     
-    # Verificar si es una transferencia personal
-    if (es_nombre_persona(detalle_upper) or 
-        es_nombre_persona(nombre_destino_upper) or 
-        es_nombre_persona(comentario_upper)):
-        return 'Transferencias'
+    @property
+    def posiciones_palabras(self):
+        """
+        Palabra clave -> lista de (posición de la categoría, posición de la palabra
+        dentro de la categoría), para reproducir el orden de declaración.
+        """
+        if self._posiciones_palabras is None:
+            posiciones = {}
+            for indice_categoria, palabras in enumerate(self.categorias.values()):
+                vistas = set()
+                for indice_palabra, palabra in enumerate(palabras):
+                    if palabra not in vistas:
+                        vistas.add(palabra)
+                        posiciones.setdefault(palabra, []).append((indice_categoria, indice_palabra))
+            self._posiciones_palabras = posiciones
+        return self._posiciones_palabras
     
-    categorias = definir_categorias()
+    @property
+    def tabla_condicional(self):
+        """
+        Autómata con las palabras clave de las reglas condicionales (la "categoría"
+        de cada palabra es el número de regla) y la tabla con sus condiciones.
+        """
+        if self._tabla_condicional is None:
+            matcher = MatcherPalabrasClave({
+                regla: palabras for regla, (_, palabras, _) in enumerate(self.condicionales)
+            })
+            tabla = TablaCondiciones([condiciones for _, _, condiciones in self.condicionales])
+            self._tabla_condicional = (matcher, tabla)
+        return self._tabla_condicional
     
-    # Revisar si el detalle coincide con alguna de las categorías
-    for categoria, palabras_clave in categorias.items():
-        for palabra in palabras_clave:
-            if palabra in detalle_upper:
-                return categoria
+    def alternancia_para(self, particion=None):
+        """
+        Expresión única con los patrones de las reglas de expresiones regulares que
+        aplican a la partición indicada (todas si es None), construida una vez.
+        
+        Returns:
+            Tupla (alternancia, categorias): AlternanciaPatrones y el nombre de
+            categoría de cada regla, en el orden de la alternancia
+        """
+        alternancia = self._alternancias.get(particion)
+        if alternancia is None:
+            expresiones = [
+                (id_regla, categoria, patrones) for id_regla, categoria, patrones in self.expresiones
+                if particion is None or particion_categoria(categoria) in (particion, PARTICION_NEUTRAL)
+            ]
+            alternancia = (
+                compilar_alternancia(tuple(
+                    (id_regla, version_patrones(patrones), tuple(patrones)) for id_regla, _, patrones in expresiones
+                )),
+                [categoria for _, categoria, _ in expresiones]
+            )
+            self._alternancias[particion] = alternancia
+        return alternancia
     
-    # Si no coincide ninguna palabra clave, intentar con el nombre del destino
-    for categoria, palabras_clave in categorias.items():
-        for palabra in palabras_clave:
-            if palabra in nombre_destino_upper:
-                return categoria
+    def matcher_para(self, particion=None):
+        """
+        Devuelve el autómata con las categorías de la partición indicada más las
+        neutrales, en su orden de declaración. Sin partición se usan todas.
+        """
+        if particion is None:
+            return self.matcher
+        
+        matcher = self._matchers_particion.get(particion)
+        if matcher is None:
+            matcher = MatcherPalabrasClave({
+                categoria: palabras for categoria, palabras in self.categorias.items()
+                if particion_categoria(categoria) in (particion, PARTICION_NEUTRAL)
+            })
+            self._matchers_particion[particion] = matcher
+        return matcher
     
-    # Por último, intentar con el comentario
-    for categoria, palabras_clave in categorias.items():
-        for palabra in palabras_clave:
-            if palabra in comentario_upper:
-                return categoria
+    def ubicar_por_palabras(self, *textos, particion=None):
+        """
+        Busca en cada texto, en el orden recibido, y devuelve
+        (categoria, palabra_clave, numero_de_texto, posicion) de la primera coincidencia,
+        donde posicion es dónde empieza la palabra dentro de ese texto.
+        Devuelve (None, None, None, None) si ningún texto contiene palabras clave.
+        Con particion solo se evalúan las reglas de esa partición y las neutrales.
+        """
+        matcher = self.matcher_para(particion)
+        for numero, texto in enumerate(textos):
+            indice, fin = matcher.buscar(texto)
+            if indice is not None:
+                categoria, palabra = matcher.patrones[indice]
+                return categoria, palabra, numero, fin - len(palabra) + 1
+        return None, None, None, None
+    
+    def coincidencia_por_palabras(self, *textos, particion=None):
+        """
+        Igual que ubicar_por_palabras, pero devuelve solo (categoria, palabra_clave)
+        o (None, None).
+        """
+        categoria, palabra, _, _ = self.ubicar_por_palabras(*textos, particion=particion)
+        return categoria, palabra
+    
+    def categoria_por_palabras(self, *textos, particion=None):
+        """
+        Igual que coincidencia_por_palabras, pero devuelve solo la categoría (o None).
+        """
+        categoria, _ = self.coincidencia_por_palabras(*textos, particion=particion)
+        return categoria
+
+
+# Último índice de similitud construido, base para construir el siguiente
+_ULTIMO_INDICE_SIMILITUD = None
+
+# Reglas compiladas por versión (se reconstruyen solo si cambian las reglas)
+_REGLAS_COMPILADAS = {}
+_MAX_VERSIONES_COMPILADAS = 8
+
+
+def compilar_reglas(categorias=None, condicionales=(), expresiones=()):
+    """
+    Devuelve las reglas compiladas para el diccionario de categorías indicado
+    (por defecto las predefinidas), las reglas condicionales
+    [(categoria, palabras_clave, condiciones)] y las de expresiones regulares
+    [(id, categoria, patrones)]. El autómata se construye una vez por versión.
+    """
+    if categorias is None:
+        categorias = definir_categorias()
+    
+    version = calcular_version_reglas(categorias, condicionales, expresiones)
+    reglas = _REGLAS_COMPILADAS.get(version)
+    if reglas is None:
+        if len(_REGLAS_COMPILADAS) >= _MAX_VERSIONES_COMPILADAS:
+            _REGLAS_COMPILADAS.pop(next(iter(_REGLAS_COMPILADAS)))
+        reglas = ReglasCompiladas(categorias, condicionales, expresiones)
+        _REGLAS_COMPILADAS[version] = reglas
+    
+    return reglas
+
+
+class RegistroReglas:
+    """
+    Registro de reglas vigentes, uno por proceso. Carga las categorías predefinidas y
+    las personalizadas activas una sola vez y entrega una instantánea compilada que no
+    se modifica; solo se vuelve a cargar cuando se crea, edita o elimina una categoría
+    personalizada (invalidar).
+    """
+    
+    def __init__(self):
+        self._origen_custom = None
+        self._reglas = None
+    
+    def configurar_origen(self, origen_custom):
+        """
+        Define de dónde se leen las categorías personalizadas.
+        
+        Args:
+            origen_custom: Función sin argumentos que devuelve la lista de categorías
+                personalizadas activas (por ejemplo DatabaseManager.obtener_categorias_custom)
+        """
+        self._origen_custom = origen_custom
+        self.invalidar()
+    
+    def invalidar(self):
+        """Descarta la instantánea actual; la próxima consulta vuelve a cargar las reglas"""
+        self._reglas = None
+    
+    def _cargar_categorias(self):
+        """
+        Combina las categorías predefinidas con las personalizadas activas.
+        
+        Returns:
+            Tupla (categorias, condicionales, expresiones), ver separar_categorias_custom
+        """
+        categorias = definir_categorias()
+        
+        if self._origen_custom is None:
+            # Sin origen configurado se abre la base de datos por defecto
+            categorias_custom = _leer_categorias_custom_bd()
+        else:
+            try:
+                categorias_custom = list(self._origen_custom())
+            except Exception as e:
+                print(f"Warning: No se pudieron cargar categorías personalizadas: {e}")
+                categorias_custom = []
+        
+        simples, condicionales, expresiones = separar_categorias_custom(categorias_custom)
+        categorias.update(simples)
+        return categorias, condicionales, expresiones
+    
+    def obtener(self):
+        """Devuelve las reglas compiladas vigentes"""
+        reglas = self._reglas
+        if reglas is None:
+            reglas = compilar_reglas(*self._cargar_categorias())
+            self._reglas = reglas
+        return reglas
+
+
+# Registro de reglas del proceso
+registro_reglas = RegistroReglas()
+
+
+# Valores de tipo_regla según cómo se obtuvo la categoría
+REGLA_PALABRA_CLAVE = "mapeo_por_palabra_clave"
+REGLA_NOMBRE_PERSONA = "deteccion_nombre_persona"
+REGLA_SIN_COINCIDENCIAS = "sin_coincidencias"
+REGLA_MODELO_APRENDIDO = "modelo_aprendido"
+REGLA_CONDICIONAL = "regla_condicional"
+REGLA_EXPRESION = "expresion_regular"
+
+# Campos de la transacción en los que se buscan las reglas, en orden de revisión
+CAMPOS_REGLAS = ('detalle', 'nombre_destino', 'comentario')
+
+# Columnas con la explicación de la categorización: palabra que coincidió, campo
+# donde se encontró y posición dentro del texto original de ese campo (el cache
+# guarda la posición en el texto normalizado; ver _posicion_en_original)
+COLUMNAS_EXPLICACION = ('palabra_regla', 'campo_regla', 'posicion_regla')
+
+
+def es_nombre_persona(texto):
+    """Detecta si el texto parece ser un nombre de persona"""
+    return detector_nombres_persona.buscar(texto) is not None
+
+
+def categorizar_transaccion_con_regla(detalle, nombre_destino="", comentario="", monto=0, reglas=None, tipo=None,
+                                      fecha=None, canal=None):
+    """
+    Igual que categorizar_transaccion, pero devuelve también el tipo de regla que
+    produjo la categoría: (categoria, tipo_regla).
+    Si ninguna regla coincide se consulta el modelo aprendido de las sobrescrituras.
+    """
+    categoria, tipo_regla, _ = categorizar_transaccion_explicada(
+        detalle, nombre_destino, comentario, monto, reglas, tipo, fecha, canal
+    )
+    return categoria, tipo_regla
+
+
+def categorizar_transaccion_explicada(detalle, nombre_destino="", comentario="", monto=0, reglas=None, tipo=None,
+                                      fecha=None, canal=None):
+    """
+    Igual que categorizar_transaccion_con_regla, pero devuelve también la explicación:
+    (categoria, tipo_regla, explicacion), con explicacion = (palabra, campo, posicion)
+    o None si ninguna regla coincidió. La posición es sobre el texto original
+    del campo (detalle, nombre_destino o comentario), tal como se recibió.
+    Aplica las mismas reglas y en el mismo orden que aplicar_categorizacion: las
+    expresiones regulares y las reglas condicionales prevalecen sobre el resto.
+    """
+    if reglas is None:
+        reglas = registro_reglas.obtener()
+    
+    categoria, tipo_regla, explicacion = _categorizar_con_prioritarias(
+        detalle, nombre_destino, comentario, monto, reglas, tipo, fecha, canal
+    )
+    if explicacion is not None and explicacion[2] is not None:
+        textos = dict(zip(CAMPOS_REGLAS, (detalle, nombre_destino, comentario)))
+        posicion = _posicion_en_original(textos[explicacion[1]], explicacion[1], tipo_regla, explicacion[2])
+        explicacion = (explicacion[0], explicacion[1], posicion)
+    return categoria, tipo_regla, explicacion
+
+
+def _categorizar_con_prioritarias(detalle, nombre_destino, comentario, monto, reglas, tipo, fecha, canal):
+    """
+    Resultado de categorizar_transaccion_explicada con la posición aún sobre el
+    texto normalizado (o sin espacios en los extremos, para las expresiones regulares).
+    Las reglas condicionales y las expresiones regulares se evalúan con las mismas
+    búsquedas que en lote (ver _aplicar_reglas_prioritarias), sobre los valores
+    de la transacción.
+    """
+    particion = particion_tipo(tipo) or ''
+    
+    if reglas.condicionales:
+        matcher, tabla = reglas.tabla_condicional
+        primeras = _palabras_condicionales(
+            matcher, (normalizar_texto_comercio(detalle), str(nombre_destino), str(comentario))
+        )
+        coincide = np.zeros(len(reglas.condicionales), dtype=bool)
+        coincide[list(primeras)] = True
+        coincide &= tabla.evaluar_valores(monto, fecha, tipo, canal)
+        coincide &= _condicionales_permitidas(reglas, particion)
+        ganadoras, con_regla = resolver_prioridad(coincide[None, :], tabla.prioridades)
+        if con_regla[0]:
+            regla = int(ganadoras[0])
+            return reglas.condicionales[regla][0], REGLA_CONDICIONAL, primeras[regla]
+    
+    if reglas.expresiones:
+        alternancia, nombres = reglas.alternancia_para(particion or None)
+        for campo, texto in zip(CAMPOS_REGLAS, (detalle, nombre_destino, comentario)):
+            regla, patron, posicion = _buscar_expresion(alternancia, str(texto).strip())
+            if regla is not None:
+                return nombres[regla], REGLA_EXPRESION, (patron, campo, posicion)
+    
+    return _categorizar_sin_prioritarias(detalle, nombre_destino, comentario, reglas, tipo)
+
+
+def _categorizar_sin_prioritarias(detalle, nombre_destino="", comentario="", reglas=None, tipo=None):
+    """
+    Categoriza con nombres de persona, palabras clave y, si nada coincide, el modelo
+    aprendido; no evalúa expresiones regulares ni reglas condicionales (ver
+    _aplicar_reglas_prioritarias). Devuelve (categoria, tipo_regla, explicacion).
+    """
+    resultado = _evaluar_reglas(detalle, nombre_destino, comentario, reglas, particion_tipo(tipo))
+    if resultado[1] == REGLA_SIN_COINCIDENCIAS:
+        categoria = registro_clasificador.predecir_lote([str(detalle)])[0]
+        if categoria is not None:
+            return categoria, REGLA_MODELO_APRENDIDO, (None, 'detalle', None)
+    return resultado
+
+
+def _categorizar_por_reglas(detalle, nombre_destino="", comentario="", reglas=None, particion=None):
+    """
+    Categoriza solo con las reglas (nombres de persona y palabras clave). Su
+    resultado depende únicamente de la versión de reglas y de la partición, por
+    eso es lo que se guarda en el cache persistente.
+    """
+    categoria, tipo_regla, _ = _evaluar_reglas(detalle, nombre_destino, comentario, reglas, particion)
+    return categoria, tipo_regla
+
+
+def _evaluar_reglas(detalle, nombre_destino="", comentario="", reglas=None, particion=None):
+    """
+    Igual que _categorizar_por_reglas, pero devuelve también la explicación obtenida
+    en la misma pasada: (categoria, tipo_regla, explicacion), donde explicacion es
+    (palabra, campo, posicion) con la palabra clave o el nombre de persona que
+    coincidió, el campo donde se encontró (ver CAMPOS_REGLAS) y su posición en el
+    texto normalizado del campo, o None si no hubo coincidencias.
+    """
+    # Mayúsculas y sin espacios en los extremos, como en clave_cache: así la posición
+    # es la misma para todas las transacciones que comparten clave
+    textos = (
+        normalizar_texto_comercio(detalle),
+        str(nombre_destino).upper().strip(),
+        str(comentario).upper().strip()
+    )
+    
+    if reglas is None:
+        reglas = registro_reglas.obtener()
+    
+    # Verificar si es una transferencia personal
+    detector = reglas.detector_nombres
+    for campo, texto in zip(CAMPOS_REGLAS, textos):
+        nombre, posicion = detector.ubicar(texto)
+        if nombre is not None:
+            return 'Transferencias', REGLA_NOMBRE_PERSONA, (nombre, campo, posicion)
     
-    return 'Sin categorizar'
+    # Revisar detalle, luego nombre del destino y por último el comentario
+    categoria, palabra, numero, posicion = reglas.ubicar_por_palabras(*textos, particion=particion)
+    if categoria is not None:
+        return categoria, REGLA_PALABRA_CLAVE, (palabra, CAMPOS_REGLAS[numero], posicion)
+    
+    return 'Sin categorizar', REGLA_SIN_COINCIDENCIAS, None
 
 
-def aplicar_categorizacion(df):
+def categorizar_transaccion(detalle, nombre_destino="", comentario="", monto=0, reglas=None, tipo=None,
+                            fecha=None, canal=None):
+    """
+    Categoriza una transacción basándose en múltiples campos.
+    Específicamente adaptado para datos de transferencias bancarias.
+    Si no se entregan reglas compiladas se usan las vigentes del registro.
+    Si se conoce el tipo ('Gasto' o 'Ingreso') solo se evalúan las reglas de ese
+    tipo y las neutrales. La fecha y el canal solo los usan las reglas condicionales.
     """
-    Función que recorre cada fila del DataFrame y asigna la categoría correspondiente
+    categoria, _ = categorizar_transaccion_con_regla(
+        detalle, nombre_destino, comentario, monto, reglas, tipo, fecha, canal
+    )
+    return categoria
+
+
+# Configuración del modo paralelo de aplicar_categorizacion
+MIN_FILAS_PARALELO = 200000   # Bajo este tamaño no conviene pagar el arranque del pool
+TAM_BLOQUE_PARALELO = 5000    # Claves únicas por tarea enviada a un proceso
+
+
+def aplicar_categorizacion(df, por_claves_unicas=True, db_manager=None, reglas=None,
+                           paralelo=False, max_procesos=None, tam_bloque=TAM_BLOQUE_PARALELO,
+                           min_filas_paralelo=MIN_FILAS_PARALELO, cache_memoria=None, corrida=None):
+    """
+    Función que asigna la categoría correspondiente a cada fila del DataFrame
     basándose en múltiples campos (detalle, nombre_destino, comentario).
     Específicamente optimizada para datos TEF bancarios.
+    
+    Args:
+        df: DataFrame con al menos la columna 'detalle'
+        por_claves_unicas: Si es True, categoriza cada combinación distinta de
+            (detalle, nombre_destino, comentario) una sola vez y reparte el resultado
+            a todas sus filas. Si es False, categoriza fila por fila.
+        db_manager: DatabaseManager opcional; si se entrega, las claves ya categorizadas
+            con la misma versión de reglas se resuelven desde el cache persistente.
+        reglas: ReglasCompiladas a usar; por defecto las vigentes del registro
+            (predefinidas + personalizadas activas).
+        paralelo: Si es True, reparte las claves únicas pendientes en bloques entre
+            varios procesos (solo con por_claves_unicas y si df tiene al menos
+            min_filas_paralelo filas; si no, se categoriza en este proceso).
+        max_procesos: Cantidad de procesos del pool (por defecto, uno por CPU)
+        tam_bloque: Claves únicas por bloque enviado a cada proceso
+        min_filas_paralelo: Filas mínimas para usar el modo paralelo
+        cache_memoria: dict opcional clave -> resultado que se consulta antes del cache
+            persistente y se completa con lo evaluado; permite compartir resultados
+            entre llamadas con las mismas reglas (ver categorizar_en_flujo)
+        corrida: Identificador de la corrida en la que db_manager registra las
+            estadísticas de reglas; por defecto cada llamada es una corrida nueva
+    
+    Returns:
+        DataFrame con las columnas 'categoria', 'tipo_regla' y las de explicación
+        (ver COLUMNAS_EXPLICACION)
     """
     if 'detalle' not in df.columns:
         raise Exception("El DataFrame debe contener la columna 'detalle'")
     
-    def categorizar_fila(row):
-        # Obtener valores de múltiples campos para una categorización más precisa
-        detalle = str(row.get('detalle', ''))
-        nombre_destino = str(row.get('nombre_destino', ''))
-        comentario = str(row.get('comentario', ''))
-        monto = row.get('monto', 0)
+    # Tomar una sola instantánea de las reglas para todo el DataFrame
+    if reglas is None:
+        reglas = registro_reglas.obtener()
+    
+    if not por_claves_unicas:
+        def categorizar_fila(row):
+            # Obtener valores de múltiples campos para una categorización más precisa
+            detalle = str(row.get('detalle', ''))
+            nombre_destino = str(row.get('nombre_destino', ''))
+            comentario = str(row.get('comentario', ''))
+            tipo = row.get('tipo')
+            
+            return _categorizar_sin_prioritarias(detalle, nombre_destino, comentario, reglas=reglas, tipo=tipo)
+        
+        # Aplicar categorización a cada fila
+        resultados = [categorizar_fila(row) for _, row in df.iterrows()]
+        categorias = np.array([categoria for categoria, _, _ in resultados], dtype=object)
+        tipos_regla = np.array([tipo_regla for _, tipo_regla, _ in resultados], dtype=object)
+        explicaciones = tuple(
+            np.array([explicacion[posicion] if explicacion else None for _, _, explicacion in resultados], dtype=object)
+            for posicion in range(len(COLUMNAS_EXPLICACION))
+        )
+    else:
+        opciones_paralelo = None
+        if paralelo and len(df) >= min_filas_paralelo:
+            opciones_paralelo = {'max_procesos': max_procesos, 'tam_bloque': tam_bloque}
         
-        return categorizar_transaccion(detalle, nombre_destino, comentario, monto)
+        categorias, tipos_regla, explicaciones = _categorizar_por_claves_unicas(
+            df, reglas, db_manager, opciones_paralelo, cache_memoria
+        )
+    
+    if len(df):
+        _aplicar_reglas_prioritarias(df, reglas, categorias, tipos_regla, explicaciones)
+        _posiciones_en_originales(df, tipos_regla, explicaciones)
     
-    # Aplicar categorización a cada fila
-    df['categoria'] = df.apply(categorizar_fila, axis=1)
+    # Contadores de aciertos de todas las reglas (palabras clave, expresiones y condicionales)
+    if db_manager is not None and len(df):
+        try:
+            db_manager.registrar_estadisticas_reglas(_estadisticas_reglas(
+                reglas, _columna_particion(df).to_numpy(dtype=object), categorias, tipos_regla, explicaciones[0]
+            ), corrida or uuid.uuid4().hex)
+        except Exception as e:
+            print(f"Warning: No se pudieron registrar las estadísticas de reglas: {e}")
+    
+    df['categoria'] = categorias
+    df['tipo_regla'] = tipos_regla
+    for columna, valores in zip(COLUMNAS_EXPLICACION, explicaciones):
+        df[columna] = valores
     
     return df
 
 
+# Filas por fragmento cuando el flujo entrega filas sueltas
+TAM_FRAGMENTO_FLUJO = 5000
+# Claves únicas que conserva en memoria el cache compartido entre fragmentos
+MAX_CLAVES_CACHE_MEMORIA = 200000
+
+
+def _fragmentos_dataframe(elementos, tam_fragmento, columnas=None):
+    """
+    Convierte un iterador de DataFrames o filas (dicts, namedtuples o tuplas con
+    las columnas indicadas) en DataFrames. Las filas sueltas se agrupan de a
+    tam_fragmento; los DataFrames se entregan tal cual.
+    """
+    filas = []
+    for elemento in elementos:
+        if isinstance(elemento, pd.DataFrame):
+            if filas:
+                yield pd.DataFrame(filas, columns=columnas)
+                filas = []
+            if len(elemento):
+                yield elemento
+            continue
+        
+        filas.append(elemento)
+        if len(filas) >= tam_fragmento:
+            yield pd.DataFrame(filas, columns=columnas)
+            filas = []
+    
+    if filas:
+        yield pd.DataFrame(filas, columns=columnas)
+
+
+def categorizar_en_flujo(elementos, db_manager=None, reglas=None, tam_fragmento=TAM_FRAGMENTO_FLUJO,
+                         columnas=None):
+    """
+    Categoriza un flujo de transacciones sin juntarlas en un solo DataFrame.
+    Consume un iterador de DataFrames (por ejemplo uno por archivo) o de filas y
+    entrega cada fragmento categorizado apenas está listo, así la memoria queda
+    acotada a un fragmento más el cache de claves.
+    
+    Todos los fragmentos usan la misma instantánea de reglas compiladas y comparten
+    un cache en memoria de claves ya evaluadas; con db_manager también se usa el
+    cache persistente.
+    
+    Args:
+        elementos: Iterador de DataFrames o de filas (dicts, namedtuples o tuplas)
+        db_manager: DatabaseManager opcional para el cache persistente y las estadísticas
+        reglas: ReglasCompiladas a usar; por defecto las vigentes del registro
+        tam_fragmento: Filas por fragmento cuando llegan filas sueltas
+        columnas: Nombres de columna para filas entregadas como tuplas
+    
+    Yields:
+        DataFrames categorizados (ver aplicar_categorizacion)
+    """
+    if reglas is None:
+        reglas = registro_reglas.obtener()
+    
+    # Todos los fragmentos suman sus estadísticas de reglas a la misma corrida
+    cache_memoria = {}
+    corrida = uuid.uuid4().hex
+    for fragmento in _fragmentos_dataframe(elementos, tam_fragmento, columnas):
+        yield aplicar_categorizacion(
+            fragmento, db_manager=db_manager, reglas=reglas, cache_memoria=cache_memoria, corrida=corrida
+        )
+
+
+def _columnas_texto(df):
+    """
+    Devuelve el detalle normalizado (ver normalizar_texto_comercio), nombre_destino,
+    comentario (texto vacío si la columna no existe) y la partición de reglas según
+    'tipo' (vacía si no se conoce). No usa 'merchant_key': la clave de comercio
+    descarta la sucursal y las palabras que la siguen, y las reglas se buscan en
+    todo el detalle.
+    """
+    columnas = [normalizar_textos_comercio(df['detalle'])]
+    for columna in ('nombre_destino', 'comentario'):
+        if columna in df.columns:
+            columnas.append(df[columna].astype(str))
+        else:
+            columnas.append(pd.Series('', index=df.index))
+    
+    columnas.append(_columna_particion(df))
+    return columnas
+
+
+def _columna_particion(df):
+    """Partición de reglas de cada fila según 'tipo' (vacía si no se conoce)"""
+    if 'tipo' in df.columns:
+        return df['tipo'].map({'Gasto': PARTICION_GASTO, 'Ingreso': PARTICION_INGRESO}).fillna('')
+    return pd.Series('', index=df.index)
+
+
+def clave_cache(detalle, nombre_destino, comentario, particion=''):
+    """
+    Normaliza los textos de una transacción en la clave usada por el cache de
+    categorización. Solo aplica transformaciones que no alteran el resultado.
+    La partición de reglas se agrega al final cuando se conoce el tipo.
+    """
+    clave = '\x1f'.join(str(texto).upper().strip() for texto in (detalle, nombre_destino, comentario))
+    return f'{clave}\x1f{particion}' if particion else clave
+
+
+# Reglas recibidas por cada proceso del pool (se envían una sola vez, al iniciarlo)
+_REGLAS_PROCESO = None
+
+
+def _iniciar_proceso_categorizacion(reglas):
+    global _REGLAS_PROCESO
+    _REGLAS_PROCESO = reglas
+
+
+def _evaluar_bloque(claves):
+    """Evalúa un bloque de claves (detalle, nombre_destino, comentario, partición) en un proceso del pool"""
+    return [
+        _evaluar_reglas(detalle, nombre_destino, comentario, _REGLAS_PROCESO, particion or None)
+        for detalle, nombre_destino, comentario, particion in claves
+    ]
+
+
+def _evaluar_claves(claves, reglas, opciones_paralelo=None):
+    """
+    Evalúa las reglas para una lista de claves y devuelve los resultados en el mismo
+    orden. Con opciones_paralelo reparte bloques en un ProcessPoolExecutor cuyos
+    procesos reciben las reglas compiladas una sola vez.
+    """
+    tam_bloque = opciones_paralelo['tam_bloque'] if opciones_paralelo else 0
+    if not opciones_paralelo or len(claves) <= tam_bloque:
+        return [
+            _evaluar_reglas(detalle, nombre_destino, comentario, reglas, particion or None)
+            for detalle, nombre_destino, comentario, particion in claves
+        ]
+    
+    # Construir antes los autómatas por partición para no repetirlo en cada proceso
+    for particion in (PARTICION_GASTO, PARTICION_INGRESO):
+        reglas.matcher_para(particion)
+    
+    bloques = [claves[inicio:inicio + tam_bloque] for inicio in range(0, len(claves), tam_bloque)]
+    with ProcessPoolExecutor(
+        max_workers=opciones_paralelo.get('max_procesos'),
+        initializer=_iniciar_proceso_categorizacion,
+        initargs=(reglas,)
+    ) as pool:
+        resultados = []
+        for resultado_bloque in pool.map(_evaluar_bloque, bloques):
+            resultados.extend(resultado_bloque)
+    return resultados
+
+
+def _categorizar_por_claves_unicas(df, reglas, db_manager=None, opciones_paralelo=None, cache_memoria=None):
+    """
+    Factoriza (detalle normalizado, nombre_destino, comentario, partición) en claves únicas, categoriza cada
+    clave una vez y devuelve (categorias, tipos_regla, explicaciones) alineados con df, donde
+    explicaciones son los arreglos de palabras, campos y posiciones (ver COLUMNAS_EXPLICACION).
+    Si se entrega cache_memoria, se consulta primero y se completa con los resultados.
+    Si se entrega db_manager, consulta y alimenta el cache persistente.
+    Con opciones_paralelo, las claves que no están en el cache se evalúan en un pool de procesos.
+    """
+    if len(df) == 0:
+        vacio = np.array([], dtype=object)
+        return vacio, vacio, (vacio, vacio, vacio)
+    
+    claves = pd.MultiIndex.from_arrays(_columnas_texto(df))
+    codigos, unicos = pd.factorize(claves)
+    
+    # El cache se consulta con la versión de las reglas efectivamente usadas
+    claves_cache = [clave_cache(*textos) for textos in unicos]
+    en_cache = {}
+    if cache_memoria:
+        en_cache = {clave: cache_memoria[clave] for clave in claves_cache if clave in cache_memoria}
+    version = None
+    if db_manager is not None:
+        try:
+            version = reglas.version
+            faltantes = list(set(claves_cache) - en_cache.keys())
+            if faltantes:
+                en_cache.update(db_manager.buscar_cache_categorizacion(version, faltantes))
+        except Exception as e:
+            print(f"Warning: No se pudo usar el cache de categorización: {e}")
+            version = None
+    
+    categorias_unicas = np.empty(len(unicos), dtype=object)
+    tipos_regla_unicos = np.empty(len(unicos), dtype=object)
+    explicaciones_unicas = np.full(len(unicos), None, dtype=object)
+    pendientes = []
+    for i in range(len(unicos)):
+        resultado = en_cache.get(claves_cache[i])
+        if resultado is None:
+            pendientes.append(i)
+        else:
+            categorias_unicas[i], tipos_regla_unicos[i], explicaciones_unicas[i] = resultado
+    
+    nuevos = {}
+    evaluados = _evaluar_claves([unicos[i] for i in pendientes], reglas, opciones_paralelo)
+    for i, resultado in zip(pendientes, evaluados):
+        categorias_unicas[i], tipos_regla_unicos[i], explicaciones_unicas[i] = resultado
+        nuevos[claves_cache[i]] = resultado
+    
+    if version is not None and nuevos:
+        try:
+            db_manager.guardar_cache_categorizacion(version, nuevos)
+        except Exception as e:
+            print(f"Warning: No se pudo actualizar el cache de categorización: {e}")
+    
+    if cache_memoria is not None:
+        # Acotar la memoria: si se llena, se empieza de nuevo con las claves de este lote
+        if len(cache_memoria) + len(en_cache) + len(nuevos) > MAX_CLAVES_CACHE_MEMORIA:
+            cache_memoria.clear()
+        cache_memoria.update(en_cache)
+        cache_memoria.update(nuevos)
+    
+    # Las claves sin coincidencias pasan por el modelo aprendido en un solo lote
+    # (no se guarda en el cache porque el modelo cambia con cada sobrescritura)
+    sin_coincidencias = np.flatnonzero(tipos_regla_unicos == REGLA_SIN_COINCIDENCIAS)
+    if len(sin_coincidencias) and registro_clasificador.activo:
+        predicciones = registro_clasificador.predecir_lote(unicos[i][0] for i in sin_coincidencias)
+        for i, categoria in zip(sin_coincidencias, predicciones):
+            if categoria is not None:
+                categorias_unicas[i] = categoria
+                tipos_regla_unicos[i] = REGLA_MODELO_APRENDIDO
+                explicaciones_unicas[i] = (None, 'detalle', None)
+    
+    explicaciones = tuple(
+        np.array([e[posicion] if e else None for e in explicaciones_unicas], dtype=object)[codigos]
+        for posicion in range(len(COLUMNAS_EXPLICACION))
+    )
+    return categorias_unicas[codigos], tipos_regla_unicos[codigos], explicaciones
+
+
+def _posicion_en_original(texto, campo, tipo_regla, posicion):
+    """
+    Lleva una posición encontrada al evaluar las reglas al texto original del campo.
+    Las expresiones regulares se buscan en el texto sin espacios en los extremos;
+    el resto de las reglas, en el detalle normalizado (ver normalizar_texto_comercio)
+    o en nombre_destino y comentario en mayúsculas y sin espacios en los extremos.
+    """
+    texto = str(texto)
+    if tipo_regla == REGLA_EXPRESION:
+        return posicion + len(texto) - len(texto.lstrip())
+    
+    origenes = origenes_texto_comercio(texto, solo_mayusculas=campo != 'detalle')
+    return origenes[posicion] if posicion < len(origenes) else len(texto)
+
+
+def _posiciones_en_originales(df, tipos_regla, explicaciones):
+    """
+    Lleva las posiciones de las explicaciones (en el arreglo recibido) al texto
+    original de su campo, una vez por combinación distinta de texto, tipo de
+    regla y posición.
+    """
+    campos, posiciones = explicaciones[1], explicaciones[2]
+    con_posicion = pd.notna(posiciones)
+    for campo in CAMPOS_REGLAS:
+        filas = np.flatnonzero(con_posicion & (campos == campo))
+        if campo not in df.columns or len(filas) == 0:
+            continue
+        
+        textos = df[campo].astype(str).to_numpy(dtype=object)[filas]
+        es_expresion = tipos_regla[filas] == REGLA_EXPRESION
+        claves = pd.MultiIndex.from_arrays([textos, es_expresion, posiciones[filas].astype(np.int64)])
+        codigos, unicos = pd.factorize(claves)
+        originales = np.array([
+            _posicion_en_original(texto, campo, REGLA_EXPRESION if expresion else None, int(posicion))
+            for texto, expresion, posicion in unicos
+        ], dtype=object)
+        posiciones[filas] = originales[codigos]
+
+
+def _aplicar_reglas_prioritarias(df, reglas, categorias, tipos_regla, explicaciones):
+    """
+    Las expresiones regulares prevalecen sobre palabras clave, nombres y modelo,
+    y las reglas condicionales (monto, día, tipo, canal) sobre todas las demás.
+    Sobrescribe los arreglos recibidos; lo usan tanto el camino por lote como el
+    de una sola transacción.
+    """
+    if reglas.expresiones:
+        _aplicar_expresiones(df, reglas, categorias, tipos_regla, explicaciones)
+    if reglas.condicionales:
+        _aplicar_reglas_condicionales(df, reglas, categorias, tipos_regla, explicaciones)
+
+
+def _aplicar_expresiones(df, reglas, categorias, tipos_regla, explicaciones):
+    """
+    Evalúa las reglas de expresiones regulares y sobrescribe (en los arreglos
+    recibidos) las filas donde alguna coincide. Los patrones van sobre los textos
+    originales (el detalle sin normalizar, para que funcionen anclas y dígitos).
+    Por partición y campo, cada texto distinto se recorre una sola vez con la
+    alternancia de todas las reglas; los campos siguientes solo se revisan en las
+    filas que aún no tienen coincidencia.
+    """
+    columnas = []
+    for columna in CAMPOS_REGLAS:
+        if columna in df.columns:
+            columnas.append(df[columna].astype(str).str.strip().to_numpy(dtype=object))
+        else:
+            columnas.append(None)
+    particiones = _columna_particion(df).to_numpy(dtype=object)
+    
+    pendientes = np.ones(len(df), dtype=bool)
+    for particion in pd.unique(particiones):
+        alternancia, nombres = reglas.alternancia_para(particion or None)
+        en_particion = particiones == particion
+        for campo, textos in zip(CAMPOS_REGLAS, columnas):
+            filas = np.flatnonzero(en_particion & pendientes)
+            if textos is None or len(filas) == 0:
+                continue
+            
+            codigos, unicos = pd.factorize(textos[filas])
+            encontrados = [_buscar_expresion(alternancia, texto) for texto in unicos]
+            reglas_unicas = np.array([-1 if regla is None else regla for regla, _, _ in encontrados], dtype=np.int64)
+            con_regla = reglas_unicas[codigos] >= 0
+            if not con_regla.any():
+                continue
+            
+            filas, codigos = filas[con_regla], codigos[con_regla]
+            categorias[filas] = np.array(nombres, dtype=object)[reglas_unicas[codigos]]
+            tipos_regla[filas] = REGLA_EXPRESION
+            explicaciones[0][filas] = np.array([patron for _, patron, _ in encontrados], dtype=object)[codigos]
+            explicaciones[1][filas] = campo
+            explicaciones[2][filas] = np.array([posicion for _, _, posicion in encontrados], dtype=object)[codigos]
+            pendientes[filas] = False
+
+
+def _aplicar_reglas_condicionales(df, reglas, categorias, tipos_regla, explicaciones):
+    """
+    Evalúa las reglas condicionales como tabla de decisión y sobrescribe (en los
+    arreglos recibidos) las filas donde alguna coincide.
+    Las palabras clave se buscan una vez por clave única de textos; las condiciones
+    y la partición se evalúan por columna con máscaras filas x reglas, y la regla
+    ganadora de cada fila sale de un argmax por prioridad.
+    """
+    matcher, tabla = reglas.tabla_condicional
+    cantidad = len(reglas.condicionales)
+    
+    columnas = _columnas_texto(df)
+    codigos, unicos = pd.factorize(pd.MultiIndex.from_arrays(columnas[:3]))
+    
+    # Palabras clave por clave única: primera palabra de cada regla y dónde se encontró
+    palabras_unicas = np.zeros((len(unicos), cantidad), dtype=bool)
+    primeras = []
+    for clave, textos in enumerate(unicos):
+        primeras.append(_palabras_condicionales(matcher, textos))
+        palabras_unicas[clave, list(primeras[clave])] = True
+    
+    coincide = palabras_unicas[codigos] & tabla.evaluar(df)
+    
+    # Partición: las reglas de gasto o ingreso solo aplican a su tipo de movimiento
+    codigos_particion, particiones = pd.factorize(columnas[3])
+    permitidas = np.array(
+        [_condicionales_permitidas(reglas, particion) for particion in particiones], dtype=bool
+    ).reshape(len(particiones), cantidad)
+    coincide &= permitidas[codigos_particion]
+    
+    ganadoras, con_regla = resolver_prioridad(coincide, tabla.prioridades)
+    filas = np.flatnonzero(con_regla)
+    if len(filas) == 0:
+        return
+    
+    nombres = np.array([categoria for categoria, _, _ in reglas.condicionales], dtype=object)
+    categorias[filas] = nombres[ganadoras[filas]]
+    tipos_regla[filas] = REGLA_CONDICIONAL
+    
+    # Explicación: una búsqueda por par (clave, regla) distinto, no por fila
+    pares, inversos = np.unique(codigos[filas] * cantidad + ganadoras[filas], return_inverse=True)
+    por_par = [primeras[int(par) // cantidad][int(par) % cantidad] for par in pares]
+    for posicion, valores in enumerate(explicaciones):
+        valores[filas] = np.array([explicacion[posicion] for explicacion in por_par], dtype=object)[inversos]
+
+
+def _buscar_expresion(alternancia, texto):
+    """
+    Primera coincidencia de la alternancia en un texto ya sin espacios en los
+    extremos: (indice_regla, patron, posicion), o (None, None, None) si no hay o
+    el texto está vacío.
+    """
+    return alternancia.buscar(texto) if texto else (None, None, None)
+
+
+def _palabras_condicionales(matcher, textos):
+    """
+    Busca las palabras clave de las reglas condicionales en los textos de una
+    transacción (detalle normalizado, nombre_destino y comentario, en ese orden).
+    
+    Returns:
+        dict regla -> (palabra, campo, posicion) con la primera palabra de cada
+        regla encontrada y dónde
+    """
+    primeras = {}
+    for campo, texto in zip(CAMPOS_REGLAS, textos):
+        texto = texto.upper().strip()
+        for indice in matcher.buscar_todas(texto):
+            regla, palabra = matcher.patrones[indice]
+            if regla not in primeras:
+                primeras[regla] = (palabra, campo, texto.find(palabra))
+    return primeras
+
+
+def _condicionales_permitidas(reglas, particion):
+    """Máscara de las reglas condicionales que aplican a la partición ('' si no se conoce el tipo)"""
+    return np.array([
+        particion == '' or particion_categoria(categoria) in (particion, PARTICION_NEUTRAL)
+        for categoria, _, _ in reglas.condicionales
+    ], dtype=bool)
+
+
+def _estadisticas_reglas(reglas, particiones, categorias, tipos_regla, palabras):
+    """
+    Calcula los contadores de un lote de filas categorizadas, para las categorías
+    de palabras clave, condicionales y de expresiones regulares.
+    Para cada categoría: filas que evaluaron sus reglas (evaluaciones; las de su
+    partición que no se resolvieron como transferencia a una persona) y filas que
+    resolvió (aciertos). Para cada palabra clave o patrón: sus aciertos.
+    
+    Returns:
+        Lista de dicts con categoria, palabra_clave ('' para el total de la
+        categoría), aciertos y evaluaciones
+    """
+    evaluadas = tipos_regla != REGLA_NOMBRE_PERSONA
+    filas_por_particion = pd.Series(particiones[evaluadas], dtype=object).value_counts().to_dict()
+    
+    con_regla = np.isin(tipos_regla, (REGLA_PALABRA_CLAVE, REGLA_CONDICIONAL, REGLA_EXPRESION))
+    aciertos = pd.DataFrame({'categoria': categorias[con_regla], 'palabra_clave': palabras[con_regla]})
+    aciertos_categoria = aciertos['categoria'].value_counts().to_dict()
+    aciertos_palabra = aciertos.dropna(subset=['palabra_clave']).value_counts().to_dict()
+    
+    nombres = list(reglas.categorias)
+    nombres += [categoria for categoria, _, _ in reglas.condicionales]
+    nombres += [categoria for _, categoria, _ in reglas.expresiones]
+    
+    filas_sin_particion = filas_por_particion.get('', 0)
+    estadisticas = []
+    for categoria in dict.fromkeys(nombres):
+        particion = particion_categoria(categoria)
+        if particion == PARTICION_NEUTRAL:
+            evaluaciones = sum(filas_por_particion.values())
+        else:
+            evaluaciones = filas_sin_particion + filas_por_particion.get(particion, 0)
+        aciertos = aciertos_categoria.get(categoria, 0)
+        if evaluaciones or aciertos:
+            estadisticas.append({
+                'categoria': categoria, 'palabra_clave': '',
+                'aciertos': int(aciertos), 'evaluaciones': int(evaluaciones)
+            })
+    
+    for (categoria, palabra), aciertos in aciertos_palabra.items():
+        estadisticas.append({
+            'categoria': categoria, 'palabra_clave': palabra,
+            'aciertos': int(aciertos), 'evaluaciones': 0
+        })
+    
+    return estadisticas
+
+
 def obtener_resumen_categorias(df):
     """
     Función auxiliar para obtener un resumen de las categorías asignadas.
@@ -236,29 +1437,82 @@ def obtener_resumen_categorias(df):
     return resumen
 
 
+def aplica_a_tipos(particion):
+    """Tipos de movimiento a los que se aplican las reglas de una partición"""
+    if particion == PARTICION_INGRESO:
+        return ['Ingreso']
+    if particion == PARTICION_GASTO:
+        return ['Gasto']
+    return ['Gasto', 'Ingreso']
+
+
 def obtener_reglas_categorizacion():
     """
     Devuelve las reglas de categorización en un formato amigable para el frontend.
+    Incluye la partición de cada categoría y los tipos de movimiento a los que aplica.
     """
     categorias = definir_categorias()
     
     reglas = []
     for categoria, palabras_clave in categorias.items():
+        particion = particion_categoria(categoria)
         reglas.append({
             'categoria': categoria,
             'palabras_clave': palabras_clave,
             'descripcion': f"Si el detalle contiene alguna de estas palabras: {', '.join(palabras_clave[:5])}{'...' if len(palabras_clave) > 5 else ''}",
-            'total_palabras': len(palabras_clave)
+            'total_palabras': len(palabras_clave),
+            'particion': particion,
+            'aplica_a_tipos': aplica_a_tipos(particion)
         })
     
     return reglas
 
-def sugerir_categoria_para_detalle(detalle):
+def _sugerencias_desde_coincidencias(reglas, indices):
+    """
+    Arma las sugerencias (top 3 por score) a partir de los índices de palabras clave
+    encontradas por el autómata, agrupadas por categoría en orden de declaración.
+    """
+    coincidencias_por_categoria = {}
+    for indice in indices:
+        categoria, palabra = reglas.matcher.patrones[indice]
+        coincidencias_por_categoria.setdefault(categoria, []).append(palabra)
+    
+    sugerencias = []
+    for categoria, coincidencias in coincidencias_por_categoria.items():
+        # Calcular score basado en número de coincidencias y longitud de palabras
+        score = len(coincidencias) * 10 + sum(len(p) for p in coincidencias)
+        sugerencias.append({
+            'categoria': categoria,
+            'score': score,
+            'palabras_encontradas': coincidencias,
+            'confianza': 'alta' if len(coincidencias) > 1 else 'media'
+        })
+    
+    # Ordenar por score descendente
+    sugerencias.sort(key=lambda x: x['score'], reverse=True)
+    return sugerencias[:3]  # Retornar top 3 sugerencias
+
+
+def _mejor_sugerencia(sugerencias):
+    if not sugerencias:
+        return None
+    
+    mejor_sugerencia = sugerencias[0]
+    return {
+        'categoria_sugerida': mejor_sugerencia['categoria'],
+        'confianza': mejor_sugerencia['confianza'],
+        'palabras_encontradas': mejor_sugerencia['palabras_encontradas'],
+        'score': mejor_sugerencia['score']
+    }
+
+
+def sugerir_categoria_para_detalle(detalle, reglas=None):
     """
     Sugiere una categoría para un detalle específico basado en coincidencias parciales.
     
     Args:
         detalle: Texto del detalle de la transacción
+        reglas: ReglasCompiladas a usar (por defecto las vigentes)
     
     Returns:
         Lista de sugerencias con score de confianza
@@ -266,124 +1520,139 @@ def sugerir_categoria_para_detalle(detalle):
     if not detalle:
         return []
     
-    categorias = definir_categorias()
-    detalle_upper = detalle.upper()
-    sugerencias = []
+    if reglas is None:
+        reglas = registro_reglas.obtener()
     
-    for categoria, palabras_clave in categorias.items():
-        coincidencias = []
-        for palabra in palabras_clave:
-            if palabra in detalle_upper:
-                coincidencias.append(palabra)
-        
-        if coincidencias:
-            # Calcular score basado en número de coincidencias y longitud de palabras
-            score = len(coincidencias) * 10 + sum(len(p) for p in coincidencias)
-            sugerencias.append({
-                'categoria': categoria,
-                'score': score,
-                'palabras_encontradas': coincidencias,
-                'confianza': 'alta' if len(coincidencias) > 1 else 'media'
-            })
-    
-    # Ordenar por score descendente
-    sugerencias.sort(key=lambda x: x['score'], reverse=True)
-    return sugerencias[:3]  # Retornar top 3 sugerencias
+    return _sugerencias_desde_coincidencias(reglas, reglas.matcher.buscar_todas(normalizar_texto_comercio(detalle)))
 
-def sugerir_categoria(detalle):
+def sugerir_categoria(detalle, reglas=None):
     """
     Sugiere una categoría para una transacción sin categorizar.
     
     Args:
         detalle: Texto del detalle de la transacción
+        reglas: ReglasCompiladas a usar (por defecto las vigentes)
     
     Returns:
         dict con la mejor sugerencia o None si no hay sugerencias
     """
-    sugerencias = sugerir_categoria_para_detalle(detalle)
+    return _mejor_sugerencia(sugerir_categoria_para_detalle(detalle, reglas))
+
+def _sugerencias_por_comercio(detalles, reglas=None):
+    """
+    Agrupa los detalles por texto normalizado (ver normalizar_texto_comercio) y
+    busca una sola vez cada texto distinto. No agrupa por clave de comercio porque
+    esta descarta las palabras que siguen a la sucursal.
     
-    if not sugerencias:
-        return None
+    Returns:
+        Tupla (codigos, sugerencias_unicas): el código de texto de cada detalle y
+        la sugerencia de cada texto (igual a sugerir_categoria o None)
+    """
+    if reglas is None:
+        reglas = registro_reglas.obtener()
+    
+    textos = normalizar_textos_comercio(pd.Series(detalles, dtype=object).fillna(''))
+    codigos, unicos = pd.factorize(textos)
+    
+    sugerencias_unicas = [
+        _mejor_sugerencia(_sugerencias_desde_coincidencias(reglas, reglas.matcher.buscar_todas(clave)))
+        if clave else None
+        for clave in unicos
+    ]
+    return codigos, sugerencias_unicas
+
+
+def sugerir_categorias_lote(detalles, reglas=None):
+    """
+    Sugiere categorías para una columna de detalles. Cada detalle distinto se
+    busca una sola vez con el autómata de las reglas compiladas.
+    
+    Args:
+        detalles: Serie o lista de detalles
+        reglas: ReglasCompiladas a usar (por defecto las vigentes)
+    
+    Returns:
+        dict con 'sugerencias' (lista alineada con detalles, igual a sugerir_categoria
+        o None) y 'por_categoria' (categoría sugerida -> posiciones de las filas)
+    """
+    codigos, sugerencias_unicas = _sugerencias_por_comercio(detalles, reglas=reglas)
+    
+    sugerencias = [sugerencias_unicas[codigo] for codigo in codigos]
+    por_categoria = {}
+    for posicion, sugerencia in enumerate(sugerencias):
+        if sugerencia:
+            por_categoria.setdefault(sugerencia['categoria_sugerida'], []).append(posicion)
     
-    # Retornar la mejor sugerencia
-    mejor_sugerencia = sugerencias[0]
     return {
-        'categoria_sugerida': mejor_sugerencia['categoria'],
-        'confianza': mejor_sugerencia['confianza'],
-        'palabras_encontradas': mejor_sugerencia['palabras_encontradas'],
-        'score': mejor_sugerencia['score']
+        'sugerencias': sugerencias,
+        'por_categoria': por_categoria
     }
 
-def obtener_coincidencias_parciales(detalle, umbral_coincidencia=0.6):
+def obtener_coincidencias_parciales(detalle, umbral_coincidencia=0.6, reglas=None):
     """
     Encuentra coincidencias parciales usando similitud de texto.
     
     Args:
         detalle: Texto del detalle de la transacción
         umbral_coincidencia: Umbral mínimo de similitud (0.0 a 1.0)
+        reglas: ReglasCompiladas a usar (por defecto las vigentes)
     
     Returns:
         Lista de categorías con similitud parcial
     """
-    import difflib
-    
     if not detalle:
         return []
     
-    categorias = definir_categorias()
-    detalle_words = detalle.upper().split()
-    sugerencias_parciales = []
+    if reglas is None:
+        reglas = registro_reglas.obtener()
     
-    for categoria, palabras_clave in categorias.items():
-        for palabra_clave in palabras_clave:
-            # Verificar similitud con cada palabra del detalle
-            for detalle_word in detalle_words:
-                similitud = difflib.SequenceMatcher(
-                    None, palabra_clave, detalle_word
-                ).ratio()
-                
-                if similitud >= umbral_coincidencia:
-                    sugerencias_parciales.append({
-                        'categoria': categoria,
-                        'palabra_clave': palabra_clave,
-                        'palabra_detalle': detalle_word,
-                        'similitud': similitud,
-                        'confianza': 'baja' if similitud < 0.8 else 'media'
-                    })
-    
-    # Eliminar duplicados y ordenar por similitud
-    sugerencias_unicas = {}
-    for sug in sugerencias_parciales:
-        key = sug['categoria']
-        if key not in sugerencias_unicas or sug['similitud'] > sugerencias_unicas[key]['similitud']:
-            sugerencias_unicas[key] = sug
-    
-    # Convertir a lista y ordenar
-    resultado = list(sugerencias_unicas.values())
-    resultado.sort(key=lambda x: x['similitud'], reverse=True)
-    
-    return resultado[:5]  # Top 5 sugerencias
-
-def analizar_transacciones_sin_categorizar(df):
+    indice = reglas.indice_similitud
+    posiciones = reglas.posiciones_palabras
+    
+    # Mejor coincidencia por categoría; en empate gana la primera en orden de
+    # declaración (palabra clave y luego palabra del detalle)
+    mejores = {}
+    for indice_detalle, detalle_word in enumerate(dict.fromkeys(detalle.upper().split())):
+        for palabra_clave, similitud in indice.similares(detalle_word, umbral_coincidencia):
+            for indice_categoria, indice_palabra in posiciones.get(palabra_clave, ()):
+                orden = (indice_palabra, indice_detalle)
+                actual = mejores.get(indice_categoria)
+                if (actual is None or similitud > actual[0] or
+                        (similitud == actual[0] and orden < actual[1])):
+                    mejores[indice_categoria] = (similitud, orden, palabra_clave, detalle_word)
+    
+    nombres_categorias = list(reglas.categorias)
+    resultado = []
+    for indice_categoria in sorted(mejores, key=lambda i: (-mejores[i][0], i))[:5]:
+        similitud, _, palabra_clave, detalle_word = mejores[indice_categoria]
+        resultado.append({
+            'categoria': nombres_categorias[indice_categoria],
+            'palabra_clave': palabra_clave,
+            'palabra_detalle': detalle_word,
+            'similitud': similitud,
+            'confianza': 'baja' if similitud < 0.8 else 'media'
+        })
+    
+    return resultado  # Top 5 sugerencias
+
+def analizar_transacciones_sin_categorizar(df, reglas=None, max_ejemplos=3):
     """
     Analiza todas las transacciones sin categorizar y genera sugerencias.
+    Cada detalle normalizado distinto se busca una sola vez y los totales y ejemplos por
+    categoría sugerida salen de un único groupby.
     
     Args:
-        df: DataFrame con transacciones
+        df: DataFrame con transacciones (detalle, monto y categoria)
+        reglas: ReglasCompiladas a usar (por defecto las vigentes)
+        max_ejemplos: Ejemplos por categoría sugerida
     
     Returns:
         dict con análisis y sugerencias
     """
     if df.empty:
-        return {
-            'total_sin_categorizar': 0,
-            'monto_total': 0,
-            'con_sugerencias': 0,
-            'sin_sugerencias': 0,
-            'sugerencias_por_categoria': {}
-        }
-    
-    sin_categorizar = df[df['categoria'] == 'Sin categorizar']
+        sin_categorizar = df
+    else:
+        sin_categorizar = df[df['categoria'] == 'Sin categorizar']
     
     if sin_categorizar.empty:
         return {
@@ -394,41 +1663,44 @@ def analizar_transacciones_sin_categorizar(df):
             'sugerencias_por_categoria': {}
         }
     
-    con_sugerencias = 0
-    sin_sugerencias = 0
-    sugerencias_por_categoria = {}
+    codigos, sugerencias_unicas = _sugerencias_por_comercio(sin_categorizar['detalle'], reglas)
     
-    for _, row in sin_categorizar.iterrows():
-        sugerencia = sugerir_categoria(row['detalle'])
-        
-        if sugerencia:
-            con_sugerencias += 1
-            categoria_sug = sugerencia['categoria_sugerida']
-            
-            if categoria_sug not in sugerencias_por_categoria:
-                sugerencias_por_categoria[categoria_sug] = {
-                    'count': 0,
-                    'monto_total': 0,
-                    'ejemplos': []
-                }
-            
-            sugerencias_por_categoria[categoria_sug]['count'] += 1
-            sugerencias_por_categoria[categoria_sug]['monto_total'] += row['monto']
-            
-            if len(sugerencias_por_categoria[categoria_sug]['ejemplos']) < 3:
-                sugerencias_por_categoria[categoria_sug]['ejemplos'].append({
-                    'detalle': row['detalle'],
-                    'monto': row['monto'],
-                    'confianza': sugerencia['confianza']
-                })
-        else:
-            sin_sugerencias += 1
+    # Categoría y confianza de cada comercio, llevadas a las filas por su código
+    categorias_unicas = np.array([s['categoria_sugerida'] if s else None for s in sugerencias_unicas], dtype=object)
+    confianzas_unicas = np.array([s['confianza'] if s else None for s in sugerencias_unicas], dtype=object)
+    filas = pd.DataFrame({
+        'categoria_sugerida': categorias_unicas[codigos],
+        'confianza': confianzas_unicas[codigos],
+        'detalle': sin_categorizar['detalle'].to_numpy(),
+        'monto': sin_categorizar['monto'].to_numpy()
+    })
+    con_sugerencia = filas[filas['categoria_sugerida'].notna()]
+    
+    # Un groupby para conteos y montos; los ejemplos son las primeras filas de cada grupo
+    grupos = con_sugerencia.groupby('categoria_sugerida', sort=False)
+    totales = grupos['monto'].agg(['count', 'sum'])
+    ejemplos = {}
+    for fila in grupos.head(max_ejemplos).itertuples(index=False):
+        ejemplos.setdefault(fila.categoria_sugerida, []).append({
+            'detalle': fila.detalle,
+            'monto': float(fila.monto),
+            'confianza': fila.confianza
+        })
+    
+    sugerencias_por_categoria = {
+        categoria: {
+            'count': int(total['count']),
+            'monto_total': float(total['sum']),
+            'ejemplos': ejemplos[categoria]
+        }
+        for categoria, total in totales.iterrows()
+    }
     
     return {
         'total_sin_categorizar': len(sin_categorizar),
-        'monto_total': sin_categorizar['monto'].sum(),
-        'con_sugerencias': con_sugerencias,
-        'sin_sugerencias': sin_sugerencias,
+        'monto_total': float(sin_categorizar['monto'].sum()),
+        'con_sugerencias': len(con_sugerencia),
+        'sin_sugerencias': len(sin_categorizar) - len(con_sugerencia),
         'sugerencias_por_categoria': sugerencias_por_categoria
     }
 
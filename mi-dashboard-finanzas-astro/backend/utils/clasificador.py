@@ -0,0 +1,267 @@
+import os
+import zlib
+
+import numpy as np
+
+from utils.comercios import marcar_numeros, normalizar_texto_comercio
+
+
+# Tamaño del espacio de características (n-gramas de caracteres con hashing)
+NUM_CARACTERISTICAS = 2 ** 16
+LARGOS_NGRAMA = (3, 4, 5)
+
+# El modelo solo se usa cuando conoce al menos dos categorías, tiene suficientes
+# ejemplos y la probabilidad de la categoría predicha supera el umbral
+MIN_EJEMPLOS_MODELO = 5
+UMBRAL_CONFIANZA_MODELO = 0.9
+
+
+def caracteristicas_texto(texto, num_caracteristicas=NUM_CARACTERISTICAS):
+    """
+    Devuelve los índices (con repetición) de los n-gramas de caracteres del texto,
+    asignados a columnas con crc32 para no tener que guardar un vocabulario.
+    """
+    texto = f' {marcar_numeros(normalizar_texto_comercio(texto))} '
+    indices = [
+        zlib.crc32(texto[i:i + largo].encode('utf-8')) % num_caracteristicas
+        for largo in LARGOS_NGRAMA
+        for i in range(len(texto) - largo + 1)
+    ]
+    return np.array(indices, dtype=np.int64)
+
+
+class ClasificadorCategorias:
+    """
+    Naive Bayes multinomial sobre n-gramas de caracteres con hashing.
+    Se entrena con las categorías asignadas manualmente y se actualiza ejemplo a
+    ejemplo sumando conteos, sin reentrenar. Corre solo en CPU con numpy.
+    """
+
+    def __init__(self, num_caracteristicas=NUM_CARACTERISTICAS, alfa=1.0):
+        self.num_caracteristicas = num_caracteristicas
+        self.alfa = alfa
+        self.categorias = []
+        self._indice_categoria = {}
+        self.conteos = np.zeros((0, num_caracteristicas), dtype=np.float32)
+        self.documentos = np.zeros(0, dtype=np.float64)
+        self._parametros = None
+
+    @property
+    def total_ejemplos(self):
+        return float(self.documentos.sum())
+
+    @property
+    def listo(self):
+        """True si el modelo tiene datos suficientes para predecir"""
+        return (int((self.documentos > 0).sum()) >= 2 and
+                self.total_ejemplos >= MIN_EJEMPLOS_MODELO)
+
+    def _fila_categoria(self, categoria):
+        fila = self._indice_categoria.get(categoria)
+        if fila is None:
+            fila = len(self.categorias)
+            self.categorias.append(categoria)
+            self._indice_categoria[categoria] = fila
+            self.conteos = np.vstack([self.conteos, np.zeros((1, self.num_caracteristicas), dtype=np.float32)])
+            self.documentos = np.append(self.documentos, 0.0)
+        return fila
+
+    def entrenar(self, textos, categorias):
+        """
+        Suma al modelo un lote de ejemplos (textos con su categoría).
+        """
+        filas = []
+        columnas = []
+        for texto, categoria in zip(textos, categorias):
+            fila = self._fila_categoria(categoria)
+            caracteristicas = caracteristicas_texto(texto, self.num_caracteristicas)
+            filas.append(np.full(len(caracteristicas), fila, dtype=np.int64))
+            columnas.append(caracteristicas)
+            self.documentos[fila] += 1
+
+        if filas:
+            np.add.at(self.conteos, (np.concatenate(filas), np.concatenate(columnas)), 1)
+        self._parametros = None
+
+    def actualizar(self, texto, categoria, peso=1.0):
+        """Suma (o resta, con peso negativo) un ejemplo al modelo"""
+        fila = self._fila_categoria(categoria)
+        np.add.at(self.conteos[fila], caracteristicas_texto(texto, self.num_caracteristicas), peso)
+        np.maximum(self.conteos[fila], 0, out=self.conteos[fila])
+        self.documentos[fila] = max(self.documentos[fila] + peso, 0.0)
+        self._parametros = None
+
+    def olvidar(self, texto, categoria):
+        """Quita un ejemplo previamente aprendido (por ejemplo, una sobrescritura corregida)"""
+        if categoria in self._indice_categoria:
+            self.actualizar(texto, categoria, peso=-1.0)
+
+    def _obtener_parametros(self):
+        """Log-probabilidades a priori y por característica (se recalculan tras cada cambio)"""
+        if self._parametros is None:
+            documentos = self.documentos + 1e-9
+            log_prior = np.log(documentos / documentos.sum())
+            suavizado = self.conteos.astype(np.float64) + self.alfa
+            log_verosimilitud = np.log(suavizado / suavizado.sum(axis=1, keepdims=True))
+            self._parametros = (log_prior, log_verosimilitud)
+        return self._parametros
+
+    def predecir_lote(self, textos, tam_lote=2000):
+        """
+        Predice la categoría de muchos textos a la vez.
+
+        Returns:
+            Tupla (categorias, confianzas): arreglo de categorías (None si el texto no
+            tiene características) y arreglo con la probabilidad de cada predicción
+        """
+        textos = list(textos)
+        categorias = np.full(len(textos), None, dtype=object)
+        confianzas = np.zeros(len(textos), dtype=np.float64)
+        if not textos or not self.categorias:
+            return categorias, confianzas
+
+        log_prior, log_verosimilitud = self._obtener_parametros()
+        nombres = np.array(self.categorias, dtype=object)
+
+        for inicio in range(0, len(textos), tam_lote):
+            caracteristicas = [caracteristicas_texto(t, self.num_caracteristicas)
+                               for t in textos[inicio:inicio + tam_lote]]
+            largos = np.array([len(c) for c in caracteristicas])
+            con_datos = np.flatnonzero(largos > 0)
+            if len(con_datos) == 0:
+                continue
+
+            # Suma de log-verosimilitudes por texto: una sola indexación y reduceat
+            todas = np.concatenate([caracteristicas[i] for i in con_datos])
+            desplazamientos = np.concatenate([[0], np.cumsum(largos[con_datos])[:-1]])
+            puntajes = np.add.reduceat(log_verosimilitud[:, todas], desplazamientos, axis=1)
+            puntajes += log_prior[:, None]
+
+            # Probabilidad a posteriori normalizada (softmax estable)
+            puntajes -= puntajes.max(axis=0, keepdims=True)
+            probabilidades = np.exp(puntajes)
+            probabilidades /= probabilidades.sum(axis=0, keepdims=True)
+
+            mejores = probabilidades.argmax(axis=0)
+            posiciones = inicio + con_datos
+            categorias[posiciones] = nombres[mejores]
+            confianzas[posiciones] = probabilidades[mejores, np.arange(len(con_datos))]
+
+        return categorias, confianzas
+
+    def guardar(self, ruta):
+        """Guarda el modelo en un archivo .npz (se escribe a un temporal y se reemplaza)"""
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        temporal = f'{ruta}.tmp.npz'
+        np.savez_compressed(
+            temporal,
+            conteos=self.conteos,
+            documentos=self.documentos,
+            categorias=np.array(self.categorias, dtype=str),
+            configuracion=np.array([self.num_caracteristicas, self.alfa], dtype=np.float64)
+        )
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Carga un modelo guardado con guardar()"""
+        with np.load(ruta) as datos:
+            num_caracteristicas, alfa = datos['configuracion']
+            modelo = cls(num_caracteristicas=int(num_caracteristicas), alfa=float(alfa))
+            modelo.categorias = [str(c) for c in datos['categorias']]
+            modelo._indice_categoria = {c: i for i, c in enumerate(modelo.categorias)}
+            modelo.conteos = datos['conteos'].astype(np.float32)
+            modelo.documentos = datos['documentos'].astype(np.float64)
+        return modelo
+
+
+class RegistroClasificador:
+    """
+    Modelo aprendido compartido por el proceso. Está desactivado hasta que se
+    configura la ruta del archivo del modelo (o se entrega un modelo en memoria).
+    """
+
+    def __init__(self):
+        self._ruta = None
+        self._modelo = None
+
+    def configurar_ruta(self, ruta):
+        """Define dónde se guarda el modelo; se carga al primer uso si el archivo existe"""
+        self._ruta = ruta
+        self._modelo = None
+
+    def establecer(self, modelo):
+        """Usa un modelo ya construido (None lo desactiva si no hay ruta configurada)"""
+        self._modelo = modelo
+
+    @property
+    def activo(self):
+        return self._ruta is not None or self._modelo is not None
+
+    @property
+    def existe_archivo(self):
+        return self._ruta is not None and os.path.exists(self._ruta)
+
+    def obtener(self):
+        """Devuelve el modelo vigente (cargándolo si hace falta) o None si está desactivado"""
+        if self._modelo is None and self._ruta is not None:
+            if os.path.exists(self._ruta):
+                try:
+                    self._modelo = ClasificadorCategorias.cargar(self._ruta)
+                except Exception as e:
+                    print(f"Warning: No se pudo cargar el modelo de categorías: {e}")
+                    self._modelo = ClasificadorCategorias()
+            else:
+                self._modelo = ClasificadorCategorias()
+        return self._modelo
+
+    def _guardar(self):
+        if self._ruta is not None and self._modelo is not None:
+            self._modelo.guardar(self._ruta)
+
+    def entrenar(self, textos, categorias):
+        """Reemplaza el modelo por uno entrenado desde cero con los ejemplos dados"""
+        if not self.activo:
+            return None
+        modelo = ClasificadorCategorias()
+        modelo.entrenar(textos, categorias)
+        self._modelo = modelo
+        self._guardar()
+        return modelo
+
+    def aprender(self, texto, categoria, categoria_anterior=None):
+        """
+        Aprende una sobrescritura manual. Si la transacción ya tenía una sobrescritura
+        anterior, ese ejemplo se olvida primero para no contarla dos veces.
+
+        Returns:
+            True si el modelo se actualizó, False si está desactivado
+        """
+        modelo = self.obtener()
+        if modelo is None:
+            return False
+        if categoria_anterior is not None:
+            modelo.olvidar(texto, categoria_anterior)
+        modelo.actualizar(texto, categoria)
+        self._guardar()
+        return True
+
+    def predecir_lote(self, textos, umbral=UMBRAL_CONFIANZA_MODELO):
+        """
+        Devuelve una lista alineada con textos con la categoría predicha, o None si
+        el modelo no está listo o la confianza no alcanza el umbral.
+        """
+        textos = list(textos)
+        modelo = self.obtener()
+        if modelo is None or not modelo.listo:
+            return [None] * len(textos)
+
+        categorias, confianzas = modelo.predecir_lote(textos)
+        return [categoria if confianza >= umbral else None
+                for categoria, confianza in zip(categorias, confianzas)]
+
+
+# Registro único del proceso
+registro_clasificador = RegistroClasificador()
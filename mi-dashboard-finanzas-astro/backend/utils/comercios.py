@@ -0,0 +1,130 @@
+import re
+
+import pandas as pd
+
+
+# Secuencias de dígitos (sucursales, fechas, horas, terminales, sufijos de tarjeta),
+# incluyendo separadores entre dígitos como en 12/03/2024, 10:45 o 1.234
+PATRON_DIGITOS = re.compile(r'\d+(?:[./:\-]\d+)*')
+PATRON_ESPACIOS = re.compile(r'\s+')
+
+# Marcador que reemplaza cada secuencia de dígitos en la clave de comercio. Mantiene
+# separadas las palabras vecinas y la cantidad de palabras del texto. Solo se usa en
+# la clave y en el modelo aprendido: las reglas se buscan con los dígitos, así una
+# palabra clave numérica (RUT, cuenta, sufijo de tarjeta) no coincide con cualquier número.
+MARCADOR_NUMERO = '#'
+
+# Palabras de operación que suelen ir antes del comercio ("COMPRA 123456 JUMBO");
+# un número detrás de ellas es un número de operación y no corta la clave
+PALABRAS_OPERACION = frozenset({
+    'COMPRA', 'COMPRAS', 'PAGO', 'CARGO', 'ABONO', 'CUOTA', 'GIRO', 'DEPOSITO', 'DEPÓSITO', 'TRASPASO',
+    'TRANSF', 'TRANSFERENCIA', 'TEF', 'OPERACION', 'OPERACIÓN', 'OP', 'NRO', 'NUM', 'NO', 'N', 'REF',
+    'A', 'AL', 'DE', 'DEL', 'EN', 'POR',
+})
+
+
+def normalizar_texto_comercio(texto):
+    """
+    Normaliza un detalle para buscar reglas: mayúsculas y espacios simples, sin
+    tocar los dígitos. Conserva todas las palabras, así las posiciones de las
+    reglas se cuentan sobre este texto.
+    Por ejemplo, "compra  jumbo 123 las condes" da "COMPRA JUMBO 123 LAS CONDES".
+    """
+    return PATRON_ESPACIOS.sub(' ', str(texto).upper()).strip()
+
+
+def normalizar_textos_comercio(detalles):
+    """
+    Versión vectorizada de normalizar_texto_comercio para una serie de detalles.
+    """
+    detalles = pd.Series(detalles, dtype=object).astype(str).str.upper()
+    return detalles.str.replace(PATRON_ESPACIOS, ' ', regex=True).str.strip()
+
+
+def marcar_numeros(texto):
+    """
+    Reemplaza cada secuencia de dígitos por '#' en un texto normalizado (ver
+    normalizar_texto_comercio). Por ejemplo, "COMPRA JUMBO 123 15/03" da "COMPRA JUMBO # #".
+    """
+    return PATRON_DIGITOS.sub(MARCADOR_NUMERO, texto)
+
+
+def origenes_texto_comercio(texto, solo_mayusculas=False):
+    """
+    Devuelve la posición en el texto original de cada carácter de
+    normalizar_texto_comercio(texto), para llevar a ese texto las posiciones
+    encontradas en el normalizado. Con solo_mayusculas, el normalizado es solo
+    el texto en mayúsculas y sin espacios en los extremos (como se comparan
+    nombre_destino y comentario), sin juntar los espacios interiores.
+    """
+    texto = str(texto)
+    caracteres, origenes = [], []
+    for posicion, caracter in enumerate(texto):
+        mayuscula = caracter.upper()
+        caracteres.extend(mayuscula)
+        origenes.extend([posicion] * len(mayuscula))
+    
+    sustituciones = () if solo_mayusculas else ((PATRON_ESPACIOS, ' '),)
+    for patron, reemplazo in sustituciones:
+        nuevos_caracteres, nuevos_origenes, ultimo = [], [], 0
+        for coincidencia in patron.finditer(''.join(caracteres)):
+            nuevos_caracteres.extend(caracteres[ultimo:coincidencia.start()])
+            nuevos_origenes.extend(origenes[ultimo:coincidencia.start()])
+            nuevos_caracteres.append(reemplazo)
+            nuevos_origenes.append(origenes[coincidencia.start()])
+            ultimo = coincidencia.end()
+        caracteres = nuevos_caracteres + caracteres[ultimo:]
+        origenes = nuevos_origenes + origenes[ultimo:]
+    
+    inicio, fin = 0, len(caracteres)
+    while inicio < fin and caracteres[inicio].isspace():
+        inicio += 1
+    while fin > inicio and caracteres[fin - 1].isspace():
+        fin -= 1
+    return origenes[inicio:fin]
+
+
+def _es_numero(palabra):
+    """Palabra sin letras que contiene al menos un número ('#', '#/#', '****#')"""
+    return MARCADOR_NUMERO in palabra and not any(caracter.isalpha() for caracter in palabra)
+
+
+def recortar_sucursal(texto):
+    """
+    Corta un texto con los números marcados (ver marcar_numeros) en el primer número
+    que sigue al nombre del comercio: ese número y lo que viene detrás son
+    sucursal, terminal, comuna o fecha. Los números detrás de palabras de operación
+    (PALABRAS_OPERACION) no cortan, porque el comercio todavía no aparece.
+    """
+    palabras = texto.split(' ')
+    con_comercio = False
+    for indice, palabra in enumerate(palabras):
+        if _es_numero(palabra):
+            if con_comercio:
+                return ' '.join(palabras[:indice])
+        elif palabra not in PALABRAS_OPERACION and any(caracter.isalpha() for caracter in palabra):
+            con_comercio = True
+    return texto
+
+
+def normalizar_comercio(texto):
+    """
+    Devuelve la clave de comercio de un detalle: el texto normalizado (ver
+    normalizar_texto_comercio) con los números marcados y sin el número de
+    sucursal o terminal ni lo que le sigue.
+    Por ejemplo, "COMPRA JUMBO 123 LAS CONDES" y "compra  jumbo 456" dan "COMPRA JUMBO".
+    Si cambia esta normalización, las claves guardadas se recalculan con una
+    migración nueva en scripts/setup/migrate_database.py.
+    """
+    return recortar_sucursal(marcar_numeros(normalizar_texto_comercio(texto)))
+
+
+def normalizar_comercios(detalles):
+    """
+    Versión vectorizada de normalizar_comercio para una serie de detalles; el
+    recorte se hace una vez por texto con números marcados distinto.
+    """
+    textos = normalizar_textos_comercio(detalles).str.replace(PATRON_DIGITOS, MARCADOR_NUMERO, regex=True)
+    codigos, unicos = pd.factorize(textos)
+    claves = pd.Index(unicos).map(recortar_sucursal).to_numpy(dtype=object)
+    return pd.Series(claves[codigos], index=textos.index, dtype=object)
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+
+# Condiciones que puede tener una regla, además de sus palabras clave:
+#   monto_min / monto_max: rango de monto (inclusive, en pesos, siempre positivo)
+#   dias_mes: días del mes (1 a 31)
+#   dias_semana: días de la semana (0 = lunes ... 6 = domingo)
+#   tipos: tipos de movimiento ('Gasto', 'Ingreso')
+#   canales: textos que debe contener el canal (por ejemplo "INTERNET")
+#   prioridad: entre reglas que coinciden gana la de mayor prioridad (por defecto 0)
+CAMPOS_CONDICION = ('monto_min', 'monto_max', 'dias_mes', 'dias_semana', 'tipos', 'canales', 'prioridad')
+TIPOS_MOVIMIENTO = ('Gasto', 'Ingreso')
+
+
+def normalizar_condiciones(condiciones):
+    """
+    Valida las condiciones de una regla y las devuelve normalizadas (listas
+    ordenadas, canales en mayúsculas). Las condiciones vacías se omiten.
+
+    Returns:
+        dict con las condiciones, vacío si la regla no tiene condiciones
+
+    Raises:
+        ValueError si alguna condición no es válida
+    """
+    if not condiciones:
+        return {}
+    if not isinstance(condiciones, dict):
+        raise ValueError("Las condiciones deben ser un objeto")
+
+    desconocidos = set(condiciones) - set(CAMPOS_CONDICION)
+    if desconocidos:
+        raise ValueError(f"Condiciones desconocidas: {', '.join(sorted(desconocidos))}")
+
+    def lista_enteros(campo, minimo, maximo):
+        valores = condiciones[campo]
+        if not isinstance(valores, list) or not all(isinstance(v, int) and minimo <= v <= maximo for v in valores):
+            raise ValueError(f"'{campo}' debe ser una lista de enteros entre {minimo} y {maximo}")
+        return sorted(set(valores))
+
+    normalizadas = {}
+    for campo in ('monto_min', 'monto_max'):
+        if condiciones.get(campo) is not None:
+            try:
+                normalizadas[campo] = float(condiciones[campo])
+            except (TypeError, ValueError):
+                raise ValueError(f"'{campo}' debe ser un número")
+    if normalizadas.get('monto_min', -np.inf) > normalizadas.get('monto_max', np.inf):
+        raise ValueError("'monto_min' no puede ser mayor que 'monto_max'")
+
+    if condiciones.get('dias_mes'):
+        normalizadas['dias_mes'] = lista_enteros('dias_mes', 1, 31)
+    if condiciones.get('dias_semana'):
+        normalizadas['dias_semana'] = lista_enteros('dias_semana', 0, 6)
+
+    if condiciones.get('tipos'):
+        tipos = condiciones['tipos']
+        if not isinstance(tipos, list) or not set(tipos) <= set(TIPOS_MOVIMIENTO):
+            raise ValueError(f"'tipos' debe ser una lista con valores de {', '.join(TIPOS_MOVIMIENTO)}")
+        normalizadas['tipos'] = [tipo for tipo in TIPOS_MOVIMIENTO if tipo in tipos]
+
+    if condiciones.get('canales'):
+        canales = condiciones['canales']
+        if not isinstance(canales, list):
+            raise ValueError("'canales' debe ser una lista de textos")
+        canales = sorted({str(canal).strip().upper() for canal in canales} - {''})
+        if canales:
+            normalizadas['canales'] = canales
+
+    if condiciones.get('prioridad') is not None:
+        if not isinstance(condiciones['prioridad'], int):
+            raise ValueError("'prioridad' debe ser un entero")
+        normalizadas['prioridad'] = condiciones['prioridad']
+
+    # La prioridad sola no restringe nada
+    return normalizadas if set(normalizadas) - {'prioridad'} else {}
+
+
+class TablaCondiciones:
+    """
+    Tabla de decisión con las condiciones de varias reglas (una columna por regla).
+    Cada condición se evalúa por columna del DataFrame con máscaras booleanas de
+    numpy: los valores de día, tipo y canal se llevan a códigos y se indexa una
+    tabla regla x valor, así el costo por fila no depende de las reglas.
+    """
+
+    def __init__(self, condiciones):
+        condiciones = [dict(c) for c in condiciones]
+        cantidad = len(condiciones)
+        self.cantidad = cantidad
+
+        self.con_monto = np.array([('monto_min' in c or 'monto_max' in c) for c in condiciones], dtype=bool)
+        self.monto_min = np.array([c.get('monto_min', -np.inf) for c in condiciones], dtype=np.float64)
+        self.monto_max = np.array([c.get('monto_max', np.inf) for c in condiciones], dtype=np.float64)
+
+        # Tablas regla x valor; la última columna es "valor desconocido", que solo
+        # cumplen las reglas sin esa condición
+        self.dias_mes = self._tabla_valores(condiciones, 'dias_mes', range(1, 32))
+        self.dias_semana = self._tabla_valores(condiciones, 'dias_semana', range(7))
+        self.tipos = [set(c['tipos']) if 'tipos' in c else None for c in condiciones]
+        self.canales = [tuple(c['canales']) if 'canales' in c else None for c in condiciones]
+
+        # Prioridad única por regla: primero la prioridad declarada y luego el orden
+        prioridades = np.array([c.get('prioridad', 0) for c in condiciones], dtype=np.int64)
+        self.prioridades = prioridades * max(cantidad, 1) + np.arange(cantidad)[::-1]
+
+    @staticmethod
+    def _tabla_valores(condiciones, campo, valores):
+        valores = list(valores)
+        posicion = {valor: i for i, valor in enumerate(valores)}
+        tabla = np.ones((len(condiciones), len(valores) + 1), dtype=bool)
+        for fila, condicion in enumerate(condiciones):
+            if campo in condicion:
+                tabla[fila] = False
+                tabla[fila, [posicion[v] for v in condicion[campo]]] = True
+        return tabla
+
+    @staticmethod
+    def _tabla_por_codigo(df, columna, cantidad_reglas, cumple):
+        """
+        Factoriza una columna de texto y evalúa cumple(regla, valor) una vez por
+        valor distinto. Devuelve la máscara filas x reglas.
+        """
+        if columna in df.columns:
+            codigos, unicos = pd.factorize(df[columna])
+        else:
+            codigos, unicos = np.full(len(df), -1), []
+
+        tabla = np.empty((cantidad_reglas, len(unicos) + 1), dtype=bool)
+        for regla in range(cantidad_reglas):
+            tabla[regla, :-1] = [cumple(regla, valor) for valor in unicos]
+            tabla[regla, -1] = cumple(regla, None)
+        # El código -1 (valor faltante) toma la última columna
+        return tabla[:, codigos].T
+
+    def _cumple_tipo(self, regla, tipo):
+        return self.tipos[regla] is None or tipo in self.tipos[regla]
+
+    def _cumple_canal(self, regla, canal):
+        return self.canales[regla] is None or (
+            canal is not None and any(c in str(canal).upper() for c in self.canales[regla])
+        )
+
+    def _cumple_monto_y_fecha(self, monto, dia_mes, dia_semana):
+        """
+        Máscara filas x reglas de las condiciones de monto y día. dia_mes va de 0
+        a 30 y dia_semana de 0 a 6; 31 y 7 son "día desconocido".
+        """
+        cumple = (monto[:, None] >= self.monto_min) & (monto[:, None] <= self.monto_max)
+        cumple |= ~self.con_monto
+        cumple &= self.dias_mes[:, dia_mes].T
+        cumple &= self.dias_semana[:, dia_semana].T
+        return cumple
+
+    def evaluar(self, df):
+        """
+        Evalúa todas las condiciones sobre las filas del DataFrame (columnas monto,
+        fecha, tipo y canal; las que falten solo las cumplen las reglas sin esa condición).
+
+        Returns:
+            Matriz booleana filas x reglas
+        """
+        filas = len(df)
+        if 'monto' in df.columns:
+            monto = pd.to_numeric(df['monto'], errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            monto = np.full(filas, np.nan)
+
+        if 'fecha' in df.columns:
+            fechas = pd.to_datetime(df['fecha'], errors='coerce')
+            dia_mes = fechas.dt.day.fillna(32).to_numpy(dtype=np.int64) - 1
+            dia_semana = fechas.dt.weekday.fillna(7).to_numpy(dtype=np.int64)
+        else:
+            dia_mes = np.full(filas, 31)
+            dia_semana = np.full(filas, 7)
+        cumple = self._cumple_monto_y_fecha(monto, dia_mes, dia_semana)
+
+        cumple &= self._tabla_por_codigo(df, 'tipo', self.cantidad, self._cumple_tipo)
+        cumple &= self._tabla_por_codigo(df, 'canal', self.cantidad, self._cumple_canal)
+        return cumple
+
+    def evaluar_valores(self, monto=None, fecha=None, tipo=None, canal=None):
+        """
+        Igual que evaluar, para una sola transacción dada por sus valores (None
+        si no se conocen), sin armar un DataFrame.
+
+        Returns:
+            Arreglo booleano con una posición por regla
+        """
+        monto = pd.to_numeric(monto, errors='coerce') if monto is not None else np.nan
+        fecha = pd.to_datetime(fecha, errors='coerce') if fecha is not None else pd.NaT
+        if pd.isna(fecha):
+            dia_mes, dia_semana = 31, 7
+        else:
+            dia_mes, dia_semana = fecha.day - 1, fecha.weekday()
+        cumple = self._cumple_monto_y_fecha(
+            np.array([monto], dtype=np.float64), np.array([dia_mes]), np.array([dia_semana])
+        )[0]
+
+        tipo = None if pd.isna(tipo) else tipo
+        canal = None if pd.isna(canal) else canal
+        cumple &= np.array([self._cumple_tipo(regla, tipo) for regla in range(self.cantidad)], dtype=bool)
+        cumple &= np.array([self._cumple_canal(regla, canal) for regla in range(self.cantidad)], dtype=bool)
+        return cumple
+
+
+def resolver_prioridad(coincide, prioridades):
+    """
+    Elige para cada fila la regla de mayor prioridad entre las que coinciden,
+    con un argmax sobre la matriz filas x reglas de prioridades.
+
+    Returns:
+        Tupla (regla_ganadora, con_regla): índice de la regla por fila y máscara de
+        las filas con al menos una regla
+    """
+    if coincide.shape[1] == 0:
+        return np.zeros(len(coincide), dtype=np.int64), np.zeros(len(coincide), dtype=bool)
+
+    puntajes = np.where(coincide, prioridades, np.iinfo(np.int64).min)
+    return puntajes.argmax(axis=1), coincide.any(axis=1)
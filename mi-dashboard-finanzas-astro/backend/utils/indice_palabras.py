@@ -0,0 +1,198 @@
+import difflib
+
+import numpy as np
+
+from utils.comercios import normalizar_texto_comercio
+
+
+def _trigramas(texto):
+    """Devuelve el conjunto de trigramas de caracteres de un texto"""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndicePalabrasTransacciones:
+    """
+    Índice invertido palabra clave -> transacciones, basado en trigramas de caracteres.
+    Encuentra las transacciones cuyo detalle contiene una palabra (por subcadena, igual
+    que la categorización) sin recorrer todo el historial. Textos y palabras se normalizan
+    como en la categorización, y cada texto distinto se indexa una sola vez.
+    """
+
+    def __init__(self):
+        self._textos = []          # texto distinto por posición
+        self._posicion_texto = {}  # texto -> posición
+        self._ids_por_texto = []   # posición -> set de ids
+        self._texto_por_id = {}    # id -> posición
+        self._postings = {}        # trigrama -> set de posiciones
+
+    def __len__(self):
+        return len(self._texto_por_id)
+
+    def agregar(self, ids, textos):
+        """
+        Agrega transacciones al índice.
+
+        Args:
+            ids: Iterable de ids de transacción
+            textos: Iterable de detalles alineado con ids
+        """
+        for transaccion_id, texto in zip(ids, textos):
+            texto = normalizar_texto_comercio(texto)
+            posicion = self._posicion_texto.get(texto)
+            if posicion is None:
+                posicion = len(self._textos)
+                self._textos.append(texto)
+                self._posicion_texto[texto] = posicion
+                self._ids_por_texto.append(set())
+                for trigrama in _trigramas(texto):
+                    self._postings.setdefault(trigrama, set()).add(posicion)
+
+            self._ids_por_texto[posicion].add(transaccion_id)
+            self._texto_por_id[transaccion_id] = posicion
+
+    def quitar(self, ids):
+        """Quita transacciones del índice (el texto queda indexado aunque no tenga ids)"""
+        for transaccion_id in ids:
+            posicion = self._texto_por_id.pop(transaccion_id, None)
+            if posicion is not None:
+                self._ids_por_texto[posicion].discard(transaccion_id)
+
+    def _posiciones_con(self, palabra):
+        """Posiciones de los textos distintos que contienen la palabra"""
+        if len(palabra) < 3:
+            # Palabras muy cortas no tienen trigramas: revisar cada texto distinto
+            candidatos = range(len(self._textos))
+        else:
+            listas = [self._postings.get(trigrama, set()) for trigrama in _trigramas(palabra)]
+            listas.sort(key=len)
+            candidatos = set(listas[0])
+            for lista in listas[1:]:
+                if not candidatos:
+                    break
+                candidatos &= lista
+
+        return [posicion for posicion in candidatos if palabra in self._textos[posicion]]
+
+    def buscar(self, palabra):
+        """
+        Devuelve el set de ids cuyas transacciones contienen la palabra clave.
+        """
+        palabra = normalizar_texto_comercio(palabra)
+        if not palabra:
+            return set()
+
+        ids = set()
+        for posicion in self._posiciones_con(palabra):
+            ids |= self._ids_por_texto[posicion]
+        return ids
+
+    def buscar_varias(self, palabras):
+        """Devuelve el set de ids que contienen al menos una de las palabras"""
+        ids = set()
+        for palabra in palabras:
+            ids |= self.buscar(palabra)
+        return ids
+
+
+class IndiceSimilitudPalabras:
+    """
+    Índice del vocabulario de palabras clave para buscar palabras parecidas.
+    Cada palabra se guarda como un vector de conteo de caracteres: la suma de los
+    mínimos contra la palabra buscada es la cota de SequenceMatcher.quick_ratio, que
+    nunca es menor que ratio(). Con esa cota se descartan de una vez (con numpy) las
+    palabras que no pueden alcanzar el umbral y solo se compara el resto, así que el
+    resultado es el mismo que comparar contra todo el vocabulario.
+    """
+
+    def __init__(self, palabras=()):
+        self._palabras = []        # palabra clave por fila
+        self._fila = {}            # palabra clave -> fila
+        self._columnas = {}        # caracter -> columna
+        self._conteos = np.zeros((0, 0), dtype=np.int32)
+        self._largos = np.zeros(0, dtype=np.int32)
+        self.agregar(palabras)
+
+    def __len__(self):
+        return len(self._palabras)
+
+    def __contains__(self, palabra):
+        return palabra in self._fila
+
+    def agregar(self, palabras):
+        """Agrega palabras clave nuevas al vocabulario (las repetidas se ignoran)"""
+        nuevas = [palabra for palabra in dict.fromkeys(palabras) if palabra not in self._fila]
+        if not nuevas:
+            return
+
+        for palabra in nuevas:
+            for caracter in palabra:
+                self._columnas.setdefault(caracter, len(self._columnas))
+
+        filas, columnas = self._conteos.shape
+        conteos = np.zeros((filas + len(nuevas), len(self._columnas)), dtype=np.int32)
+        conteos[:filas, :columnas] = self._conteos
+        for desplazamiento, palabra in enumerate(nuevas):
+            fila = filas + desplazamiento
+            for caracter in palabra:
+                conteos[fila, self._columnas[caracter]] += 1
+            self._fila[palabra] = fila
+            self._palabras.append(palabra)
+
+        self._conteos = conteos
+        self._largos = np.concatenate([self._largos, [len(p) for p in nuevas]]).astype(np.int32)
+
+    def quitar(self, palabras):
+        """Quita palabras clave del vocabulario"""
+        filas = sorted({self._fila[palabra] for palabra in palabras if palabra in self._fila})
+        if not filas:
+            return
+
+        self._conteos = np.delete(self._conteos, filas, axis=0)
+        self._largos = np.delete(self._largos, filas)
+        quitar = set(filas)
+        self._palabras = [p for fila, p in enumerate(self._palabras) if fila not in quitar]
+        self._fila = {palabra: fila for fila, palabra in enumerate(self._palabras)}
+
+    def actualizado(self, palabras):
+        """
+        Devuelve un índice nuevo con el vocabulario indicado, reutilizando los
+        conteos ya calculados: solo se procesan las palabras agregadas o quitadas.
+        El índice actual no se modifica.
+        """
+        vocabulario = set(palabras)
+        indice = IndiceSimilitudPalabras()
+        indice._palabras = list(self._palabras)
+        indice._fila = dict(self._fila)
+        indice._columnas = dict(self._columnas)
+        indice._conteos = self._conteos
+        indice._largos = self._largos
+        indice.quitar([palabra for palabra in self._palabras if palabra not in vocabulario])
+        indice.agregar(palabras)
+        return indice
+
+    def similares(self, palabra, umbral):
+        """
+        Devuelve las palabras clave con SequenceMatcher(None, clave, palabra).ratio()
+        mayor o igual al umbral, como lista de (palabra_clave, similitud) en el orden
+        del vocabulario.
+        """
+        if not self._palabras or not palabra:
+            return []
+
+        vector = np.zeros(len(self._columnas), dtype=np.int32)
+        for caracter in palabra:
+            columna = self._columnas.get(caracter)
+            if columna is not None:
+                vector[columna] += 1
+
+        comunes = np.minimum(self._conteos, vector).sum(axis=1)
+        cotas = 2.0 * comunes / (self._largos + len(palabra))
+        candidatos = np.flatnonzero(cotas >= umbral)
+
+        resultado = []
+        for fila in candidatos:
+            palabra_clave = self._palabras[fila]
+            similitud = difflib.SequenceMatcher(None, palabra_clave, palabra).ratio()
+            if similitud >= umbral:
+                resultado.append((palabra_clave, similitud))
+        return resultado
@@ -1,43 +1,212 @@
 import pandas as pd
+import numpy as np
+from pandas.io.parsers import TextParser
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import io
+import os
+import re
+import time
+
+from utils.comercios import normalizar_comercios
+
+
+# Filas de cabecera de cada formato y cuántas filas se revisan para detectarlo
+FILA_HEADER_CARTOLA = 24
+FILA_HEADER_TEF = 11
+FILAS_DETECCION = 30
+
+# Inferencia del año de las fechas DD/MM de la cartola: un retroceso de más de
+# MAX_RETROCESO_DIAS entre filas consecutivas es un cambio de año, y el orden de las
+# filas se considera cronológico si a lo más FRACCION_DESORDEN de los pasos retrocede
+MAX_RETROCESO_DIAS = 186
+FRACCION_DESORDEN = 0.1
+_PATRON_FECHA_CARTOLA = r'^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?$'
+_DIAS_POR_MES = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+_PATRON_FECHA_COMPLETA = r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b'
+
+# Patrones que sugieren ingresos en una transferencia, buscados con una sola expresión
+PATRONES_INGRESO_TEF = [
+    'SUELDO', 'SALARIO', 'NOMINA', 'HONORARIOS', 'REMUNERACION',
+    'DEVOLUCION', 'REEMBOLSO', 'DEPOSITO', 'ABONO', 'CREDITO',
+    'PENSION', 'JUBILACION', 'SUBSIDIO', 'BECA', 'PREMIO',
+    'VENTA', 'COBRO', 'PAGO RECIBIDO', 'TRANSFERENCIA RECIBIDA'
+]
+_REGEX_INGRESO_TEF = re.compile('|'.join(re.escape(patron) for patron in PATRONES_INGRESO_TEF))
+
+# Procesos para leer varios archivos a la vez (None usa todos los núcleos)
+MAX_PROCESOS_CARGA = None
+
+# Filas por fragmento al leer un archivo en flujo (ver procesar_archivo_excel_en_fragmentos)
+TAM_FRAGMENTO_EXCEL = 5000
+
+
+def leer_grilla_excel(archivo_path, nrows=None):
+    """
+    Lee la primera hoja del archivo como grilla de celdas sin interpretar
+    (sin cabecera, celdas vacías como ''). Es el único parseo del archivo: la
+    detección de formato y la carga trabajan sobre esta grilla.
+    """
+    return pd.read_excel(archivo_path, header=None, dtype=object, na_filter=False, nrows=nrows)
+
+
+def dataframe_desde_grilla(grilla, fila_header=0):
+    """
+    Construye el DataFrame que entregaría pd.read_excel(archivo, header=fila_header)
+    a partir de la grilla ya leída: mismos nombres de columna ('Unnamed: n',
+    duplicados numerados) y misma inferencia de tipos, sin volver a abrir el archivo.
+    """
+    if grilla.empty:
+        return pd.DataFrame()
+    return TextParser(grilla.values.tolist(), header=fila_header, skip_blank_lines=False).read()
+
+
+def detectar_formato_grilla(grilla):
+    """
+    Detecta el formato revisando solo las primeras FILAS_DETECCION filas de la grilla:
+    Cartola (header en fila 24), TEF (header en fila 11) o genérico.
+    """
+    primeras = grilla.head(FILAS_DETECCION)
+    
+    def fila_con(fila, *textos):
+        if len(primeras) <= fila:
+            return False
+        celdas = [str(celda) for celda in primeras.iloc[fila].tolist()]
+        return all(any(texto in celda for celda in celdas) for texto in textos)
+    
+    # Verificar formato Cartola (fila 24 contiene headers específicos)
+    if fila_con(FILA_HEADER_CARTOLA, 'Fecha', 'Descripción'):
+        return 'cartola'
+    
+    # Verificar formato TEF (fila 11 contiene headers específicos)
+    if fila_con(FILA_HEADER_TEF, 'Fecha', 'Origen'):
+        return 'tef'
+    
+    return 'generico'
 
 
 def detectar_formato_archivo(archivo_path):
     """
-    Detecta si el archivo es formato TEF (header en fila 11) o Cartola (header en fila 24)
+    Detecta si el archivo es formato TEF (header en fila 11) o Cartola (header en fila 24).
+    Solo lee las primeras filas del archivo.
     """
     try:
-        # Leer sin header para examinar la estructura
-        df_raw = pd.read_excel(archivo_path, header=None)
-        
-        # Verificar formato Cartola (fila 24 contiene headers específicos)
-        if len(df_raw) > 24:
-            fila_24 = df_raw.iloc[24].dropna().tolist()
-            if any('Fecha' in str(cell) for cell in fila_24) and any('Descripción' in str(cell) for cell in fila_24):
-                return 'cartola'
-        
-        # Verificar formato TEF (fila 11 contiene headers específicos)
-        if len(df_raw) > 11:
-            fila_11 = df_raw.iloc[11].dropna().tolist()
-            if any('Fecha' in str(cell) for cell in fila_11) and any('Origen' in str(cell) for cell in fila_11):
-                return 'tef'
-        
-        return 'generico'
+        return detectar_formato_grilla(leer_grilla_excel(archivo_path, nrows=FILAS_DETECCION))
     except:
         return 'generico'
 
 
-def cargar_y_limpiar_cartola(archivo_path):
+def fecha_cierre_cartola(grilla):
+    """
+    Fecha más reciente con año completo escrita sobre la cabecera de la cartola
+    (fin del período o fecha de emisión), o None si no hay ninguna.
+    """
+    fechas = []
+    for celda in grilla.head(FILA_HEADER_CARTOLA).values.ravel():
+        if isinstance(celda, datetime):
+            fechas.append(pd.Timestamp(celda))
+        elif isinstance(celda, str):
+            for dia, mes, anio in re.findall(_PATRON_FECHA_COMPLETA, celda):
+                fecha = pd.to_datetime(f"{anio}-{mes}-{dia}", errors='coerce')
+                if pd.notna(fecha):
+                    fechas.append(fecha)
+    return max(fechas) if fechas else None
+
+
+def _inferir_anios(dia, mes, referencia):
+    """
+    Año de cada fecha DD/MM (arreglos en el orden del archivo). Si las filas están
+    en orden cronológico (ascendente o descendente), cada retroceso grande entre
+    filas consecutivas es un cambio de año, contado desde la fila más reciente.
+    Si no, cada fecha toma el año más reciente que no la deja después de la referencia.
+    """
+    orden = mes * 31 + dia
+    anios = np.where(orden <= referencia.month * 31 + referencia.day, referencia.year, referencia.year - 1)
+    if len(orden) < 2:
+        return anios
+
+    pasos = np.diff(orden)
+    # Los saltos grandes (cambios de año) no cuentan para decidir el sentido
+    cortos = pasos[np.abs(pasos) <= MAX_RETROCESO_DIAS]
+    sentido = 1 if (cortos > 0).sum() >= (cortos < 0).sum() else -1
+    cambios = np.concatenate([[0], np.cumsum(sentido * pasos < -MAX_RETROCESO_DIAS)])
+    if sentido > 0:
+        anios_orden = anios[-1] - (cambios[-1] - cambios)
+    else:
+        anios_orden = anios[0] - cambios
+
+    # Con esos años, las fechas deben quedar en orden salvo un poco de desorden, y los
+    # cambios de año deben ser pocos (filas que alternan diciembre y enero no son orden)
+    pasos_fecha = sentido * np.diff(anios_orden * 372 + orden)
+    if (pasos_fecha < 0).sum() > FRACCION_DESORDEN * (pasos_fecha != 0).sum():
+        return anios
+    if cambios[-1] > max(1, FRACCION_DESORDEN * len(pasos)):
+        return anios
+    return anios_orden
+
+
+def parsear_fechas_cartola(fechas, referencia=None):
+    """
+    Convierte la columna de fechas de una cartola ('DD/MM' o 'DD/MM/AAAA') de forma
+    vectorizada. Las fechas sin año lo toman de la referencia (fecha de cierre de
+    la cartola, o hoy si no se conoce) y de los cambios de año en el orden de las
+    filas, así los movimientos de diciembre importados en enero quedan en el año
+    anterior. Las celdas que ya son fechas se conservan; el resto queda como NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(fechas):
+        return fechas
+    referencia = pd.Timestamp(referencia) if referencia is not None else pd.Timestamp(datetime.now())
+
+    # Las fechas se repiten mucho: el texto se interpreta una vez por valor distinto
+    codigos, unicos = pd.factorize(fechas.to_numpy(dtype=object))
+    partes = pd.Series(unicos, dtype=object).astype(str).str.strip().str.extract(_PATRON_FECHA_CARTOLA)
+    # Fila extra de NaN para los códigos -1 (celdas nulas)
+    partes = np.vstack([partes.to_numpy(dtype='float64'), np.full((1, 3), np.nan)])
+    dia, mes, anio = partes[codigos].T
+
+    # Solo las fechas posibles en algún año participan en la inferencia (29/02 sí, 31/02 no)
+    posibles = (mes >= 1) & (mes <= 12) & (dia >= 1) & (dia <= _DIAS_POR_MES[np.nan_to_num(mes).astype('int64') % 13])
+    sin_anio = posibles & np.isnan(anio)
+    if sin_anio.any():
+        anio[sin_anio] = _inferir_anios(dia[sin_anio].astype('int64'), mes[sin_anio].astype('int64'), referencia)
+
+    # Fecha desde los enteros: mes calendario + días; las fechas imposibles (31/02) se descartan
+    resultado = np.full(len(fechas), np.datetime64('NaT'), dtype='datetime64[ns]')
+    validas = ~np.isnan(anio) & (mes >= 1) & (mes <= 12) & (dia >= 1)
+    meses = ((anio[validas] - 1970) * 12 + mes[validas] - 1).astype('int64').astype('datetime64[M]')
+    dias = meses.astype('datetime64[D]') + (dia[validas] - 1).astype('int64').astype('timedelta64[D]')
+    en_mes = dias.astype('datetime64[M]') == meses
+    resultado[np.flatnonzero(validas)[en_mes]] = dias[en_mes]
+
+    # Celdas guardadas como fecha en el Excel
+    es_fecha = np.array([isinstance(valor, datetime) for valor in unicos] + [False])[codigos]
+    if es_fecha.any():
+        resultado[es_fecha] = pd.to_datetime(fechas[es_fecha]).to_numpy(dtype='datetime64[ns]')
+    return pd.Series(resultado, index=fechas.index)
+
+
+def cargar_y_limpiar_cartola(archivo_path, grilla=None):
     """
     Lee archivos de cartola bancaria con header en fila 24 (B25):
     - Columnas: Fecha, Descripción, Canal o Sucursal, Cargos (PESOS), Abonos (PESOS), Saldo (PESOS)
     - Convierte tipos de datos y normaliza formato
     - Determina tipo de movimiento (Gasto/Ingreso) basado en Cargos/Abonos
+    Si se entrega la grilla ya leída (ver leer_grilla_excel), no se vuelve a abrir el archivo.
     """
-    # 1. Leer con header en la fila 24
-    df = pd.read_excel(archivo_path, header=24)
+    # 1. Leer con header en la fila 24 (las filas anteriores traen el período de la cartola)
+    if grilla is None:
+        grilla = leer_grilla_excel(archivo_path)
+    df = dataframe_desde_grilla(grilla, FILA_HEADER_CARTOLA)
     
+    return _limpiar_cartola(df, referencia=fecha_cierre_cartola(grilla))
+
+
+def _limpiar_cartola(df, referencia=None):
+    """
+    Limpia las filas de una cartola ya leídas con su cabecera (pasos 2 a 9 de
+    cargar_y_limpiar_cartola). referencia es la fecha de cierre de la cartola
+    (ver fecha_cierre_cartola), usada para dar año a las fechas DD/MM.
+    """
     # 2. Quitar columnas 'Unnamed'
     df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
     
@@ -51,58 +220,15 @@ def cargar_y_limpiar_cartola(archivo_path):
         'Saldo (PESOS)': 'saldo'
     })
     
-    # 4. Convertir tipos de columna
-    def parse_fecha_robusta(fecha_serie):
-        """Parse fechas de manera robusta sin generar warnings"""
-        if pd.api.types.is_datetime64_any_dtype(fecha_serie):
-            return fecha_serie
-        
-        # Convertir a string si no lo es
-        fecha_serie = fecha_serie.astype(str)
-        
-        # Para cartola, las fechas vienen en formato DD/MM
-        # Necesitamos agregar el año actual
-        from datetime import datetime
-        año_actual = datetime.now().year
-        
-        # Procesar fecha por fecha
-        fechas_procesadas = []
-        for fecha_str in fecha_serie:
-            if pd.isna(fecha_str) or fecha_str.strip() == '' or fecha_str == 'nan':
-                fechas_procesadas.append(pd.NaT)
-                continue
-                
-            try:
-                # Si ya tiene año, usar como está
-                if len(fecha_str.split('/')) == 3:
-                    fechas_procesadas.append(pd.to_datetime(fecha_str, format='%d/%m/%Y'))
-                # Si solo tiene día/mes, agregar año actual
-                elif len(fecha_str.split('/')) == 2:
-                    fecha_completa = f"{fecha_str}/{año_actual}"
-                    fechas_procesadas.append(pd.to_datetime(fecha_completa, format='%d/%m/%Y'))
-                else:
-                    fechas_procesadas.append(pd.NaT)
-            except:
-                fechas_procesadas.append(pd.NaT)
-        
-        return pd.Series(fechas_procesadas, index=fecha_serie.index)
-    
-    df['fecha'] = parse_fecha_robusta(df['fecha'])
+    # 4. Convertir tipos de columna (fechas DD/MM o DD/MM/AAAA)
+    df['fecha'] = parsear_fechas_cartola(df['fecha'], referencia)
     
     # 5. Procesar montos - combinar cargos y abonos en una sola columna 'monto'
     df['cargo'] = pd.to_numeric(df['cargo'], errors='coerce').fillna(0.0)
     df['abono'] = pd.to_numeric(df['abono'], errors='coerce').fillna(0.0)
     
     # Crear columna monto y tipo basado en cargos/abonos
-    def procesar_movimiento(row):
-        if row['cargo'] > 0:
-            return row['cargo'], 'Gasto'
-        elif row['abono'] > 0:
-            return row['abono'], 'Ingreso'
-        else:
-            return 0.0, 'Gasto'  # Default
-    
-    df[['monto', 'tipo']] = df.apply(lambda row: pd.Series(procesar_movimiento(row)), axis=1)
+    df['monto'], df['tipo'] = _monto_y_tipo_cartola(df['cargo'], df['abono'])
     
     # 6. Limpiar strings
     campos_texto = ['detalle', 'canal']
@@ -117,13 +243,68 @@ def cargar_y_limpiar_cartola(archivo_path):
     # 8. Normalizar detalle
     df['detalle'] = df['detalle'].str.upper()
     
-    # 9. Seleccionar solo las columnas estándar
-    df = df[['fecha', 'detalle', 'monto', 'tipo', 'canal']].copy()
+    # 9. Seleccionar solo las columnas estándar (y el saldo informado por el banco)
+    columnas = ['fecha', 'detalle', 'monto', 'tipo', 'canal']
+    if 'saldo' in df.columns:
+        df['saldo'] = pd.to_numeric(df['saldo'], errors='coerce')
+        columnas.append('saldo')
+    df = df[columnas].copy()
     
     return df
 
 
-def cargar_y_limpiar_tef_cartola(archivo_path):
+def _monto_y_tipo_cartola(cargo, abono):
+    """
+    Monto y tipo de cada movimiento de cartola: un cargo es Gasto, si no un abono
+    es Ingreso, y sin ninguno queda monto 0 como Gasto.
+    """
+    monto = np.where(cargo > 0, cargo, np.where(abono > 0, abono, 0.0))
+    tipo = np.where((cargo <= 0) & (abono > 0), 'Ingreso', 'Gasto')
+    return monto, tipo
+
+
+def _texto_presente(df, columna):
+    """Texto sin espacios de la columna y máscara de las filas donde tiene contenido"""
+    if columna not in df.columns:
+        vacio = pd.Series('', index=df.index)
+        return vacio, vacio != vacio
+    texto = df[columna].astype(str).str.strip()
+    return texto, df[columna].notna() & ~texto.isin(['nan', ''])
+
+
+def _crear_detalle_tef(df):
+    """
+    Detalle de cada transferencia: "DESTINO - COMENTARIO - (BANCO)" con las partes
+    que tengan contenido, o "TRANSFERENCIA BANCARIA" si no hay ninguna.
+    """
+    detalle = pd.Series('', index=df.index)
+    for columna, entre_parentesis in (('nombre_destino', False), ('comentario', False), ('banco_destino', True)):
+        texto, presente = _texto_presente(df, columna)
+        if entre_parentesis:
+            texto = '(' + texto + ')'
+        separador = np.where((detalle != '') & presente, ' - ', '')
+        detalle = detalle + separador + texto.where(presente, '')
+    return detalle.where(detalle != '', 'Transferencia bancaria').str.upper()
+
+
+def _tipo_movimiento_tef(df):
+    """
+    Tipo de cada transferencia. Normalmente son gastos (transferencias salientes),
+    salvo que el origen, destino o comentario contenga un patrón de ingreso.
+    """
+    # Verificar en origen, destino y comentario
+    texto_completo = pd.Series('', index=df.index)
+    for posicion, columna in enumerate(('origen', 'nombre_destino', 'comentario')):
+        texto = df[columna].astype(str) if columna in df.columns else ''
+        texto_completo = texto_completo + (' ' if posicion else '') + texto
+    
+    # Si el origen contiene nuestro nombre/banco, podría ser un ingreso
+    # (esto requeriría configuración del usuario en el futuro)
+    es_ingreso = texto_completo.str.upper().str.contains(_REGEX_INGRESO_TEF)
+    return np.where(es_ingreso, 'Ingreso', 'Gasto')
+
+
+def cargar_y_limpiar_tef_cartola(archivo_path, grilla=None):
     """
     Lee el archivo Excel 'tef-cartola.xlsx' asumiendo que la cabecera comienza en la fila 12 (índice 11):
     - Elimina columnas vacías (Unnamed).
@@ -132,10 +313,19 @@ def cargar_y_limpiar_tef_cartola(archivo_path):
     - Limpia cadenas de texto.
     - Elimina filas sin fecha válida.
     - Determina tipo de movimiento (Gasto/Ingreso).
+    Si se entrega la grilla ya leída (ver leer_grilla_excel), no se vuelve a abrir el archivo.
     """
     # 1. Leer con header en la fila 11
-    df = pd.read_excel(archivo_path, header=11)
+    if grilla is not None:
+        df = dataframe_desde_grilla(grilla, FILA_HEADER_TEF)
+    else:
+        df = pd.read_excel(archivo_path, header=FILA_HEADER_TEF)
+    
+    return _limpiar_tef(df)
+
 
+def _limpiar_tef(df):
+    """Limpia las filas de una cartola TEF ya leídas con su cabecera (pasos 2 a 7 de cargar_y_limpiar_tef_cartola)"""
     # 2. Quitar columnas 'Unnamed'
     df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
 
@@ -208,52 +398,10 @@ def cargar_y_limpiar_tef_cartola(archivo_path):
     df = df.dropna(subset=['fecha'])
     
     # 6. Crear columna 'detalle' combinando información relevante
-    def crear_detalle(row):
-        partes = []
-        if pd.notna(row.get('nombre_destino')) and str(row.get('nombre_destino')).strip() not in ['nan', '']:
-            partes.append(str(row.get('nombre_destino')).strip())
-        if pd.notna(row.get('comentario')) and str(row.get('comentario')).strip() not in ['nan', '']:
-            partes.append(str(row.get('comentario')).strip())
-        if pd.notna(row.get('banco_destino')) and str(row.get('banco_destino')).strip() not in ['nan', '']:
-            partes.append(f"({str(row.get('banco_destino')).strip()})")
-        
-        detalle = " - ".join(partes) if partes else "Transferencia bancaria"
-        return detalle.upper()
-    
-    df['detalle'] = df.apply(crear_detalle, axis=1)
+    df['detalle'] = _crear_detalle_tef(df)
     
     # 7. Determinar tipo de movimiento (Gasto/Ingreso)
-    def determinar_tipo_movimiento(row):
-        # Para TEF, normalmente son gastos (transferencias salientes)
-        # Pero podemos usar heurísticas para detectar ingresos
-        
-        origen = str(row.get('origen', '')).upper()
-        nombre_destino = str(row.get('nombre_destino', '')).upper()
-        comentario = str(row.get('comentario', '')).upper()
-        canal = str(row.get('canal', '')).upper()
-        
-        # Patrones que sugieren ingresos
-        patrones_ingreso = [
-            'SUELDO', 'SALARIO', 'NOMINA', 'HONORARIOS', 'REMUNERACION',
-            'DEVOLUCION', 'REEMBOLSO', 'DEPOSITO', 'ABONO', 'CREDITO',
-            'PENSION', 'JUBILACION', 'SUBSIDIO', 'BECA', 'PREMIO',
-            'VENTA', 'COBRO', 'PAGO RECIBIDO', 'TRANSFERENCIA RECIBIDA'
-        ]
-        
-        # Verificar en origen, destino y comentario
-        texto_completo = f"{origen} {nombre_destino} {comentario}"
-        
-        for patron in patrones_ingreso:
-            if patron in texto_completo:
-                return 'Ingreso'
-        
-        # Si el origen contiene nuestro nombre/banco, podría ser un ingreso
-        # (esto requeriría configuración del usuario en el futuro)
-        
-        # Por defecto, asumimos que es gasto (transferencia saliente)
-        return 'Gasto'
-    
-    df['tipo'] = df.apply(determinar_tipo_movimiento, axis=1)
+    df['tipo'] = _tipo_movimiento_tef(df)
     
     return df
 
@@ -262,60 +410,66 @@ def leer_archivo_excel(archivo_path):
     """
     Función principal que detecta el tipo de archivo y aplica el procesamiento adecuado.
     Soporta archivos TEF, Cartola y Excel genéricos.
+    El archivo se parsea una sola vez: la detección y la carga usan la misma grilla.
     """
     try:
+        grilla = leer_grilla_excel(archivo_path)
+        
         # Detectar formato automáticamente
-        formato = detectar_formato_archivo(archivo_path)
+        formato = detectar_formato_grilla(grilla)
         print(f"Formato detectado: {formato}")
         
         # Procesar según el formato detectado
         if formato == 'cartola':
-            df = cargar_y_limpiar_cartola(archivo_path)
+            df = cargar_y_limpiar_cartola(archivo_path, grilla=grilla)
             if len(df) > 0:
                 return df
         elif formato == 'tef':
-            df = cargar_y_limpiar_tef_cartola(archivo_path)
+            df = cargar_y_limpiar_tef_cartola(archivo_path, grilla=grilla)
             if len(df) > 0:
                 return df
         
         # Formato genérico (original)
-        df = pd.read_excel(archivo_path)
-        
-        # Renombrar columnas a nombres estándar
-        column_mapping = {
-            'Fecha Mov.': 'fecha',
-            'Fecha': 'fecha', 
-            'Descripción': 'detalle',
-            'Descripcion': 'detalle',
-            'Detalle': 'detalle',
-            'Concepto': 'detalle',
-            'Monto': 'monto',
-            'Importe': 'monto',
-            'Valor': 'monto',
-            'Tipo': 'tipo',
-            'Tipo Mov.': 'tipo',
-            'Movimiento': 'tipo'
-        }        
-        # Aplicar renombrado si las columnas existen
-        for old_name, new_name in column_mapping.items():
-            if old_name in df.columns:
-                df.rename(columns={old_name: new_name}, inplace=True)
-        
-        # Asegurar que existe la columna 'detalle'
-        if 'detalle' not in df.columns:
-            # Buscar cualquier columna que pueda servir como descripción
-            desc_columns = [col for col in df.columns if any(word in col.lower() 
-                           for word in ['desc', 'concepto', 'detalle', 'movimiento'])]
-            if desc_columns:
-                df['detalle'] = df[desc_columns[0]]
-            else:
-                df['detalle'] = 'Transacción'
-        
-        return df
+        return _normalizar_generico(dataframe_desde_grilla(grilla))
     except Exception as e:
         raise Exception(f"Error al leer archivo Excel: {str(e)}")
 
 
+def _normalizar_generico(df):
+    """Lleva las columnas de un Excel genérico a los nombres estándar"""
+    # Renombrar columnas a nombres estándar
+    column_mapping = {
+        'Fecha Mov.': 'fecha',
+        'Fecha': 'fecha', 
+        'Descripción': 'detalle',
+        'Descripcion': 'detalle',
+        'Detalle': 'detalle',
+        'Concepto': 'detalle',
+        'Monto': 'monto',
+        'Importe': 'monto',
+        'Valor': 'monto',
+        'Tipo': 'tipo',
+        'Tipo Mov.': 'tipo',
+        'Movimiento': 'tipo'
+    }        
+    # Aplicar renombrado si las columnas existen
+    for old_name, new_name in column_mapping.items():
+        if old_name in df.columns:
+            df.rename(columns={old_name: new_name}, inplace=True)
+    
+    # Asegurar que existe la columna 'detalle'
+    if 'detalle' not in df.columns:
+        # Buscar cualquier columna que pueda servir como descripción
+        desc_columns = [col for col in df.columns if any(word in col.lower() 
+                       for word in ['desc', 'concepto', 'detalle', 'movimiento'])]
+        if desc_columns:
+            df['detalle'] = df[desc_columns[0]]
+        else:
+            df['detalle'] = 'Transacción'
+    
+    return df
+
+
 def limpiar_dataframe(df):
     """
     Función para limpiar y normalizar el DataFrame.
@@ -360,6 +514,9 @@ def limpiar_dataframe(df):
     # Convertir detalle a string y limpiar
     df_clean['detalle'] = df_clean['detalle'].astype(str).str.strip().str.upper()
     
+    # Clave de comercio: detalle sin números de sucursal, fechas, terminales, etc.
+    df_clean['merchant_key'] = normalizar_comercios(df_clean['detalle'])
+    
     return df_clean
 
 
@@ -372,3 +529,252 @@ def procesar_archivo_excel(archivo_path):
     df_clean = limpiar_dataframe(df)
     
     return df_clean
+
+
+def _valor_celda(celda):
+    """Convierte una celda de openpyxl como lo hace pd.read_excel (vacía -> '', error -> NaN, 3.0 -> 3)"""
+    valor = celda.value
+    if valor is None:
+        return ''
+    if celda.data_type == 'e':
+        return np.nan
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def iterar_filas_excel(archivo_path):
+    """
+    Recorre las filas de la primera hoja con openpyxl en modo read_only: las
+    celdas se leen del XML a medida que se piden, sin construir la hoja completa.
+    Cada fila es una lista de valores sin las celdas vacías del final.
+    """
+    import openpyxl
+
+    libro = openpyxl.load_workbook(archivo_path, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        # Las dimensiones declaradas en el archivo pueden estar mal
+        hoja.reset_dimensions()
+        for fila in hoja.iter_rows():
+            valores = [_valor_celda(celda) for celda in fila]
+            while valores and isinstance(valores[-1], str) and valores[-1] == '':
+                valores.pop()
+            yield valores
+    finally:
+        libro.close()
+
+
+def _grilla_desde_filas(filas):
+    """Arma una grilla rectangular (como leer_grilla_excel) desde listas de distinto largo"""
+    ancho = max((len(fila) for fila in filas), default=0)
+    return pd.DataFrame([fila + [''] * (ancho - len(fila)) for fila in filas], dtype=object)
+
+
+def _fragmentos_con_cabecera(filas, cabecera, tam_fragmento):
+    """Agrupa las filas en DataFrames de a tam_fragmento, cada uno con la misma cabecera"""
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= tam_fragmento:
+            yield dataframe_desde_grilla(_grilla_desde_filas([cabecera] + bloque))
+            bloque = []
+    if bloque:
+        yield dataframe_desde_grilla(_grilla_desde_filas([cabecera] + bloque))
+
+
+def _fragmentos_excel(archivo_path, tam_fragmento, forzar_generico=False):
+    """
+    Lee el archivo en flujo y entrega (formato, encabezado, DataFrame) por cada
+    fragmento de filas, ya con los nombres de columna de la cabecera del formato
+    detectado. encabezado es la grilla de las filas sobre la cabecera.
+    Solo se conservan en memoria las filas de detección y el fragmento en curso.
+    """
+    filas = iterar_filas_excel(archivo_path)
+    try:
+        primeras = []
+        for fila in filas:
+            primeras.append(fila)
+            if len(primeras) >= FILAS_DETECCION:
+                break
+
+        formato = 'generico' if forzar_generico else detectar_formato_grilla(_grilla_desde_filas(primeras))
+        fila_header = {'cartola': FILA_HEADER_CARTOLA, 'tef': FILA_HEADER_TEF}.get(formato, 0)
+        if len(primeras) <= fila_header:
+            return
+
+        encabezado = _grilla_desde_filas(primeras[:fila_header])
+        cabecera = primeras[fila_header]
+        restantes = primeras[fila_header + 1:]
+        del primeras
+
+        def todas():
+            yield from restantes
+            yield from filas
+
+        for df in _fragmentos_con_cabecera(todas(), cabecera, tam_fragmento):
+            yield formato, encabezado, df
+    finally:
+        filas.close()
+
+
+def _tipar_fragmento(df):
+    """
+    Fija los tipos numéricos de un fragmento: la inferencia de cada fragmento
+    depende de sus filas (un fragmento sin celdas vacías daría enteros), y así
+    todos los fragmentos de un archivo tienen las mismas columnas y tipos.
+    """
+    for columna in ('monto', 'saldo'):
+        if columna in df.columns:
+            df[columna] = df[columna].astype('float64')
+    return df
+
+
+def _fechas_cartola_en_flujo(archivo_path, tam_fragmento):
+    """
+    Primera pasada de una cartola leída en flujo: las fechas de todas sus filas,
+    con el año inferido sobre la columna completa como en cargar_y_limpiar_cartola
+    (el sentido del orden y el año de partida dependen de todo el archivo). Solo
+    la columna de fechas queda en memoria.
+    """
+    columnas, referencia = [], None
+    for _, encabezado, df in _fragmentos_excel(archivo_path, tam_fragmento):
+        if referencia is None:
+            referencia = fecha_cierre_cartola(encabezado)
+        columnas.append(df['Fecha'].astype(object))
+    if not columnas:
+        return np.array([], dtype='datetime64[ns]')
+    return parsear_fechas_cartola(pd.concat(columnas, ignore_index=True), referencia).to_numpy()
+
+
+def procesar_archivo_excel_en_fragmentos(archivo_path, tam_fragmento=TAM_FRAGMENTO_EXCEL):
+    """
+    Versión en flujo de procesar_archivo_excel para archivos .xlsx grandes: entrega
+    el archivo limpio en DataFrames de a lo más tam_fragmento filas, con la memoria
+    acotada por el tamaño del fragmento y no por el del archivo. Los fragmentos se
+    pueden encadenar con categorizar_en_flujo y DatabaseManager.guardar_flujo.
+    Las cartolas se recorren dos veces: la primera solo junta las fechas para
+    inferir sus años (ver _fechas_cartola_en_flujo).
+    Los archivos .xls (sin modo read_only) se leen completos.
+    """
+    if not str(archivo_path).lower().endswith('.xlsx'):
+        df = procesar_archivo_excel(archivo_path)
+        if not df.empty:
+            yield df
+        return
+
+    filas_formato = 0
+    formato = None
+    fechas = None
+    try:
+        for formato, _, df in _fragmentos_excel(archivo_path, tam_fragmento):
+            if formato == 'cartola':
+                if fechas is None:
+                    fechas, inicio = _fechas_cartola_en_flujo(archivo_path, tam_fragmento), 0
+                df['Fecha'] = fechas[inicio:inicio + len(df)]
+                inicio += len(df)
+                df = _limpiar_cartola(df)
+            elif formato == 'tef':
+                df = _limpiar_tef(df)
+            else:
+                break
+            filas_formato += len(df)
+            if len(df) > 0:
+                yield _tipar_fragmento(limpiar_dataframe(df))
+    except Exception as e:
+        raise Exception(f"Error al leer archivo Excel: {str(e)}")
+
+    if formato in ('cartola', 'tef') and filas_formato > 0:
+        return
+
+    # Formato genérico, o cartola/TEF sin movimientos válidos (igual que leer_archivo_excel)
+    try:
+        for _, _, df in _fragmentos_excel(archivo_path, tam_fragmento, forzar_generico=True):
+            df = limpiar_dataframe(_normalizar_generico(df))
+            if len(df) > 0:
+                yield _tipar_fragmento(df)
+    except Exception as e:
+        raise Exception(f"Error al leer archivo Excel: {str(e)}")
+
+
+def procesar_archivos_en_flujo(archivos_path, tam_fragmento=None):
+    """
+    Lee y limpia varios archivos Excel de a uno, entregando un DataFrame por
+    archivo. Pensado para encadenarse con categorizar_en_flujo y
+    DatabaseManager.guardar_flujo sin juntar todos los archivos en memoria.
+    Con tam_fragmento, cada archivo se lee en flujo y se entrega en fragmentos
+    de a lo más esa cantidad de filas (ver procesar_archivo_excel_en_fragmentos).
+    Los archivos que no se pueden procesar se informan y se omiten.
+    """
+    for archivo_path in archivos_path:
+        try:
+            if tam_fragmento:
+                yield from procesar_archivo_excel_en_fragmentos(archivo_path, tam_fragmento)
+                continue
+            df = procesar_archivo_excel(archivo_path)
+        except Exception as e:
+            print(f"Warning: No se pudo procesar {archivo_path}: {e}")
+            continue
+        if not df.empty:
+            yield df
+
+
+def _a_columnas(df):
+    """Empaqueta un DataFrame como (nombres, arreglos numpy por columna) para enviarlo entre procesos"""
+    return list(df.columns), [df[columna].to_numpy() for columna in df.columns]
+
+
+def _desde_columnas(columnas):
+    """Reconstruye el DataFrame empaquetado por _a_columnas"""
+    nombres, arreglos = columnas
+    return pd.DataFrame(dict(zip(nombres, arreglos)), columns=nombres)
+
+
+def _procesar_archivo_con_estadisticas(archivo_path):
+    """
+    Procesa un archivo (en un proceso del pool o en este) y devuelve
+    (columnas, estadísticas). Los errores se informan en las estadísticas
+    para no detener la carga de los demás archivos.
+    """
+    inicio = time.perf_counter()
+    estadisticas = {'archivo': os.path.basename(archivo_path), 'filas': 0, 'segundos': 0.0, 'error': None}
+    columnas = None
+    try:
+        df = procesar_archivo_excel(archivo_path)
+        estadisticas['filas'] = len(df)
+        columnas = _a_columnas(df)
+    except Exception as e:
+        estadisticas['error'] = str(e)
+    estadisticas['segundos'] = round(time.perf_counter() - inicio, 3)
+    return columnas, estadisticas
+
+
+def procesar_archivos_en_paralelo(archivos_path, max_procesos=MAX_PROCESOS_CARGA):
+    """
+    Lee y limpia varios archivos Excel repartiéndolos en un pool de procesos, así
+    el tiempo total se acerca al del archivo más lento. Cada proceso devuelve las
+    columnas del archivo como arreglos numpy (más livianos de enviar que el DataFrame).
+    Con un solo archivo o max_procesos=1 se procesa en este mismo proceso.
+
+    Returns:
+        (dataframes, estadisticas): los DataFrames no vacíos en el orden de
+        archivos_path, y por cada archivo un dict con archivo, filas, segundos y error
+    """
+    archivos_path = list(archivos_path)
+    procesos = min(len(archivos_path), max_procesos or os.cpu_count() or 1)
+
+    if procesos <= 1:
+        resultados = [_procesar_archivo_con_estadisticas(archivo_path) for archivo_path in archivos_path]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            resultados = list(pool.map(_procesar_archivo_con_estadisticas, archivos_path))
+
+    dataframes = []
+    estadisticas = []
+    for archivo_path, (columnas, estadisticas_archivo) in zip(archivos_path, resultados):
+        if estadisticas_archivo['error']:
+            print(f"Warning: No se pudo procesar {archivo_path}: {estadisticas_archivo['error']}")
+        elif estadisticas_archivo['filas'] > 0:
+            dataframes.append(_desde_columnas(columnas))
+        estadisticas.append(estadisticas_archivo)
+    return dataframes, estadisticas
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import re
+import time
+from functools import lru_cache
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+# Límites para aceptar un patrón de usuario
+MAX_LARGO_PATRON = 200
+MAX_SEGUNDOS_PRUEBA = 0.05
+# Repeticiones acotadas que pueden contener un cuantificador sin límite, como (\w+\s){3}
+MAX_REPETICIONES_ANIDADAS = 3
+
+# Entradas repetitivas, más largas que cualquier detalle real, con las que se
+# prueba cada patrón al guardarlo
+_TEXTOS_PRUEBA = [caracter * 500 + '!' for caracter in ('A', '1', ' ', '-', '*')]
+
+# Cantidad de alternancias compiladas que se conservan (cache LRU por reglas y versión)
+MAX_ALTERNANCIAS_COMPILADAS = 64
+
+_REPETICIONES = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, 'POSSESSIVE_REPEAT'):
+    _REPETICIONES.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+def _subpatrones(operacion, argumento):
+    """Devuelve las subexpresiones de un nodo del árbol de sre_parse"""
+    if operacion in _REPETICIONES:
+        return [argumento[2]]
+    if operacion == sre_constants.SUBPATTERN:
+        return [argumento[-1]]
+    if operacion == sre_constants.BRANCH:
+        return list(argumento[1])
+    if operacion in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [argumento[1]]
+    if operacion == getattr(sre_constants, 'ATOMIC_GROUP', None):
+        return [argumento]
+    if operacion == sre_constants.GROUPREF_EXISTS:
+        return [parte for parte in argumento[1:] if parte is not None]
+    return []
+
+
+def _nodos(subpatron):
+    """Recorre todos los nodos (operacion, argumento) de una expresión parseada"""
+    for operacion, argumento in subpatron:
+        yield operacion, argumento
+        for hijo in _subpatrones(operacion, argumento):
+            yield from _nodos(hijo)
+
+
+def _motivo_patologico(subpatron):
+    """
+    Busca construcciones con retroceso exponencial o polinomial de grado alto: una
+    repetición sin límite que contiene otra de largo variable, como (A+)+ o (\\s?X)*,
+    o una alternativa, como (A|AB)*, y una repetición acotada grande que contiene
+    un cuantificador sin límite, como (.*A){10}. También rechaza referencias a grupos (\\1).
+    """
+    for operacion, argumento in _nodos(subpatron):
+        if operacion in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return "no se permiten referencias a grupos"
+        if operacion not in _REPETICIONES or argumento[1] <= 1:
+            continue
+        sin_limite = argumento[1] == sre_constants.MAXREPEAT
+        for interna, argumento_interno in _nodos(argumento[2]):
+            if interna in _REPETICIONES and argumento_interno[0] != argumento_interno[1]:
+                if sin_limite or (argumento_interno[1] == sre_constants.MAXREPEAT and
+                                  argumento[1] > MAX_REPETICIONES_ANIDADAS):
+                    return "tiene cuantificadores anidados"
+            if interna == sre_constants.BRANCH and sin_limite:
+                return "repite una alternativa"
+    return None
+
+
+def _compilar_como_grupo(patron):
+    """
+    Compila el patrón dentro de un grupo, como queda en la alternancia. Falla con
+    re.error si el patrón usa modificadores globales como (?i) o (?x), que solo se
+    aceptan al comienzo de la expresión completa.
+    """
+    return re.compile(f'(?:{patron})', re.IGNORECASE)
+
+
+def es_combinable(patron):
+    """Indica si el patrón compila al combinarlo con otros (ver _compilar_como_grupo)"""
+    try:
+        _compilar_como_grupo(patron)
+        return True
+    except re.error:
+        return False
+
+
+def validar_patron(patron):
+    """
+    Valida un patrón de usuario antes de guardarlo.
+
+    Returns:
+        El patrón sin espacios en los extremos
+
+    Raises:
+        ValueError si el patrón no compila, no se puede combinar con otros
+        (modificadores globales), es demasiado largo, acepta el texto vacío, usa
+        grupos con nombre o puede tardar demasiado (retroceso exponencial)
+    """
+    patron = str(patron).strip()
+    if not patron:
+        raise ValueError("El patrón está vacío")
+    if len(patron) > MAX_LARGO_PATRON:
+        raise ValueError(f"El patrón supera los {MAX_LARGO_PATRON} caracteres")
+
+    try:
+        compilado = re.compile(patron, re.IGNORECASE)
+        arbol = sre_parse.parse(patron, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"Patrón inválido '{patron}': {e}")
+
+    if not es_combinable(patron):
+        raise ValueError(
+            f"Patrón '{patron}': no se permiten modificadores globales como (?i) o (?x); "
+            f"use la forma local (?x:...) si es necesario"
+        )
+    if compilado.groupindex:
+        raise ValueError(f"Patrón '{patron}': no se permiten grupos con nombre")
+    if compilado.search('') is not None:
+        raise ValueError(f"Patrón '{patron}': no puede aceptar el texto vacío")
+
+    motivo = _motivo_patologico(arbol)
+    if motivo:
+        raise ValueError(f"Patrón '{patron}' rechazado: {motivo}")
+
+    for texto in _TEXTOS_PRUEBA:
+        inicio = time.perf_counter()
+        compilado.search(texto)
+        if time.perf_counter() - inicio > MAX_SEGUNDOS_PRUEBA:
+            raise ValueError(f"Patrón '{patron}' rechazado: es demasiado lento con textos largos")
+
+    return patron
+
+
+def version_patrones(patrones):
+    """Hash corto de la lista de patrones de una regla (cambia al editarla)"""
+    return hashlib.sha1(json.dumps(list(patrones), ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+
+def combinar_patrones(patrones):
+    """
+    Compila una lista de patrones en una sola expresión que coincide si alguno coincide.
+    Los patrones que no se pueden combinar se informan y se omiten; sin ninguno
+    válido, la expresión no coincide con nada.
+    """
+    validos = []
+    for patron in patrones:
+        if es_combinable(patron):
+            validos.append(patron)
+        else:
+            print(f"Warning: Se omite el patrón '{patron}': no se puede combinar con otros")
+    if not validos:
+        return re.compile(r'(?!)')
+    return re.compile('|'.join(f'(?:{patron})' for patron in validos), re.IGNORECASE)
+
+
+class AlternanciaPatrones:
+    """
+    Todos los patrones de varias reglas combinados en una sola expresión
+    (?P<p0_0>...)|(?P<p0_1>...)|(?P<p1_0>...), así cada texto se recorre una vez.
+    Gana la coincidencia que empieza más a la izquierda y, en la misma posición,
+    la regla declarada primero.
+    """
+
+    def __init__(self, reglas):
+        """
+        Args:
+            reglas: Lista de (id_regla, version, patrones) en orden de prioridad
+        """
+        self._grupos = {}
+        partes = []
+        for indice, (id_regla, version, patrones) in enumerate(reglas):
+            # Una regla guardada que no compila (o no se puede combinar) se omite, así
+            # no impide categorizar con las demás
+            try:
+                compilados = [re.compile(patron, re.IGNORECASE) for patron in patrones]
+            except re.error as e:
+                print(f"Warning: Se omite la regla {id_regla}: patrón inválido ({e})")
+                continue
+            for posicion, compilado in enumerate(compilados):
+                if not es_combinable(compilado.pattern):
+                    print(f"Warning: Se omite el patrón '{compilado.pattern}' de la regla {id_regla}: "
+                          f"no se puede combinar con otros")
+                    continue
+                nombre = f'p{indice}_{posicion}'
+                self._grupos[nombre] = (indice, compilado.pattern)
+                partes.append(f'(?P<{nombre}>{compilado.pattern})')
+        self._expresion = re.compile('|'.join(partes), re.IGNORECASE) if partes else None
+
+    def buscar(self, texto):
+        """
+        Devuelve (indice_regla, patron, posicion) de la primera coincidencia en el
+        texto, o (None, None, None) si ningún patrón coincide.
+        """
+        if self._expresion is None:
+            return None, None, None
+        coincidencia = self._expresion.search(texto)
+        if coincidencia is None:
+            return None, None, None
+        indice, patron = self._grupos[coincidencia.lastgroup]
+        return indice, patron, coincidencia.start()
+
+
+@lru_cache(maxsize=MAX_ALTERNANCIAS_COMPILADAS)
+def compilar_alternancia(reglas):
+    """
+    Devuelve la AlternanciaPatrones de una tupla de (id_regla, version, patrones)
+    en orden de prioridad. El cache LRU usa las reglas con sus versiones, así la
+    expresión combinada se compila una sola vez mientras no se edite ninguna.
+    """
+    return AlternanciaPatrones(reglas)
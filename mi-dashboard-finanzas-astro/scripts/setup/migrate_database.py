@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 """
 Script de migración de base de datos para agregar las nuevas columnas.
+Es el único camino de migración: DatabaseManager solo crea las tablas que faltan.
+Cada migración se aplica una vez y queda registrada en la tabla migraciones_esquema.
+
+Uso: python scripts/setup/migrate_database.py [ruta_db]
 """
 
 import os
@@ -9,53 +13,161 @@ import shutil
 from datetime import datetime
 import sys
 
-def migrate_database():
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+
+DB_PATH = 'data/finanzas.db'
+
+
+def _agregar_columnas(cursor, tabla, columnas):
+    """Agrega a la tabla las columnas (nombre, definición) que no existan"""
+    existentes = [row[1] for row in cursor.execute(f"PRAGMA table_info({tabla})").fetchall()]
+    print(f"Columnas actuales de {tabla}: {existentes}")
+    for column_name, column_def in columnas:
+        if column_name not in existentes:
+            cursor.execute(f'ALTER TABLE {tabla} ADD COLUMN {column_name} {column_def}')
+            print(f"Columna '{tabla}.{column_name}' agregada correctamente")
+
+
+def _columnas_transacciones(cursor):
+    _agregar_columnas(cursor, 'transacciones', [
+        ('tipo_regla', 'TEXT DEFAULT "mapeo_por_palabra_clave"'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
+        ('fecha_modificacion', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
+        ('merchant_key', 'VARCHAR(500)'),
+        ('palabra_regla', 'VARCHAR(200)'),
+        ('campo_regla', 'VARCHAR(50)'),
+        ('posicion_regla', 'INTEGER'),
+        ('canal', 'VARCHAR(100)')
+    ])
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_transacciones_merchant_key ON transacciones (merchant_key)")
+
+
+def _columnas_reglas(cursor):
+    _agregar_columnas(cursor, 'categorias_custom', [
+        ('condiciones', 'VARCHAR(1000)'),
+        ('patrones', 'VARCHAR(2000)')
+    ])
+    _agregar_columnas(cursor, 'cache_categorizacion', [
+        ('palabra_regla', 'VARCHAR(200)'),
+        ('campo_regla', 'VARCHAR(50)'),
+        ('posicion_regla', 'INTEGER')
+    ])
+
+
+def _recalcular_claves_comercio(cursor):
+    """Calcula merchant_key de todas las transacciones con la normalización vigente"""
+    from utils.comercios import normalizar_comercios
+
+    filas = cursor.execute("SELECT id, detalle, merchant_key FROM transacciones").fetchall()
+    if not filas:
+        return
+    claves = normalizar_comercios([detalle for _, detalle, _ in filas])
+    cambios = [(clave, id_) for (id_, _, anterior), clave in zip(filas, claves) if anterior != clave]
+    cursor.executemany("UPDATE transacciones SET merchant_key = ? WHERE id = ?", cambios)
+    print(f"Claves de comercio recalculadas: {len(cambios)}")
+
+
+def _estadisticas_por_corrida(cursor):
+    """
+    Las estadísticas de reglas pasan a guardarse por corrida de categorización.
+    Los contadores anteriores sumaban varias veces las mismas transacciones (una
+    vez por recategorización), así que se descartan.
+    """
+    columnas = [row[1] for row in cursor.execute("PRAGMA table_info(estadisticas_reglas)").fetchall()]
+    if 'corrida' in columnas:
+        return
+    cursor.execute("DROP TABLE IF EXISTS estadisticas_reglas")
+    cursor.execute("""
+        CREATE TABLE estadisticas_reglas (
+            id INTEGER NOT NULL PRIMARY KEY,
+            corrida VARCHAR(32) NOT NULL,
+            categoria VARCHAR(100) NOT NULL,
+            palabra_clave VARCHAR(200) NOT NULL,
+            aciertos INTEGER NOT NULL,
+            evaluaciones INTEGER NOT NULL,
+            actualizado DATETIME,
+            UNIQUE (corrida, categoria, palabra_clave)
+        )
+    """)
+    print("Tabla 'estadisticas_reglas' recreada con contadores por corrida")
+
+
+# Migraciones en orden: (versión, descripción, función). Una vez publicada, una
+# migración no se edita; un cambio nuevo (por ejemplo en normalizar_comercio) va
+# en una migración nueva al final de la lista.
+MIGRACIONES = [
+    (1, 'Columnas de regla, clave de comercio, explicación y canal en transacciones', _columnas_transacciones),
+    (2, 'Condiciones y patrones de categorías personalizadas; explicación en el cache', _columnas_reglas),
+    (3, 'Clave de comercio sin sucursal ni lo que le sigue', _recalcular_claves_comercio),
+    (4, 'Estadísticas de reglas por corrida de categorización', _estadisticas_por_corrida),
+]
+
+
+def aplicar_migraciones(conn):
+    """
+    Aplica en orden las migraciones que no estén registradas en migraciones_esquema.
+    Cada una se confirma junto con su registro, así una falla no deja nada a medias.
+
+    Returns:
+        Lista con las versiones aplicadas
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS migraciones_esquema (
+            version INTEGER PRIMARY KEY, descripcion TEXT NOT NULL, aplicada_en TIMESTAMP NOT NULL
+        )
+    """)
+    aplicadas = {row[0] for row in cursor.execute("SELECT version FROM migraciones_esquema").fetchall()}
+
+    nuevas = []
+    for version, descripcion, migracion in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        try:
+            migracion(cursor)
+            cursor.execute(
+                "INSERT INTO migraciones_esquema (version, descripcion, aplicada_en) VALUES (?, ?, ?)",
+                (version, descripcion, datetime.now().isoformat(sep=' '))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Migración {version} aplicada: {descripcion}")
+        nuevas.append(version)
+    return nuevas
+
+
+def migrate_database(db_path=DB_PATH):
     """
     Migra la base de datos agregando las columnas faltantes.
     """
-    db_path = 'data/finanzas.db'
-    backup_path = f'data/finanzas_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.db'
-    
     if not os.path.exists(db_path):
         print("No se encontró la base de datos. Se creará una nueva.")
-        return create_new_database()
-    
+        if not create_new_database(db_path):
+            return False
+
+    backup_path = os.path.join(
+        os.path.dirname(db_path), f'finanzas_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.db'
+    )
     try:
         # Hacer backup
         shutil.copy(db_path, backup_path)
         print(f"Backup creado: {backup_path}")
-        
-        # Conectar a la base de datos
+
+        # Crear las tablas nuevas que falten; las existentes se migran abajo
+        from utils.bd import DatabaseManager
+        DatabaseManager(db_path=db_path).cerrar_conexion()
+
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Verificar si las columnas ya existen
-        cursor.execute("PRAGMA table_info(transacciones)")
-        columns = [row[1] for row in cursor.fetchall()]
-        
-        print(f"Columnas actuales: {columns}")
-        
-        # Agregar las columnas faltantes si no existen
-        new_columns = [
-            ('tipo_regla', 'TEXT DEFAULT "mapeo_por_palabra_clave"'),
-            ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
-            ('fecha_modificacion', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
-        ]
-        
-        for column_name, column_def in new_columns:
-            if column_name not in columns:
-                try:
-                    cursor.execute(f'ALTER TABLE transacciones ADD COLUMN {column_name} {column_def}')
-                    print(f"Columna '{column_name}' agregada correctamente")
-                except sqlite3.Error as e:
-                    print(f"Error al agregar columna '{column_name}': {e}")
-        
-        conn.commit()
-        conn.close()
-        
+        try:
+            aplicar_migraciones(conn)
+        finally:
+            conn.close()
+
         print("Migración completada exitosamente")
         return True
-        
+
     except Exception as e:
         print(f"Error durante la migración: {e}")
         # Restaurar backup si algo salió mal
@@ -64,26 +176,26 @@ def migrate_database():
             print("Base de datos restaurada desde backup")
         return False
 
-def create_new_database():
+def create_new_database(db_path=DB_PATH):
     """
     Crea una nueva base de datos con el esquema correcto.
     """
     try:
         from utils.bd import DatabaseManager
-        db = DatabaseManager()
+        DatabaseManager(db_path=db_path).cerrar_conexion()
         print("Nueva base de datos creada con esquema correcto")
         return True
     except Exception as e:
         print(f"Error al crear nueva base de datos: {e}")
         return False
 
-def test_database():
+def test_database(db_path=DB_PATH):
     """
     Prueba que la base de datos funcione correctamente.
     """
     try:
         from utils.bd import DatabaseManager
-        db = DatabaseManager()
+        db = DatabaseManager(db_path=db_path)
         count = db.contar_transacciones()
         print(f"Test exitoso: {count} transacciones en la base de datos")
         return True
@@ -93,10 +205,11 @@ def test_database():
 
 if __name__ == "__main__":
     print("=== Migración de Base de Datos ===")
-    
-    if migrate_database():
+    ruta = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+
+    if migrate_database(ruta):
         print("\n=== Probando base de datos ===")
-        if test_database():
+        if test_database(ruta):
             print("\n✅ Migración completada exitosamente")
         else:
             print("\n❌ Error en las pruebas post-migración")
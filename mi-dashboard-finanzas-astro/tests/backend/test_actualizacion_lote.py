@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Verifica la escritura en lote de resultados de recategorización:
+1. Solo se escriben las filas cuya categoría o tipo de regla cambia
+2. Las sobrescrituras manuales no se tocan
+3. Todas las filas se escriben con una sola sentencia UPDATE (executemany) y un commit
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from sqlalchemy import event, text
+
+from utils.bd import DatabaseManager, Transaccion
+
+
+def crear_db_con_filas(cantidad):
+    carpeta = tempfile.mkdtemp()
+    db = DatabaseManager(db_path=os.path.join(carpeta, 'finanzas_test.db'))
+    db.session.execute(
+        text("""
+            INSERT INTO transacciones (fecha, detalle, monto, tipo, categoria, año, mes, dia, semana, tipo_regla)
+            VALUES ('2024-01-01', :detalle, 1000, 'Gasto', 'Sin categorizar', 2024, 1, 1, 1, 'sin_coincidencias')
+        """),
+        [{'detalle': f'DETALLE {i}'} for i in range(cantidad)]
+    )
+    db.session.commit()
+    return db
+
+
+def test_solo_escribe_cambios_y_respeta_manual():
+    db = crear_db_con_filas(4)
+    db.actualizar_categoria_transaccion(4, 'Gasto - Salud')
+
+    resumen = db.actualizar_categorias_en_lote([
+        (1, 'Gasto - Alimentos', 'mapeo_por_palabra_clave'),
+        (2, 'Sin categorizar', 'sin_coincidencias'),
+        (3, 'Gasto - Transporte', 'mapeo_por_palabra_clave'),
+        (4, 'Gasto - Alimentos', 'mapeo_por_palabra_clave'),
+    ])
+
+    assert resumen == {'total': 4, 'actualizadas': 2, 'sin_cambios': 2}
+    categorias = {t.id: (t.categoria, t.tipo_regla) for t in db.session.query(Transaccion).all()}
+    assert categorias[1] == ('Gasto - Alimentos', 'mapeo_por_palabra_clave')
+    assert categorias[2] == ('Sin categorizar', 'sin_coincidencias')
+    assert categorias[4] == ('Gasto - Salud', 'sobrescritura_manual')
+    db.cerrar_conexion()
+
+
+def test_una_sentencia_para_todo_el_lote():
+    cantidad = 20000
+    db = crear_db_con_filas(cantidad)
+    cambios = [(i, 'Gasto - Alimentos' if i % 2 else 'Sin categorizar', 'mapeo_por_palabra_clave')
+               for i in range(1, cantidad + 1)]
+
+    sentencias, commits = [], []
+    event.listen(db.engine, 'before_cursor_execute',
+                 lambda conn, cursor, sql, parametros, contexto, varios: sentencias.append((sql, varios)))
+    event.listen(db.engine, 'commit', lambda conn: commits.append(conn))
+    resumen = db.actualizar_categorias_en_lote(cambios)
+
+    assert resumen['actualizadas'] == cantidad
+    assert [(sql.split()[0], varios) for sql, varios in sentencias] == [('UPDATE', True)]
+    assert len(commits) == 1
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_solo_escribe_cambios_y_respeta_manual()
+    test_una_sentencia_para_todo_el_lote()
+    print("✅ Actualización en lote funcionando")
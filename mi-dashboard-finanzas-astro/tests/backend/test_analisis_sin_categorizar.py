@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Verifica el análisis de transacciones sin categorizar:
+1. Conteos, montos y ejemplos por categoría sugerida iguales al recorrido fila por fila
+2. La clave de comercio guardada da el mismo análisis que calcularla desde el detalle
+3. Tablas vacías o sin filas pendientes devuelven el análisis en cero
+"""
+
+import os
+import random
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.categorizar import (
+    analizar_transacciones_sin_categorizar, compilar_reglas, definir_categorias, sugerir_categoria
+)
+from utils.comercios import normalizar_comercios
+
+REGLAS = compilar_reglas(definir_categorias())
+
+
+def analizar_fila_por_fila(df):
+    """Implementación original: una sugerencia por fila y diccionarios anidados"""
+    sin_categorizar = df[df['categoria'] == 'Sin categorizar']
+    con_sugerencias = 0
+    por_categoria = {}
+    for _, row in sin_categorizar.iterrows():
+        sugerencia = sugerir_categoria(row['detalle'], reglas=REGLAS)
+        if sugerencia:
+            con_sugerencias += 1
+            grupo = por_categoria.setdefault(sugerencia['categoria_sugerida'], {'count': 0, 'monto_total': 0, 'ejemplos': []})
+            grupo['count'] += 1
+            grupo['monto_total'] += row['monto']
+            if len(grupo['ejemplos']) < 3:
+                grupo['ejemplos'].append({'detalle': row['detalle'], 'monto': row['monto'], 'confianza': sugerencia['confianza']})
+    return {
+        'total_sin_categorizar': len(sin_categorizar),
+        'monto_total': sin_categorizar['monto'].sum(),
+        'con_sugerencias': con_sugerencias,
+        'sin_sugerencias': len(sin_categorizar) - con_sugerencias,
+        'sugerencias_por_categoria': por_categoria
+    }
+
+
+def crear_dataframe(cantidad, semilla=5):
+    azar = random.Random(semilla)
+    palabras = [p for lista in definir_categorias().values() for p in lista][:80] + ['XYZ', 'QWERTY']
+    return pd.DataFrame({
+        'detalle': [f"{azar.choice(palabras)} {azar.choice(palabras)} {azar.randint(1, 500)}" for _ in range(cantidad)],
+        'monto': [float(azar.randint(100, 90000)) for _ in range(cantidad)],
+        'categoria': [azar.choice(['Sin categorizar', 'Sin categorizar', 'Gasto - Otros']) for _ in range(cantidad)],
+    })
+
+
+def test_igual_a_fila_por_fila():
+    df = crear_dataframe(3000)
+    assert analizar_transacciones_sin_categorizar(df, reglas=REGLAS) == analizar_fila_por_fila(df)
+
+
+def test_con_clave_de_comercio_guardada():
+    df = crear_dataframe(1000, semilla=8)
+    df['merchant_key'] = normalizar_comercios(df['detalle'])
+    assert analizar_transacciones_sin_categorizar(df, reglas=REGLAS) == analizar_fila_por_fila(df)
+
+
+def test_sin_pendientes():
+    vacio = analizar_transacciones_sin_categorizar(pd.DataFrame())
+    assert vacio['total_sin_categorizar'] == 0 and vacio['sugerencias_por_categoria'] == {}
+
+    categorizadas = pd.DataFrame({'detalle': ['UBER'], 'monto': [10.0], 'categoria': ['Gasto - Transporte']})
+    assert analizar_transacciones_sin_categorizar(categorizadas, reglas=REGLAS) == vacio
+
+
+if __name__ == "__main__":
+    test_igual_a_fila_por_fila()
+    test_con_clave_de_comercio_guardada()
+    test_sin_pendientes()
+    print("✅ Análisis de transacciones sin categorizar funcionando")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Verifica el cache persistente de categorización:
+1. Las claves repetidas se resuelven desde el cache
+2. Editar una categoría personalizada cambia la versión de reglas
+3. El desalojo respeta el tamaño máximo y saca primero las versiones antiguas
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager, CacheCategorizacion
+from utils.categorizar import aplicar_categorizacion, clave_cache, registro_reglas
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def crear_db():
+    carpeta = tempfile.mkdtemp()
+    return DatabaseManager(db_path=os.path.join(carpeta, 'finanzas_test.db'))
+
+
+def test_cache_reutiliza_resultados():
+    db = crear_db()
+    df = pd.DataFrame({'detalle': ['COMPRA UBER', 'JUMBO', 'COMPRA UBER', 'XYZ']})
+
+    primero = aplicar_categorizacion(df.copy(), db_manager=db)
+    version = db.obtener_version_reglas()
+    assert db.session.query(CacheCategorizacion).count() == 3
+
+    # Alterar una entrada para comprobar que la segunda pasada lee desde el cache
+    clave = clave_cache('COMPRA UBER', '', '')
+    db.session.query(CacheCategorizacion).filter(
+        CacheCategorizacion.clave == clave
+    ).update({CacheCategorizacion.categoria: 'Desde cache'})
+    db.session.commit()
+
+    segundo = aplicar_categorizacion(df.copy(), db_manager=db)
+    assert segundo['categoria'].tolist() == [
+        'Desde cache', primero['categoria'][1], 'Desde cache', primero['categoria'][3]
+    ]
+    assert db.obtener_version_reglas() == version
+    db.cerrar_conexion()
+
+
+def test_editar_categoria_cambia_version():
+    db = crear_db()
+    version_inicial = db.obtener_version_reglas()
+
+    categoria = db.crear_categoria_custom('Gasto - Mascotas', ['VETERINARIO'])
+    version_creada = db.obtener_version_reglas()
+    assert version_creada != version_inicial
+
+    db.actualizar_categoria_custom(categoria['id'], palabras_clave=['VETERINARIO', 'PETSHOP'])
+    assert db.obtener_version_reglas() not in (version_inicial, version_creada)
+
+    db.eliminar_categoria_custom(categoria['id'])
+    assert db.obtener_version_reglas() == version_inicial
+    db.cerrar_conexion()
+
+
+def test_desalojo_por_tamano():
+    db = crear_db()
+    antiguas = {f'ANTIGUA {i}': ('Sin categorizar', 'sin_coincidencias') for i in range(5)}
+    nuevas = {f'NUEVA {i}': ('Sin categorizar', 'sin_coincidencias') for i in range(4)}
+
+    db.guardar_cache_categorizacion('v1', antiguas, max_entradas=6)
+    db.guardar_cache_categorizacion('v2', nuevas, max_entradas=6)
+
+    versiones = [fila.version_reglas for fila in db.session.query(CacheCategorizacion).all()]
+    assert len(versiones) == 6
+    assert versiones.count('v2') == 4
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_cache_reutiliza_resultados()
+    test_editar_categoria_cambia_version()
+    test_desalojo_por_tamano()
+    print("✅ Cache de categorización funcionando")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Verifica la carga de varios archivos en paralelo (procesar_archivos_en_paralelo):
+1. Con un pool de procesos los DataFrames son iguales a procesar_archivo_excel, en el mismo orden
+2. Cada archivo informa filas, segundos y error; un archivo dañado no detiene a los demás
+3. Las columnas viajan como arreglos numpy y se reconstruyen con los mismos tipos
+4. Con un solo archivo o max_procesos=1 no se crea el pool
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from test_lectura_excel_fragmentos import cartola_grande
+from test_lectura_unica_excel import archivo_generico, archivo_tef
+from utils import leer_excel
+from utils.leer_excel import _a_columnas, _desde_columnas, procesar_archivo_excel, procesar_archivos_en_paralelo
+
+
+def archivo_danado():
+    ruta = os.path.join(tempfile.mkdtemp(), 'danado.xlsx')
+    with open(ruta, 'wb') as archivo:
+        archivo.write(b'no es un excel')
+    return ruta
+
+
+def test_paralelo_igual_a_secuencial():
+    rutas = [cartola_grande(300, semilla=1), archivo_tef(), cartola_grande(200, semilla=2), archivo_generico()]
+    dataframes, estadisticas = procesar_archivos_en_paralelo(rutas, max_procesos=2)
+
+    assert len(dataframes) == len(rutas)
+    for ruta, df in zip(rutas, dataframes):
+        pd.testing.assert_frame_equal(df.reset_index(drop=True), procesar_archivo_excel(ruta).reset_index(drop=True))
+    assert [e['archivo'] for e in estadisticas] == [os.path.basename(ruta) for ruta in rutas]
+
+
+def test_estadisticas_y_errores():
+    rutas = [archivo_tef(), archivo_danado(), cartola_grande(150)]
+    dataframes, estadisticas = procesar_archivos_en_paralelo(rutas, max_procesos=2)
+
+    assert len(dataframes) == 2
+    assert [e['filas'] for e in estadisticas] == [2, 0, len(procesar_archivo_excel(rutas[2]))]
+    assert estadisticas[0]['error'] is None and estadisticas[2]['error'] is None
+    assert 'Error al leer archivo Excel' in estadisticas[1]['error']
+    assert all(e['segundos'] >= 0 for e in estadisticas)
+
+
+def test_columnas_compactas():
+    df = procesar_archivo_excel(cartola_grande(100))
+    nombres, arreglos = _a_columnas(df)
+    assert nombres == list(df.columns)
+    assert all(hasattr(arreglo, 'dtype') for arreglo in arreglos)
+    pd.testing.assert_frame_equal(_desde_columnas((nombres, arreglos)), df.reset_index(drop=True))
+
+
+def test_sin_pool_para_un_archivo():
+    class PoolNoPermitido:
+        def __init__(self, *args, **kwargs):
+            raise AssertionError("No se debe crear el pool para un solo proceso")
+
+    original = leer_excel.ProcessPoolExecutor
+    leer_excel.ProcessPoolExecutor = PoolNoPermitido
+    try:
+        dataframes, estadisticas = procesar_archivos_en_paralelo([archivo_tef()])
+        assert len(dataframes) == 1 and estadisticas[0]['filas'] == 2
+        dataframes, _ = procesar_archivos_en_paralelo([archivo_tef(), archivo_generico()], max_procesos=1)
+        assert len(dataframes) == 2
+    finally:
+        leer_excel.ProcessPoolExecutor = original
+
+
+if __name__ == "__main__":
+    test_paralelo_igual_a_secuencial()
+    test_estadisticas_y_errores()
+    test_columnas_compactas()
+    test_sin_pool_para_un_archivo()
+    print("✅ Carga de archivos en paralelo funcionando")
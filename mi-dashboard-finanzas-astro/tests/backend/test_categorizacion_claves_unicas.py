@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Verifica que categorizar por claves únicas entregue el mismo resultado que
+categorizar fila por fila, incluyendo el tipo de regla aplicado.
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.categorizar import aplicar_categorizacion, registro_reglas
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def crear_dataframe_repetido(repeticiones=200):
+    """DataFrame con pocos comercios distintos repetidos muchas veces"""
+    base = pd.DataFrame({
+        'detalle': ['COMPRA UBER', 'JUMBO LAS CONDES', 'JUAN PEREZ', 'XYZ 123', 'XYZ 123', None],
+        'nombre_destino': ['', '', '', 'NETFLIX', '', ''],
+        'comentario': ['', '', '', '', 'ARRIENDO', ''],
+        'monto': [1000.0, 2000.0, 3000.0, 4000.0, 5000.0, 6000.0],
+        'tipo': ['Gasto'] * 6,
+    })
+    return pd.concat([base] * repeticiones, ignore_index=True)
+
+
+def test_claves_unicas_igual_a_fila_por_fila():
+    df = crear_dataframe_repetido()
+
+    por_filas = aplicar_categorizacion(df.copy(), por_claves_unicas=False)
+    por_claves = aplicar_categorizacion(df.copy(), por_claves_unicas=True)
+
+    assert por_filas['categoria'].tolist() == por_claves['categoria'].tolist()
+    assert por_filas['tipo_regla'].tolist() == por_claves['tipo_regla'].tolist()
+
+
+def test_tipo_regla_por_fila():
+    df = aplicar_categorizacion(crear_dataframe_repetido(repeticiones=1))
+
+    assert df['categoria'].tolist() == [
+        'Gasto - Transporte', 'Gasto - Alimentos', 'Transferencias',
+        'Gasto - Entretenimiento', 'Gasto - Vivienda', 'Sin categorizar'
+    ]
+    assert df['tipo_regla'].tolist() == [
+        'mapeo_por_palabra_clave', 'mapeo_por_palabra_clave', 'deteccion_nombre_persona',
+        'mapeo_por_palabra_clave', 'mapeo_por_palabra_clave', 'sin_coincidencias'
+    ]
+
+
+def test_dataframe_vacio():
+    df = pd.DataFrame({'detalle': pd.Series([], dtype=object)})
+    df = aplicar_categorizacion(df)
+    assert df.empty
+    assert 'categoria' in df.columns and 'tipo_regla' in df.columns
+
+
+if __name__ == "__main__":
+    test_claves_unicas_igual_a_fila_por_fila()
+    test_tipo_regla_por_fila()
+    test_dataframe_vacio()
+    print("✅ Categorización por claves únicas equivalente a la categorización por fila")
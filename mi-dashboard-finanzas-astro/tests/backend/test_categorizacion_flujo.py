@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Verifica la categorización en flujo (categorizar_en_flujo):
+1. Categorizar fragmento a fragmento da lo mismo que categorizar el DataFrame completo
+2. Las filas sueltas (dicts o tuplas) se agrupan en fragmentos del tamaño indicado
+3. Las claves ya evaluadas en un fragmento no se vuelven a evaluar en los siguientes
+4. Cargador, categorización y guardado forman un flujo que procesa un fragmento a la vez
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import utils.categorizar as categorizar
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import aplicar_categorizacion, categorizar_en_flujo, compilar_reglas, definir_categorias, registro_reglas
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+REGLAS = compilar_reglas(definir_categorias())
+COLUMNAS = ['fecha', 'detalle', 'nombre_destino', 'monto', 'tipo']
+
+
+def crear_dataframe(cantidad, semilla=9):
+    azar = random.Random(semilla)
+    detalles = ['JUMBO LAS CONDES', 'COPEC RUTA 5', 'UBER TRIP', 'NETFLIX.COM', 'XYZ LTDA', 'FARMACIA AHUMADA']
+    return pd.DataFrame({
+        'fecha': pd.to_datetime('2024-01-01') + pd.to_timedelta([azar.randint(0, 200) for _ in range(cantidad)], unit='D'),
+        'detalle': [f"{azar.choice(detalles)} {azar.randint(1, 30)}" for _ in range(cantidad)],
+        'nombre_destino': [azar.choice(['', 'JUAN PEREZ', 'LIDER']) for _ in range(cantidad)],
+        'monto': [float(azar.randint(1000, 90000)) for _ in range(cantidad)],
+        'tipo': [azar.choice(['Gasto', 'Ingreso']) for _ in range(cantidad)],
+    })
+
+
+def columnas_resultado(df):
+    return df[['categoria', 'tipo_regla', 'palabra_regla', 'campo_regla', 'posicion_regla']].values.tolist()
+
+
+def test_flujo_igual_a_dataframe_completo():
+    df = crear_dataframe(2000)
+    esperado = aplicar_categorizacion(df.copy(), reglas=REGLAS)
+
+    fragmentos = (df.iloc[inicio:inicio + 300].copy() for inicio in range(0, len(df), 300))
+    resultado = list(categorizar_en_flujo(fragmentos, reglas=REGLAS))
+    assert [len(f) for f in resultado] == [300] * 6 + [200]
+    assert columnas_resultado(pd.concat(resultado)) == columnas_resultado(esperado)
+
+
+def test_filas_sueltas():
+    df = crear_dataframe(1050)
+    esperado = columnas_resultado(aplicar_categorizacion(df.copy(), reglas=REGLAS))
+
+    tuplas = list(categorizar_en_flujo(df.itertuples(index=False, name=None), reglas=REGLAS,
+                                       tam_fragmento=500, columnas=COLUMNAS))
+    assert [len(f) for f in tuplas] == [500, 500, 50]
+    assert columnas_resultado(pd.concat(tuplas)) == esperado
+
+    diccionarios = list(categorizar_en_flujo(df.to_dict('records'), reglas=REGLAS, tam_fragmento=1000))
+    assert [len(f) for f in diccionarios] == [1000, 50]
+    assert columnas_resultado(pd.concat(diccionarios)) == esperado
+
+
+def test_claves_compartidas_entre_fragmentos():
+    df = crear_dataframe(3000)
+    evaluadas = []
+    evaluar_original = categorizar._evaluar_claves
+
+    def evaluar_contando(claves, reglas, opciones_paralelo=None):
+        evaluadas.extend(claves)
+        return evaluar_original(claves, reglas, opciones_paralelo)
+
+    categorizar._evaluar_claves = evaluar_contando
+    try:
+        fragmentos = (df.iloc[inicio:inicio + 500].copy() for inicio in range(0, len(df), 500))
+        for _ in categorizar_en_flujo(fragmentos, reglas=REGLAS):
+            pass
+    finally:
+        categorizar._evaluar_claves = evaluar_original
+
+    # Cada clave única se evalúa una sola vez en todo el flujo
+    assert len(evaluadas) == len(set(evaluadas))
+    unicas = pd.MultiIndex.from_arrays(categorizar._columnas_texto(df)).unique()
+    assert len(evaluadas) == len(unicas)
+
+
+def test_flujo_hasta_la_base_de_datos():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    df = crear_dataframe(1200)
+    eventos = []
+
+    def cargar():
+        for inicio in range(0, len(df), 400):
+            eventos.append('cargado')
+            yield df.iloc[inicio:inicio + 400].copy()
+
+    def registrar(fragmentos):
+        for fragmento in fragmentos:
+            yield fragmento
+            eventos.append('guardado')
+
+    resumen = db.guardar_flujo(registrar(categorizar_en_flujo(cargar(), db_manager=db, reglas=REGLAS)))
+    assert resumen == {'fragmentos': 3, 'filas': 1200}
+    # Cada fragmento se guarda antes de cargar el siguiente
+    assert eventos == ['cargado', 'guardado'] * 3
+
+    guardadas = db.session.query(Transaccion).count()
+    assert guardadas == len(df.drop_duplicates(['fecha', 'detalle', 'monto', 'tipo']))
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_flujo_igual_a_dataframe_completo()
+    test_filas_sueltas()
+    test_claves_compartidas_entre_fragmentos()
+    test_flujo_hasta_la_base_de_datos()
+    print("✅ Categorización en flujo funcionando")
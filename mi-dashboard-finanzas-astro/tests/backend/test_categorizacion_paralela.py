@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Verifica el modo paralelo de aplicar_categorizacion:
+1. Con un pool de procesos el resultado es igual al de un solo proceso
+2. Bajo el umbral de filas no se crea el pool
+"""
+
+import os
+import random
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils import categorizar
+from utils.categorizar import aplicar_categorizacion, definir_categorias, registro_reglas
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def crear_dataframe(cantidad, semilla=21):
+    azar = random.Random(semilla)
+    vocabulario = [p for palabras in definir_categorias().values() for p in palabras] + ['XYZ', 'JUAN PEREZ']
+    return pd.DataFrame({
+        'detalle': [f"{azar.choice(vocabulario)} {azar.randint(1, 3000)} {azar.choice(['', 'SANTIAGO', 'QWE'])}"
+                    for _ in range(cantidad)],
+        'tipo': [azar.choice(['Gasto', 'Ingreso', None]) for _ in range(cantidad)],
+    })
+
+
+def test_paralelo_igual_a_un_proceso():
+    df = crear_dataframe(3000)
+
+    secuencial = aplicar_categorizacion(df.copy())
+    paralelo = aplicar_categorizacion(df.copy(), paralelo=True, max_procesos=2, tam_bloque=100, min_filas_paralelo=0)
+
+    assert secuencial['categoria'].tolist() == paralelo['categoria'].tolist()
+    assert secuencial['tipo_regla'].tolist() == paralelo['tipo_regla'].tolist()
+
+
+def test_bajo_el_umbral_no_crea_pool():
+    class PoolNoPermitido:
+        def __init__(self, *args, **kwargs):
+            raise AssertionError("No se debe crear el pool bajo el umbral")
+
+    original = categorizar.ProcessPoolExecutor
+    categorizar.ProcessPoolExecutor = PoolNoPermitido
+    try:
+        df = aplicar_categorizacion(crear_dataframe(500), paralelo=True, tam_bloque=10, min_filas_paralelo=1000)
+        assert len(df) == 500
+    finally:
+        categorizar.ProcessPoolExecutor = original
+
+
+if __name__ == "__main__":
+    test_paralelo_igual_a_un_proceso()
+    test_bajo_el_umbral_no_crea_pool()
+    print("✅ Categorización en paralelo equivalente a un solo proceso")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Verifica el modelo aprendido de sobrescrituras manuales:
+1. Aprende ejemplo a ejemplo y predice en lote
+2. Se guarda y se carga sin cambiar sus predicciones
+3. Solo actúa como respaldo cuando ninguna regla coincide
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import aplicar_categorizacion, registro_reglas
+from utils.clasificador import ClasificadorCategorias, registro_clasificador
+from utils.fechas import agregar_columnas_tiempo
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+EJEMPLOS = [
+    ('CLINICA VETERINARIA ANIMALIA 123', 'Gasto - Mascotas'),
+    ('VETERINARIA SAN FRANCISCO 88', 'Gasto - Mascotas'),
+    ('PELUQUERIA CANINA PATITAS', 'Gasto - Mascotas'),
+    ('GIMNASIO SMARTFIT 0045', 'Gasto - Deporte'),
+    ('SMARTFIT MENSUALIDAD', 'Gasto - Deporte'),
+    ('CLUB DE TENIS LAS ARAUCARIAS', 'Gasto - Deporte'),
+]
+
+
+def test_aprende_y_predice_en_lote():
+    modelo = ClasificadorCategorias()
+    for texto, categoria in EJEMPLOS[:4]:
+        modelo.actualizar(texto, categoria)
+    modelo.entrenar([t for t, _ in EJEMPLOS[4:]], [c for _, c in EJEMPLOS[4:]])
+    assert modelo.listo
+
+    categorias, confianzas = modelo.predecir_lote(['VETERINARIA ANIMALIA 999', 'SMARTFIT 1234', ''])
+    assert list(categorias) == ['Gasto - Mascotas', 'Gasto - Deporte', None]
+    assert confianzas[0] > 0.5 and confianzas[1] > 0.5
+
+    # Olvidar un ejemplo deja los conteos como antes de aprenderlo
+    conteos = modelo.conteos.copy()
+    modelo.actualizar('TEXTO CORREGIDO', 'Gasto - Deporte')
+    modelo.olvidar('TEXTO CORREGIDO', 'Gasto - Deporte')
+    assert (modelo.conteos == conteos).all()
+
+    ruta = os.path.join(tempfile.mkdtemp(), 'modelo.npz')
+    modelo.guardar(ruta)
+    cargado = ClasificadorCategorias.cargar(ruta)
+    assert cargado.categorias == modelo.categorias
+    assert list(cargado.predecir_lote(['SMARTFIT 1234'])[1]) == list(modelo.predecir_lote(['SMARTFIT 1234'])[1])
+
+
+def test_respaldo_tras_reglas_con_sobrescrituras():
+    carpeta = tempfile.mkdtemp()
+    db = DatabaseManager(db_path=os.path.join(carpeta, 'finanzas_test.db'))
+    registro_clasificador.configurar_ruta(os.path.join(carpeta, 'modelo_categorias.npz'))
+
+    try:
+        df = pd.DataFrame({
+            'fecha': pd.to_datetime(['2024-01-01'] * len(EJEMPLOS)),
+            'detalle': [t for t, _ in EJEMPLOS],
+            'monto': [1000.0] * len(EJEMPLOS),
+            'tipo': ['Gasto'] * len(EJEMPLOS),
+        })
+        db.guardar_dataframe(agregar_columnas_tiempo(aplicar_categorizacion(df)))
+
+        for transaccion in db.session.query(Transaccion).all():
+            db.actualizar_categoria_transaccion(transaccion.id, dict(EJEMPLOS)[transaccion.detalle])
+        assert os.path.exists(os.path.join(carpeta, 'modelo_categorias.npz'))
+
+        nuevas = aplicar_categorizacion(pd.DataFrame({
+            'detalle': ['VETERINARIA ANIMALIA 777', 'SMARTFIT 2024', 'COMPRA UBER', 'QWERTY'],
+        }))
+        assert nuevas['categoria'].tolist()[:3] == ['Gasto - Mascotas', 'Gasto - Deporte', 'Gasto - Transporte']
+        assert nuevas['tipo_regla'].tolist()[:3] == ['modelo_aprendido', 'modelo_aprendido', 'mapeo_por_palabra_clave']
+
+        # Reentrenar desde la base de datos entrega el mismo modelo
+        resumen = db.entrenar_clasificador()
+        assert resumen == {'ejemplos': len(EJEMPLOS), 'categorias': 2}
+    finally:
+        registro_clasificador.configurar_ruta(None)
+        db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_aprende_y_predice_en_lote()
+    test_respaldo_tras_reglas_con_sobrescrituras()
+    print("✅ Modelo aprendido funcionando")
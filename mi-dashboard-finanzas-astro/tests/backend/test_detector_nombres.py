@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Verifica el detector de nombres de persona:
+1. Reconoce nombres y apellidos por palabra completa, con o sin tildes
+2. No confunde comercios que contienen un nombre como subcadena
+3. Exige nombre y apellido: meses, marcas y lugares (San Pablo) no tapan las palabras clave
+4. Cambiar el léxico cambia la versión de reglas
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils import categorizar
+from utils.categorizar import (
+    DetectorNombresPersona, calcular_version_reglas, configurar_detector_nombres,
+    definir_categorias, es_nombre_persona, registro_reglas
+)
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def test_detecta_nombres_y_apellidos():
+    detector = DetectorNombresPersona()
+
+    assert detector.buscar('TRANSFERENCIA A JUAN PEREZ') == 'JUAN'
+    assert detector.buscar('Camila Muñoz') == 'CAMILA'
+    assert detector.buscar('SR. TOMÁS NÚÑEZ') == 'TOMAS'
+    assert es_nombre_persona('JOSÉ GONZÁLEZ')
+
+    # Una sola palabra o nombres como subcadena de otra palabra no cuentan
+    assert detector.buscar('JUAN') is None
+    assert detector.buscar('BANANA EXPRESS') is None
+    assert detector.buscar('SANTA ISABEL') is None
+    assert not es_nombre_persona('')
+
+
+def test_exige_nombre_y_apellido():
+    detector = DetectorNombresPersona()
+
+    # Un nombre o un apellido solo no basta, ni un nombre tras SAN/SANTA/SANTO
+    assert detector.buscar('SR. NUNEZ') is None
+    assert detector.buscar('PAGO A MIGUEL') is None
+    assert detector.buscar('FARMACIA SAN MIGUEL PEREZ') is None
+    assert detector.buscar('MIGUEL PEREZ SAN MIGUEL') == 'MIGUEL'
+
+    # Palabras que son meses, marcas o lugares no deben ganarle a las palabras clave
+    esperados = {
+        'SUELDO JULIO': 'Ingreso - Sueldos',
+        'PAGO ARRIENDO JULIO': 'Gasto - Vivienda',
+        'CUOTA CREDITO JULIO 2024': 'Gasto - Financiero',
+        'BONO GLORIA': 'Ingreso - Otros',
+        'COMPRA TIENDA SAN MARTIN': 'Gasto - Compras',
+        'FARMACIA SAN PABLO': 'Gasto - Salud',
+    }
+    for detalle, categoria in esperados.items():
+        assert categorizar.categorizar_transaccion(detalle) == categoria, detalle
+
+
+def test_lexico_configurable_cambia_version():
+    carpeta = tempfile.mkdtemp()
+    ruta_nombres = os.path.join(carpeta, 'nombres.txt')
+    ruta_apellidos = os.path.join(carpeta, 'apellidos.txt')
+    with open(ruta_nombres, 'w', encoding='utf-8') as archivo:
+        archivo.write('ANACLETO\nBRUNILDA\n')
+    with open(ruta_apellidos, 'w', encoding='utf-8') as archivo:
+        archivo.write('PEÑAILILLO\n')
+
+    categorias = definir_categorias()
+    version_original = calcular_version_reglas(categorias)
+    detector_original = categorizar.detector_nombres_persona
+
+    try:
+        configurar_detector_nombres(DetectorNombresPersona.desde_archivos(ruta_nombres, ruta_apellidos))
+        assert calcular_version_reglas(categorias) != version_original
+
+        reglas = registro_reglas.obtener()
+        assert reglas.detector_nombres.buscar('PAGO ANACLETO PENAILILLO') == 'ANACLETO'
+        assert categorizar.categorizar_transaccion_con_regla('XYZ CAMILA', reglas=reglas) == (
+            'Sin categorizar', categorizar.REGLA_SIN_COINCIDENCIAS
+        )
+    finally:
+        configurar_detector_nombres(detector_original)
+
+    assert calcular_version_reglas(categorias) == version_original
+
+
+if __name__ == "__main__":
+    test_detecta_nombres_y_apellidos()
+    test_exige_nombre_y_apellido()
+    test_lexico_configurable_cambia_version()
+    print("✅ Detector de nombres de persona funcionando")
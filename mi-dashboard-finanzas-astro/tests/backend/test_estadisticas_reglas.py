@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Verifica los contadores de uso de las reglas de categorización:
+1. Aciertos por categoría y por palabra clave, ponderados por filas
+2. Evaluaciones según la partición de cada fila (las transferencias a personas no cuentan)
+3. Los contadores se guardan por corrida: volver a categorizar no cuenta dos veces
+   las mismas filas, y los fragmentos de un flujo suman a la misma corrida
+4. Las reglas condicionales y de expresiones regulares también se cuentan
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager
+from utils.categorizar import (
+    aplicar_categorizacion, categorizar_en_flujo, compilar_reglas, definir_categorias, registro_reglas
+)
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def crear_dataframe():
+    return pd.DataFrame({
+        'detalle': ['COMPRA UBER', 'COMPRA UBER', 'COMPRA UBER', 'JUMBO LAS CONDES', 'JUAN PEREZ', 'XYZ', 'PAGO SUELDO'],
+        'tipo': ['Gasto', 'Gasto', 'Gasto', 'Gasto', 'Gasto', 'Gasto', 'Ingreso'],
+    })
+
+
+def test_contadores_por_regla():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+
+    aplicar_categorizacion(crear_dataframe(), db_manager=db)
+    estadisticas = db.obtener_estadisticas_reglas()
+
+    transporte = estadisticas['Gasto - Transporte']
+    assert transporte['aciertos'] == 3
+    assert transporte['palabras_mas_usadas'] == [{'palabra_clave': 'UBER', 'aciertos': 3}]
+    # 5 gastos llegan a las palabras clave (JUAN PEREZ se resuelve como persona)
+    assert transporte['evaluaciones'] == 5
+    assert transporte['fallos'] == 2
+    assert estadisticas['Ingreso - Sueldos']['evaluaciones'] == 1
+    assert estadisticas['Transferencias']['evaluaciones'] == 6
+
+    # La segunda corrida se resuelve desde el cache, que guarda la palabra que coincidió,
+    # y reemplaza a la primera en lugar de sumarse
+    aplicar_categorizacion(crear_dataframe(), db_manager=db)
+    assert db.obtener_estadisticas_reglas() == estadisticas
+    db.cerrar_conexion()
+
+
+def test_corrida_en_flujo():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    fragmentos = [crear_dataframe(), crear_dataframe()]
+    for _ in categorizar_en_flujo(iter(fragmentos), db_manager=db):
+        pass
+
+    transporte = db.obtener_estadisticas_reglas()['Gasto - Transporte']
+    assert transporte['aciertos'] == 6
+    assert transporte['evaluaciones'] == 10
+    db.cerrar_conexion()
+
+
+def test_reglas_condicionales_y_expresiones():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    reglas = compilar_reglas(
+        definir_categorias(),
+        [('Gasto - Viajes cortos', ['UBER'], {'monto_max': 5000.0})],
+        [(1, 'Gasto - Supermercado', [r'^JUMBO\b'])]
+    )
+    df = crear_dataframe()
+    df['monto'] = [3000.0, 3000.0, 9000.0, 20000.0, 1000.0, 1000.0, 900000.0]
+    aplicar_categorizacion(df, db_manager=db, reglas=reglas)
+
+    estadisticas = db.obtener_estadisticas_reglas()
+    assert estadisticas['Gasto - Viajes cortos']['aciertos'] == 2
+    assert estadisticas['Gasto - Viajes cortos']['palabras_mas_usadas'] == [{'palabra_clave': 'UBER', 'aciertos': 2}]
+    assert estadisticas['Gasto - Transporte']['aciertos'] == 1
+    assert estadisticas['Gasto - Supermercado']['palabras_mas_usadas'] == [
+        {'palabra_clave': r'^JUMBO\b', 'aciertos': 1}
+    ]
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_contadores_por_regla()
+    test_corrida_en_flujo()
+    test_reglas_condicionales_y_expresiones()
+    print("✅ Estadísticas de reglas funcionando")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Verifica la explicación registrada al categorizar (palabra, campo y posición):
+1. La palabra clave o el nombre de persona se reporta con su campo y su posición
+   en el texto original del campo (no en el normalizado)
+2. Por claves únicas, desde el cache y fila a fila se obtiene la misma explicación
+3. La explicación se guarda en la base de datos, se actualiza al recategorizar y
+   se borra con una sobrescritura manual
+4. En lote, la posición apunta a la palabra dentro del detalle original aunque
+   cambien los dígitos o los espacios
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager
+from utils.categorizar import (
+    COLUMNAS_EXPLICACION, aplicar_categorizacion, categorizar_transaccion_explicada, registro_reglas
+)
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def crear_dataframe():
+    return pd.DataFrame({
+        'fecha': pd.to_datetime(['2024-03-01'] * 5),
+        'detalle': ['COMPRA  uber 123', 'XYZ 55', 'TRANSF CAMILA ROJAS', 'XYZ', 'PAGO 9 UBER'],
+        'nombre_destino': ['', '', '', '', ''],
+        'comentario': ['', '  pasaje uber', '', '', ''],
+        'monto': [1000, 2000, 3000, 4000, 5000],
+        'tipo': ['Gasto'] * 5,
+        'año': [2024] * 5, 'mes': [3] * 5, 'dia': [1] * 5, 'semana': [9] * 5,
+    })
+
+
+def explicaciones(df):
+    return [tuple(None if pd.isna(v) else v for v in fila) for fila in df[list(COLUMNAS_EXPLICACION)].values]
+
+
+def test_explicacion_en_una_pasada():
+    categoria, tipo_regla, explicacion = categorizar_transaccion_explicada('COMPRA  uber 123', tipo='Gasto')
+    assert tipo_regla == 'mapeo_por_palabra_clave'
+    # La posición es sobre el texto original "COMPRA  uber 123", no sobre "COMPRA UBER #"
+    assert explicacion == ('UBER', 'detalle', 8)
+
+    _, _, explicacion = categorizar_transaccion_explicada('XYZ', comentario='  pasaje uber', tipo='Gasto')
+    assert explicacion == ('UBER', 'comentario', 9)
+
+    _, _, explicacion = categorizar_transaccion_explicada('COMPRA 123456 JUMBO', tipo='Gasto')
+    assert explicacion == ('JUMBO', 'detalle', 14)
+
+    categoria, tipo_regla, explicacion = categorizar_transaccion_explicada('TRANSF CAMILA ROJAS')
+    assert (categoria, tipo_regla) == ('Transferencias', 'deteccion_nombre_persona')
+    assert explicacion == ('CAMILA', 'detalle', 7)
+
+    assert categorizar_transaccion_explicada('XYZ')[2] is None
+
+
+def test_mismas_explicaciones_por_cualquier_camino():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+
+    por_filas = aplicar_categorizacion(crear_dataframe(), por_claves_unicas=False)
+    por_claves = aplicar_categorizacion(crear_dataframe(), db_manager=db)
+    desde_cache = aplicar_categorizacion(crear_dataframe(), db_manager=db)
+
+    esperado = [('UBER', 'detalle', 8), ('UBER', 'comentario', 9), ('CAMILA', 'detalle', 7), None, ('UBER', 'detalle', 7)]
+    esperado = [e or (None, None, None) for e in esperado]
+    assert explicaciones(por_filas) == esperado
+    assert explicaciones(por_claves) == esperado
+    assert explicaciones(desde_cache) == esperado
+    db.cerrar_conexion()
+
+
+def test_explicacion_persistida():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    db.guardar_dataframe(aplicar_categorizacion(crear_dataframe()))
+
+    guardadas = db.obtener_todas_transacciones().sort_values('monto')
+    assert explicaciones(guardadas)[0] == ('UBER', 'detalle', 8)
+    assert explicaciones(guardadas)[3] == (None, None, None)
+
+    primera = int(guardadas['id'].iloc[0])
+    resumen = db.actualizar_categorias_en_lote([(primera, 'Gasto - Transporte', 'mapeo_por_palabra_clave', 'UBER', 'comentario', 2)])
+    assert resumen['actualizadas'] == 1
+    assert explicaciones(db.obtener_transaccion_por_id(primera))[0] == ('UBER', 'comentario', 2)
+
+    db.actualizar_categoria_transaccion(primera, 'Gasto - Otros')
+    assert explicaciones(db.obtener_transaccion_por_id(primera))[0] == (None, None, None)
+    db.cerrar_conexion()
+
+
+def test_posicion_en_detalle_original():
+    detalles = ['COMPRA 123456 JUMBO', 'COMPRA 7 JUMBO', '  compra\t 12/03/2024   uber  ', 'pago 1.234 copec 99',
+                'TRANSF 12.345.678-9 camila rojas', 'XYZ']
+    df = aplicar_categorizacion(pd.DataFrame({'detalle': detalles, 'tipo': ['Gasto'] * len(detalles)}))
+
+    for detalle, palabra, posicion in zip(detalles, df['palabra_regla'], df['posicion_regla']):
+        if pd.isna(posicion):
+            continue
+        assert detalle.upper()[int(posicion):int(posicion) + len(palabra)] == palabra, (detalle, palabra, posicion)
+    assert df['posicion_regla'].tolist()[:2] == [14, 9]
+
+
+if __name__ == "__main__":
+    test_explicacion_en_una_pasada()
+    test_mismas_explicaciones_por_cualquier_camino()
+    test_explicacion_persistida()
+    test_posicion_en_detalle_original()
+    print("✅ Explicación de categorización funcionando")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Verifica el parseo vectorizado de fechas de cartola (parsear_fechas_cartola):
+1. Fechas DD/MM/AAAA, DD/MM, celdas de fecha e inválidas igual que el parseo fila a fila
+2. Una cartola de diciembre importada en enero queda en el año anterior
+3. El año sale de la fecha de cierre escrita sobre la cabecera de la cartola
+4. Los cambios de año se infieren del orden de las filas (ascendente o descendente)
+5. El texto se interpreta una vez por valor distinto, sin pd.to_datetime por fila
+"""
+
+import os
+import random
+import sys
+from datetime import datetime
+from unittest import mock
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from test_lectura_unica_excel import crear_archivo
+from pandas.core.strings.accessor import StringMethods
+from utils.leer_excel import cargar_y_limpiar_cartola, fecha_cierre_cartola, leer_grilla_excel, parsear_fechas_cartola
+
+
+def parsear_fila_a_fila(fechas, anio):
+    """Referencia: el parseo anterior, un pd.to_datetime por fila con el año dado para DD/MM"""
+    resultado = []
+    for fecha in fechas.astype(str):
+        partes = fecha.strip().split('/')
+        try:
+            if len(partes) == 3:
+                resultado.append(pd.to_datetime(fecha.strip(), format='%d/%m/%Y'))
+            elif len(partes) == 2:
+                resultado.append(pd.to_datetime(f"{fecha.strip()}/{anio}", format='%d/%m/%Y'))
+            else:
+                resultado.append(pd.NaT)
+        except ValueError:
+            resultado.append(pd.NaT)
+    return pd.Series(resultado, index=fechas.index, dtype='datetime64[ns]')
+
+
+def test_igual_a_fila_a_fila():
+    fechas = pd.Series(['05/01/2024', ' 3/2/2023 ', '31/02/2024', '15/06', '01/01', 'nan', '', 'Saldo anterior',
+                        '29/02/2024', None], dtype=object)
+    resultado = parsear_fechas_cartola(fechas, referencia=pd.Timestamp('2024-12-31'))
+    pd.testing.assert_series_equal(resultado, parsear_fila_a_fila(fechas, 2024))
+
+    # Las celdas guardadas como fecha en el Excel se conservan
+    celdas = pd.Series([datetime(2023, 5, 1), '02/05/2023'], dtype=object)
+    assert parsear_fechas_cartola(celdas).tolist() == [pd.Timestamp('2023-05-01'), pd.Timestamp('2023-05-02')]
+
+
+def test_diciembre_importado_en_enero():
+    fechas = pd.Series(['28/12', '30/12', '02/01', '05/01'])
+    resultado = parsear_fechas_cartola(fechas, referencia=pd.Timestamp('2025-01-10'))
+    assert resultado.dt.year.tolist() == [2024, 2024, 2025, 2025]
+
+    # Sin orden cronológico, cada fecha toma el último año que no la deja en el futuro
+    desordenadas = pd.Series(['05/01', '28/12', '02/01', '30/12', '03/01', '15/07', '29/12', '04/01'])
+    resultado = parsear_fechas_cartola(desordenadas, referencia=pd.Timestamp('2025-01-10'))
+    assert resultado.dt.year.tolist() == [2025, 2024, 2025, 2024, 2025, 2024, 2024, 2025]
+
+
+def test_fecha_de_cierre_desde_la_cabecera():
+    ruta = crear_archivo('cartola_periodo.xlsx', 24,
+                         ['Fecha', None, 'Descripción', 'Canal o Sucursal', 'Cargos (PESOS)', 'Abonos (PESOS)', 'Saldo (PESOS)'],
+                         [['29/12', None, 'Compra Jumbo', 'POS', 15990, None, 100000],
+                          ['03/01', None, 'Copec', 'POS', 2000, None, 98000]])
+    libro = openpyxl.load_workbook(ruta)
+    libro.active['A5'] = 'Período: 01/12/2023 al 31/01/2024'
+    libro.save(ruta)
+
+    assert fecha_cierre_cartola(leer_grilla_excel(ruta)) == pd.Timestamp('2024-01-31')
+    df = cargar_y_limpiar_cartola(ruta)
+    assert df['fecha'].tolist() == [pd.Timestamp('2023-12-29'), pd.Timestamp('2024-01-03')]
+
+
+def test_cambios_de_anio_por_orden():
+    fechas = pd.date_range('2021-11-15', '2024-03-20', freq='D')
+    texto = pd.Series(fechas.strftime('%d/%m'))
+    referencia = pd.Timestamp('2024-03-31')
+
+    assert (parsear_fechas_cartola(texto, referencia).to_numpy() == fechas.to_numpy()).all()
+    inverso = texto[::-1].reset_index(drop=True)
+    assert (parsear_fechas_cartola(inverso, referencia).to_numpy() == fechas[::-1].to_numpy()).all()
+
+    # Un poco de desorden dentro del mismo mes no cambia el año
+    texto_desordenado = texto.copy()
+    texto_desordenado.iloc[[10, 11]] = texto.iloc[[11, 10]].to_numpy()
+    resultado = parsear_fechas_cartola(texto_desordenado, referencia)
+    assert resultado.dt.year.tolist() == list(fechas.year)
+
+
+def test_una_interpretacion_por_valor_distinto():
+    azar = random.Random(4)
+    fechas = pd.Series([f"{azar.randint(1, 28):02d}/{azar.randint(1, 12):02d}" for _ in range(20000)], dtype=object)
+    fechas[::1000] = datetime(2024, 6, 30)
+
+    extraidos = []
+    extract = StringMethods.extract
+
+    def contar_extract(self, *args, **kwargs):
+        extraidos.append(len(self._data))
+        return extract(self, *args, **kwargs)
+
+    to_datetime = pd.to_datetime
+    with mock.patch.object(StringMethods, 'extract', contar_extract), \
+            mock.patch('utils.leer_excel.pd.to_datetime', wraps=to_datetime) as conversiones:
+        resultado = parsear_fechas_cartola(fechas, referencia=pd.Timestamp('2024-12-31'))
+
+    assert extraidos == [fechas.astype(str).nunique()]
+    # Solo las celdas que ya son fechas pasan por pd.to_datetime, en una sola llamada
+    assert conversiones.call_count == 1
+
+    esperado = parsear_fila_a_fila(fechas.where(fechas.map(type) == str, '30/06/2024'), 2024)
+    pd.testing.assert_series_equal(resultado, esperado)
+
+
+if __name__ == "__main__":
+    test_igual_a_fila_a_fila()
+    test_diciembre_importado_en_enero()
+    test_fecha_de_cierre_desde_la_cabecera()
+    test_cambios_de_anio_por_orden()
+    test_una_interpretacion_por_valor_distinto()
+    print("✅ Parseo vectorizado de fechas de cartola funcionando")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Verifica el índice de similitud para sugerencias por coincidencia parcial:
+1. Entrega las mismas sugerencias que comparar contra todas las palabras clave
+2. Se actualiza al cambiar el vocabulario sin perder equivalencia
+3. Compara con SequenceMatcher a lo más MAX_FRACCION_COMPARACIONES de los pares que compara
+   el recorrido completo (la cota descarta el resto)
+"""
+
+import difflib
+import os
+import random
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.categorizar import compilar_reglas, definir_categorias, obtener_coincidencias_parciales
+from utils.indice_palabras import IndiceSimilitudPalabras
+
+MAX_FRACCION_COMPARACIONES = 0.1
+
+
+def coincidencias_recorrido_completo(detalle, categorias, umbral_coincidencia=0.6):
+    """Implementación original: compara cada palabra clave con cada palabra del detalle"""
+    sugerencias_unicas = {}
+    for categoria, palabras_clave in categorias.items():
+        for palabra_clave in palabras_clave:
+            for detalle_word in detalle.upper().split():
+                similitud = difflib.SequenceMatcher(None, palabra_clave, detalle_word).ratio()
+                if similitud >= umbral_coincidencia:
+                    if categoria not in sugerencias_unicas or similitud > sugerencias_unicas[categoria]['similitud']:
+                        sugerencias_unicas[categoria] = {
+                            'categoria': categoria,
+                            'palabra_clave': palabra_clave,
+                            'palabra_detalle': detalle_word,
+                            'similitud': similitud,
+                            'confianza': 'baja' if similitud < 0.8 else 'media'
+                        }
+    resultado = list(sugerencias_unicas.values())
+    resultado.sort(key=lambda x: x['similitud'], reverse=True)
+    return resultado[:5]
+
+
+def generar_detalles(categorias, cantidad, semilla=7):
+    """Detalles con palabras clave alteradas (letras cambiadas, cortadas o repetidas)"""
+    azar = random.Random(semilla)
+    vocabulario = [p for palabras in categorias.values() for p in palabras]
+    detalles = []
+    for _ in range(cantidad):
+        palabras = []
+        for _ in range(azar.randint(1, 4)):
+            palabra = list(azar.choice(vocabulario).split()[0])
+            for _ in range(azar.randint(0, 2)):
+                posicion = azar.randrange(len(palabra))
+                palabra[posicion] = azar.choice('AEIOUXZ0123')
+            palabras.append(''.join(palabra)[:azar.randint(2, 12)])
+        detalles.append(' '.join(palabras))
+    return detalles
+
+
+def test_mismas_sugerencias_que_recorrido_completo():
+    categorias = definir_categorias()
+    reglas = compilar_reglas(categorias)
+
+    for detalle in generar_detalles(categorias, 300) + ['UBER UBER EATS', 'SUPERMERCADO LIDER', 'x']:
+        for umbral in (0.6, 0.8):
+            esperado = coincidencias_recorrido_completo(detalle, categorias, umbral)
+            assert obtener_coincidencias_parciales(detalle, umbral, reglas=reglas) == esperado, detalle
+
+
+def test_actualizacion_incremental():
+    categorias = definir_categorias()
+    base = compilar_reglas(categorias).indice_similitud
+
+    categorias_editadas = dict(categorias)
+    categorias_editadas['Gasto - Mascotas'] = ['VETERINARIO', 'PETSHOP']
+    reglas = compilar_reglas(categorias_editadas)
+    assert 'VETERINARIO' in reglas.indice_similitud
+    assert 'VETERINARIO' not in base
+
+    indice = IndiceSimilitudPalabras(['UBER', 'JUMBO', 'LIDER'])
+    indice = indice.actualizado(['JUMBO', 'UNIMARC'])
+    assert len(indice) == 2 and 'UBER' not in indice
+    assert [p for p, _ in indice.similares('UNIMAR', 0.6)] == ['UNIMARC']
+
+    for detalle in generar_detalles(categorias_editadas, 100, semilla=11) + ['VETERINARI PETSHOPS']:
+        assert obtener_coincidencias_parciales(detalle, reglas=reglas) == \
+            coincidencias_recorrido_completo(detalle, categorias_editadas)
+
+
+def test_comparaciones_descartadas_por_la_cota():
+    categorias = definir_categorias()
+    reglas = compilar_reglas(categorias)
+    detalles = generar_detalles(categorias, 200, semilla=3)
+    reglas.indice_similitud
+
+    with mock.patch('utils.indice_palabras.difflib.SequenceMatcher', wraps=difflib.SequenceMatcher) as con_indice:
+        sugerencias = [obtener_coincidencias_parciales(detalle, reglas=reglas) for detalle in detalles]
+    with mock.patch('difflib.SequenceMatcher', wraps=difflib.SequenceMatcher) as completo:
+        esperadas = [coincidencias_recorrido_completo(detalle, categorias) for detalle in detalles]
+
+    assert sugerencias == esperadas
+    print(f"   {con_indice.call_count} comparaciones con el índice, {completo.call_count} sin él")
+    assert con_indice.call_count <= MAX_FRACCION_COMPARACIONES * completo.call_count
+
+
+if __name__ == "__main__":
+    test_mismas_sugerencias_que_recorrido_completo()
+    test_actualizacion_incremental()
+    test_comparaciones_descartadas_por_la_cota()
+    print("✅ Índice de similitud equivalente al recorrido completo")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Verifica la lectura en flujo de archivos .xlsx (procesar_archivo_excel_en_fragmentos):
+1. Los fragmentos juntos son iguales a procesar_archivo_excel para cartolas, TEF y genéricos
+2. Los fragmentos tienen a lo más tam_fragmento filas y tipos numéricos fijos
+3. La memoria máxima casi no crece con el tamaño del archivo (a lo más MAX_BYTES_POR_FILA)
+4. Lectura, categorización y guardado forman un flujo de un fragmento a la vez
+5. El año de las fechas DD/MM se infiere sobre todo el archivo y no por fragmento
+"""
+
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from test_lectura_unica_excel import archivo_cartola, archivo_generico, archivo_tef
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import categorizar_en_flujo, compilar_reglas, definir_categorias, registro_reglas
+from utils.leer_excel import procesar_archivo_excel, procesar_archivo_excel_en_fragmentos, procesar_archivos_en_flujo
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+# Crecimiento de la memoria máxima por fila leída en flujo
+MAX_BYTES_POR_FILA = 400
+
+CABECERA_CARTOLA = ['Fecha', None, 'Descripción', 'Canal o Sucursal', 'Cargos (PESOS)', 'Abonos (PESOS)', 'Saldo (PESOS)']
+
+
+def cartola_grande(cantidad, semilla=3):
+    """Cartola con header en la fila 24, escrita en modo write_only para no cargarla en memoria"""
+    azar = random.Random(semilla)
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet()
+    hoja.append(['Banco de Prueba'])
+    for _ in range(23):
+        hoja.append([])
+    hoja.append(CABECERA_CARTOLA)
+    for _ in range(cantidad):
+        cargo = azar.choice([azar.randint(1000, 90000), None])
+        hoja.append([
+            f"{azar.randint(1, 28):02d}/{azar.randint(1, 12):02d}", None,
+            f"COMPRA {azar.choice(['JUMBO', 'LIDER', 'COPEC', 'UBER'])} {azar.randint(1, 50)}",
+            azar.choice(['Internet', 'POS']), cargo, None if cargo else azar.randint(1000, 900000), 500000,
+        ])
+    ruta = os.path.join(tempfile.mkdtemp(), f'cartola_{cantidad}.xlsx')
+    libro.save(ruta)
+    return ruta
+
+
+def test_fragmentos_iguales_a_lectura_completa():
+    for ruta in (archivo_cartola(), archivo_tef(), archivo_generico(), cartola_grande(1200)):
+        esperado = procesar_archivo_excel(ruta).reset_index(drop=True)
+        for tam_fragmento in (2, 500, 5000) if len(esperado) < 10 else (300, 5000):
+            fragmentos = list(procesar_archivo_excel_en_fragmentos(ruta, tam_fragmento))
+            pd.testing.assert_frame_equal(pd.concat(fragmentos, ignore_index=True), esperado, check_dtype=False)
+
+
+def test_tamano_y_tipos_de_fragmentos():
+    fragmentos = list(procesar_archivo_excel_en_fragmentos(cartola_grande(2500), tam_fragmento=1000))
+    assert len(fragmentos) == 3
+    assert all(0 < len(df) <= 1000 for df in fragmentos)
+    for df in fragmentos:
+        assert list(df.columns) == ['fecha', 'detalle', 'monto', 'tipo', 'canal', 'saldo', 'merchant_key']
+        assert df['monto'].dtype == 'float64' and df['saldo'].dtype == 'float64'
+        assert pd.api.types.is_datetime64_any_dtype(df['fecha'])
+
+
+def test_memoria_acotada():
+    def pico_memoria(ruta):
+        tracemalloc.start()
+        try:
+            filas = sum(len(df) for df in procesar_archivo_excel_en_fragmentos(ruta, tam_fragmento=250))
+            return filas, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    filas_chico, pico_chico = pico_memoria(cartola_grande(1000))
+    filas_grande, pico_grande = pico_memoria(cartola_grande(4000))
+    assert filas_grande > 3 * filas_chico
+    # Lo único que crece es el elemento XML vacío que openpyxl conserva por cada fila
+    # ya leída (menos de 200 bytes); cargar la hoja completa ocupa varios KB por fila
+    por_fila = (pico_grande - pico_chico) / (filas_grande - filas_chico)
+    assert por_fila < MAX_BYTES_POR_FILA, (pico_chico, pico_grande)
+
+
+def test_cambio_de_anio_entre_fragmentos():
+    # 18 meses en orden ascendente: los cambios de año caen antes del último fragmento
+    dias = pd.date_range('2023-09-01', '2025-02-28', freq='D')
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet()
+    hoja.append(['Banco de Prueba', 'Período: 01/09/2023 al 28/02/2025'])
+    for _ in range(23):
+        hoja.append([])
+    hoja.append(CABECERA_CARTOLA)
+    for dia in dias:
+        hoja.append([dia.strftime('%d/%m'), None, 'COMPRA JUMBO 123', 'POS', 1000, None, 500000])
+    ruta = os.path.join(tempfile.mkdtemp(), 'cartola_18_meses.xlsx')
+    libro.save(ruta)
+
+    esperado = procesar_archivo_excel(ruta).reset_index(drop=True)
+    assert list(esperado['fecha']) == list(dias)
+    fragmentos = list(procesar_archivo_excel_en_fragmentos(ruta, tam_fragmento=100))
+    assert len(fragmentos) == 6
+    pd.testing.assert_frame_equal(pd.concat(fragmentos, ignore_index=True), esperado, check_dtype=False)
+
+
+def test_flujo_hasta_la_base_de_datos():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    rutas = [cartola_grande(900, semilla=1), cartola_grande(600, semilla=2)]
+    reglas = compilar_reglas(definir_categorias())
+
+    fragmentos = procesar_archivos_en_flujo(rutas, tam_fragmento=400)
+    resumen = db.guardar_flujo(categorizar_en_flujo(fragmentos, db_manager=db, reglas=reglas))
+    esperado = pd.concat([procesar_archivo_excel(ruta) for ruta in rutas])
+    assert resumen['filas'] == len(esperado)
+    assert resumen['fragmentos'] == 5
+
+    guardadas = db.session.query(Transaccion).count()
+    assert guardadas == len(esperado.drop_duplicates(['fecha', 'detalle', 'monto', 'tipo']))
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_fragmentos_iguales_a_lectura_completa()
+    test_tamano_y_tipos_de_fragmentos()
+    test_memoria_acotada()
+    test_cambio_de_anio_entre_fragmentos()
+    test_flujo_hasta_la_base_de_datos()
+    print("✅ Lectura de Excel en fragmentos funcionando")
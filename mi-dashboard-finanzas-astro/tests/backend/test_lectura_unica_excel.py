@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Verifica que los archivos Excel se parseen una sola vez:
+1. La detección de formato sobre la grilla coincide con la detección por archivo
+2. Los DataFrames construidos desde la grilla son iguales a los de pd.read_excel(header=n)
+3. leer_archivo_excel abre el archivo una sola vez para cartolas, TEF y genéricos
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils import leer_excel
+from utils.leer_excel import (
+    cargar_y_limpiar_cartola, cargar_y_limpiar_tef_cartola, dataframe_desde_grilla, detectar_formato_archivo,
+    detectar_formato_grilla, leer_archivo_excel, leer_grilla_excel
+)
+
+
+def crear_archivo(nombre, fila_header, cabecera, filas):
+    """Crea un xlsx con texto de relleno antes de la cabecera y filas en blanco entre los datos"""
+    libro = openpyxl.Workbook()
+    hoja = libro.active
+    hoja.append(['Banco de Prueba'])
+    for _ in range(fila_header - 1):
+        hoja.append([])
+    hoja.append(cabecera)
+    for fila in filas:
+        hoja.append(fila)
+    ruta = os.path.join(tempfile.mkdtemp(), nombre)
+    libro.save(ruta)
+    return ruta
+
+
+def archivo_cartola():
+    cabecera = ['Fecha', None, 'Descripción', 'Canal o Sucursal', 'Cargos (PESOS)', 'Abonos (PESOS)', 'Saldo (PESOS)']
+    filas = [
+        ['02/01', None, 'Compra Jumbo', 'Internet', 15990, None, 100000],
+        ['03/01', None, 'Sueldo', 'Sucursal', None, 850000, 950000],
+        [],
+        ['05/01/2024', None, 'Copec Ruta 5', 'POS', 32000.5, None, 918000],
+    ]
+    return crear_archivo('cartola.xlsx', 24, cabecera, filas)
+
+
+def archivo_tef():
+    cabecera = ['Fecha', 'Origen', 'Nombre Destino', 'Rut Destino', 'Banco Destino', 'Tipo de Cuenta',
+                'N Cuenta Destino', 'Monto', 'Estado', 'Canal', 'Id Transacción', 'Comentario']
+    filas = [
+        [datetime(2024, 1, 2), 'Cuenta Corriente', 'Juan Perez', '12345678-9', 'Banco Estado', 'Vista',
+         '123', 25000, 'Aprobada', 'Internet', 'A1', 'arriendo'],
+        [datetime(2024, 1, 9), 'Cuenta Corriente', 'Maria Soto', '9876543-2', 'BCI', 'Corriente',
+         '456', 10000, 'Aprobada', 'App', 'A2', None],
+    ]
+    return crear_archivo('tef.xlsx', 11, cabecera, filas)
+
+
+def archivo_generico():
+    libro = openpyxl.Workbook()
+    hoja = libro.active
+    hoja.append(['Fecha', 'Descripción', 'Monto', 'Tipo'])
+    hoja.append([datetime(2024, 2, 1), 'Farmacia', 5000, 'Gasto'])
+    hoja.append([datetime(2024, 2, 2), 'Transferencia', 70000, 'Ingreso'])
+    ruta = os.path.join(tempfile.mkdtemp(), 'generico.xlsx')
+    libro.save(ruta)
+    return ruta
+
+
+def contar_lecturas(funcion, *args):
+    """Ejecuta la función contando las llamadas a pd.read_excel"""
+    lecturas = []
+    read_excel_original = pd.read_excel
+
+    def read_excel_contando(*a, **k):
+        lecturas.append(k)
+        return read_excel_original(*a, **k)
+
+    leer_excel.pd.read_excel = read_excel_contando
+    try:
+        resultado = funcion(*args)
+    finally:
+        leer_excel.pd.read_excel = read_excel_original
+    return resultado, lecturas
+
+
+def test_deteccion_sobre_grilla():
+    for ruta, formato in ((archivo_cartola(), 'cartola'), (archivo_tef(), 'tef'), (archivo_generico(), 'generico')):
+        assert detectar_formato_archivo(ruta) == formato
+        assert detectar_formato_grilla(leer_grilla_excel(ruta)) == formato
+
+
+def test_dataframe_igual_a_read_excel():
+    for ruta, fila_header in ((archivo_cartola(), 24), (archivo_tef(), 11), (archivo_generico(), 0)):
+        grilla = leer_grilla_excel(ruta)
+        pd.testing.assert_frame_equal(dataframe_desde_grilla(grilla, fila_header), pd.read_excel(ruta, header=fila_header))
+
+    ruta = archivo_cartola()
+    pd.testing.assert_frame_equal(cargar_y_limpiar_cartola(ruta, grilla=leer_grilla_excel(ruta)), cargar_y_limpiar_cartola(ruta))
+    ruta = archivo_tef()
+    pd.testing.assert_frame_equal(cargar_y_limpiar_tef_cartola(ruta, grilla=leer_grilla_excel(ruta)), cargar_y_limpiar_tef_cartola(ruta))
+
+
+def test_una_sola_lectura():
+    ruta = archivo_cartola()
+    df, lecturas = contar_lecturas(leer_archivo_excel, ruta)
+    assert len(lecturas) == 1
+    pd.testing.assert_frame_equal(df, cargar_y_limpiar_cartola(ruta))
+
+    ruta = archivo_tef()
+    df, lecturas = contar_lecturas(leer_archivo_excel, ruta)
+    assert len(lecturas) == 1
+    pd.testing.assert_frame_equal(df, cargar_y_limpiar_tef_cartola(ruta))
+
+    df, lecturas = contar_lecturas(leer_archivo_excel, archivo_generico())
+    assert len(lecturas) == 1
+    assert df['detalle'].tolist() == ['Farmacia', 'Transferencia']
+
+    # La detección por archivo solo pide las primeras filas
+    _, lecturas = contar_lecturas(detectar_formato_archivo, ruta)
+    assert lecturas[0]['nrows'] == leer_excel.FILAS_DETECCION
+
+
+if __name__ == "__main__":
+    test_deteccion_sobre_grilla()
+    test_dataframe_igual_a_read_excel()
+    test_una_sola_lectura()
+    print("✅ Lectura única de archivos Excel funcionando")
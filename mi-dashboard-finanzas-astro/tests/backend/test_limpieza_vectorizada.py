@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Verifica los pasos vectorizados de limpieza de cartolas y TEF:
+1. Monto y tipo desde cargos/abonos igual que el cálculo fila a fila
+2. Detalle de TEF igual que el armado fila a fila, incluso con columnas faltantes
+3. Tipo de movimiento TEF (patrones de ingreso) igual que la búsqueda fila a fila
+4. Los pasos vectorizados no recorren las filas (apply, map, iterrows ni itertuples)
+"""
+
+import os
+import random
+import sys
+from contextlib import contextmanager
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.leer_excel import (
+    PATRONES_INGRESO_TEF, _crear_detalle_tef, _limpiar_cartola, _limpiar_tef, _monto_y_tipo_cartola,
+    _tipo_movimiento_tef
+)
+
+# Referencias: los cálculos fila a fila con df.apply(axis=1) que reemplazan los pasos vectorizados
+
+def procesar_movimiento(row):
+    if row['cargo'] > 0:
+        return row['cargo'], 'Gasto'
+    elif row['abono'] > 0:
+        return row['abono'], 'Ingreso'
+    else:
+        return 0.0, 'Gasto'
+
+
+def crear_detalle(row):
+    partes = []
+    if pd.notna(row.get('nombre_destino')) and str(row.get('nombre_destino')).strip() not in ['nan', '']:
+        partes.append(str(row.get('nombre_destino')).strip())
+    if pd.notna(row.get('comentario')) and str(row.get('comentario')).strip() not in ['nan', '']:
+        partes.append(str(row.get('comentario')).strip())
+    if pd.notna(row.get('banco_destino')) and str(row.get('banco_destino')).strip() not in ['nan', '']:
+        partes.append(f"({str(row.get('banco_destino')).strip()})")
+    detalle = " - ".join(partes) if partes else "Transferencia bancaria"
+    return detalle.upper()
+
+
+def determinar_tipo_movimiento(row):
+    texto_completo = f"{str(row.get('origen', '')).upper()} {str(row.get('nombre_destino', '')).upper()} " \
+                     f"{str(row.get('comentario', '')).upper()}"
+    for patron in PATRONES_INGRESO_TEF:
+        if patron in texto_completo:
+            return 'Ingreso'
+    return 'Gasto'
+
+
+def movimientos_cartola(cantidad, semilla=6):
+    azar = random.Random(semilla)
+    cargos = [azar.choice([0.0, 0.0, -5.0, float(azar.randint(1000, 90000))]) for _ in range(cantidad)]
+    abonos = [azar.choice([0.0, float(azar.randint(1000, 900000))]) for _ in range(cantidad)]
+    return pd.DataFrame({'cargo': cargos, 'abono': abonos})
+
+
+def transferencias(cantidad, semilla=7):
+    azar = random.Random(semilla)
+    return pd.DataFrame({
+        'origen': [azar.choice(['Cuenta Corriente', 'Cuenta Vista', 'nan']) for _ in range(cantidad)],
+        'nombre_destino': [azar.choice(['Juan Perez', 'Maria Soto', '', 'nan', 'Empresa Venta SpA']) for _ in range(cantidad)],
+        'comentario': [azar.choice(['arriendo', 'sueldo marzo', 'pago recibido', '', 'nan', ' devolución ', 'abono'])
+                       for _ in range(cantidad)],
+        'banco_destino': [azar.choice(['Banco Estado', 'BCI', '', 'nan']) for _ in range(cantidad)],
+    })
+
+
+def test_monto_y_tipo_cartola():
+    df = movimientos_cartola(5000)
+    esperado = df.apply(lambda row: pd.Series(procesar_movimiento(row)), axis=1)
+    monto, tipo = _monto_y_tipo_cartola(df['cargo'], df['abono'])
+    assert list(monto) == esperado[0].tolist()
+    assert list(tipo) == esperado[1].tolist()
+
+
+def test_detalle_tef():
+    df = transferencias(5000)
+    assert _crear_detalle_tef(df).tolist() == df.apply(crear_detalle, axis=1).tolist()
+
+    # Columnas faltantes o con nulos
+    parcial = pd.DataFrame({'nombre_destino': ['Ana', None, '  '], 'comentario': [None, 'luz', '']})
+    assert _crear_detalle_tef(parcial).tolist() == parcial.apply(crear_detalle, axis=1).tolist()
+    assert _crear_detalle_tef(parcial).tolist() == ['ANA', 'LUZ', 'TRANSFERENCIA BANCARIA']
+
+
+def test_tipo_movimiento_tef():
+    df = transferencias(5000)
+    assert list(_tipo_movimiento_tef(df)) == df.apply(determinar_tipo_movimiento, axis=1).tolist()
+
+    solo_comentario = pd.DataFrame({'comentario': ['Reembolso seguro', 'cena']})
+    assert list(_tipo_movimiento_tef(solo_comentario)) == ['Ingreso', 'Gasto']
+
+
+@contextmanager
+def sin_recorrido_fila_a_fila():
+    """Hace fallar los recorridos por fila de pandas mientras está activo"""
+    def recorrido(*args, **kwargs):
+        raise AssertionError("recorrido fila a fila")
+
+    with mock.patch.object(pd.DataFrame, 'apply', recorrido), mock.patch.object(pd.Series, 'apply', recorrido), \
+            mock.patch.object(pd.Series, 'map', recorrido), mock.patch.object(pd.DataFrame, 'iterrows', recorrido), \
+            mock.patch.object(pd.DataFrame, 'itertuples', recorrido):
+        yield
+
+
+def test_sin_recorrido_fila_a_fila():
+    cartola = movimientos_cartola(1000)
+    tef = transferencias(1000)
+    with sin_recorrido_fila_a_fila():
+        monto, tipo = _monto_y_tipo_cartola(cartola['cargo'], cartola['abono'])
+        detalle = _crear_detalle_tef(tef)
+        tipo_tef = _tipo_movimiento_tef(tef)
+    assert len(monto) == len(tipo) == len(detalle) == len(tipo_tef) == 1000
+
+
+def test_limpieza_completa():
+    cartola = pd.DataFrame({
+        'Fecha': ['02/01/2024', '03/01/2024', '04/01/2024'], 'Unnamed: 1': [None] * 3,
+        'Descripción': ['Compra Jumbo', 'Sueldo', 'Ajuste'], 'Canal o Sucursal': ['POS', 'Sucursal', 'Internet'],
+        'Cargos (PESOS)': [15990, None, None], 'Abonos (PESOS)': [None, 850000, None], 'Saldo (PESOS)': [1, 2, 3],
+    })
+    limpia = _limpiar_cartola(cartola)
+    assert limpia['tipo'].tolist() == ['Gasto', 'Ingreso']
+    assert limpia['monto'].tolist() == [15990.0, 850000.0]
+
+    tef = pd.DataFrame({
+        'Fecha': ['2024-01-02', '2024-01-03'], 'Origen': ['Cuenta Corriente'] * 2,
+        'Nombre Destino': ['Juan Perez', 'Empresa'], 'Banco Destino': ['BCI', ''], 'Monto': [1000, 2000],
+        'Comentario': ['arriendo', 'Devolucion compra'],
+    })
+    limpia = _limpiar_tef(tef)
+    assert limpia['detalle'].tolist() == ['JUAN PEREZ - ARRIENDO - (BCI)', 'EMPRESA - DEVOLUCION COMPRA']
+    assert limpia['tipo'].tolist() == ['Gasto', 'Ingreso']
+
+
+if __name__ == "__main__":
+    test_monto_y_tipo_cartola()
+    test_detalle_tef()
+    test_tipo_movimiento_tef()
+    test_sin_recorrido_fila_a_fila()
+    test_limpieza_completa()
+    print("✅ Limpieza vectorizada de cartolas y TEF funcionando")
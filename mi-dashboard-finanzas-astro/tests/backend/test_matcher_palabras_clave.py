@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Verifica que el autómata de palabras clave entregue exactamente la misma
+categoría que el recorrido original categoría por categoría.
+"""
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.categorizar import (
+    definir_categorias, compilar_reglas, categorizar_transaccion, MatcherPalabrasClave,
+    registro_reglas
+)
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def categorizar_por_recorrido(categorias, *textos):
+    """Implementación de referencia: bucles anidados sobre categorías y palabras"""
+    for texto in textos:
+        for categoria, palabras_clave in categorias.items():
+            for palabra in palabras_clave:
+                if palabra in texto:
+                    return categoria
+    return None
+
+
+def generar_textos(categorias, cantidad=2000, semilla=7):
+    """Genera textos que mezclan palabras clave reales con ruido"""
+    random.seed(semilla)
+    palabras = [p for lista in categorias.values() for p in lista]
+    ruido = ['COMPRA', 'NACIONAL', '1234', 'LAS CONDES', 'SANTIAGO', 'XX', 'S.A.', 'SPA']
+    textos = []
+    for _ in range(cantidad):
+        partes = random.sample(ruido, 2) + random.sample(palabras, random.randint(0, 3))
+        random.shuffle(partes)
+        textos.append(' '.join(partes))
+    return textos
+
+
+def test_misma_categoria_que_recorrido():
+    categorias = definir_categorias()
+    reglas = compilar_reglas(categorias)
+
+    for texto in generar_textos(categorias):
+        esperado = categorizar_por_recorrido(categorias, texto)
+        assert reglas.categoria_por_palabras(texto) == esperado, texto
+
+
+def test_prioridad_y_solapamientos():
+    matcher = MatcherPalabrasClave({
+        'A': ['UBER EATS', 'RENTA FIJA'],
+        'B': ['UBER', 'RENTA', 'AFP'],
+        'C': ['AFP', 'EATS'],
+    })
+
+    def categoria(texto):
+        indice, _ = matcher.buscar(texto)
+        return matcher.patrones[indice][0] if indice is not None else None
+
+    assert categoria('PAGO UBER EATS') == 'A'
+    assert categoria('PAGO UBER') == 'B'
+    assert categoria('EATS Y UBER') == 'B'
+    assert categoria('COTIZACION AFP') == 'B'
+    assert categoria('RENTA FIJ') == 'B'
+    assert categoria('NADA') is None
+
+
+def test_orden_de_campos():
+    # El detalle manda sobre el nombre del destino y este sobre el comentario
+    assert categorizar_transaccion('PAGO COPEC', 'SUPERMERCADO', 'NETFLIX') == 'Gasto - Transporte'
+    assert categorizar_transaccion('XYZ', 'SUPERMERCADO', 'NETFLIX') == 'Gasto - Alimentos'
+    assert categorizar_transaccion('XYZ', '', 'NETFLIX') == 'Gasto - Entretenimiento'
+    assert categorizar_transaccion('XYZ', '', '') == 'Sin categorizar'
+
+
+if __name__ == "__main__":
+    test_misma_categoria_que_recorrido()
+    test_prioridad_y_solapamientos()
+    test_orden_de_campos()
+    print("✅ Matcher de palabras clave equivalente al recorrido original")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Verifica la clave de comercio (merchant_key):
+1. Quita números de sucursal, fechas y terminales, y la versión vectorizada coincide
+2. La sucursal y lo que la sigue (comuna, terminal) no cambian la clave de comercio
+3. Categorizar por claves únicas da lo mismo que buscar en el detalle original
+   y una palabra clave numérica solo coincide con esos dígitos
+4. El script de migración agrega las columnas, el índice y las claves de comercio
+   de las bases antiguas una sola vez; el constructor no migra
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'setup'))
+
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import (
+    aplicar_categorizacion, categorizar_transaccion, compilar_reglas, definir_categorias, registro_reglas
+)
+from utils.comercios import normalizar_comercio, normalizar_comercios, normalizar_texto_comercio
+from utils.indice_palabras import IndicePalabrasTransacciones
+from migrate_database import MIGRACIONES, aplicar_migraciones, migrate_database
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def generar_detalles(cantidad, semilla=13):
+    """Detalles de cartola con comercios repetidos y números variables"""
+    azar = random.Random(semilla)
+    comercios = ['COMPRA JUMBO', 'COMPRA LIDER EXPRESS', 'UBER*TRIP', 'PAGO ENEL', 'XYZ SERVICIOS',
+                 'COMPRA SANTA ISABEL', 'TRANSF A JUAN PEREZ', 'COPEC', 'FARMACIA CRUZ VERDE', 'NETFLIX.COM']
+    detalles = []
+    for _ in range(cantidad):
+        detalle = f"{azar.choice(comercios)} {azar.randint(1, 999)}"
+        if azar.random() < 0.5:
+            detalle += f" {azar.randint(1, 28):02d}/{azar.randint(1, 12):02d} T{azar.randint(1000, 9999)}"
+        detalles.append(detalle)
+    return detalles
+
+
+def test_normalizacion():
+    assert normalizar_texto_comercio('Compra  JUMBO 123 las condes') == 'COMPRA JUMBO 123 LAS CONDES'
+    assert normalizar_comercio('Compra  JUMBO 123 las condes') == 'COMPRA JUMBO'
+    assert normalizar_comercio('COMPRA JUMBO 456 15/03/2024 10:45') == 'COMPRA JUMBO'
+    assert normalizar_comercio('UBER*TRIP123 ****4521') == 'UBER*TRIP#'
+
+    detalles = generar_detalles(500)
+    assert normalizar_comercios(pd.Series(detalles)).tolist() == [normalizar_comercio(d) for d in detalles]
+
+
+def test_sucursal_no_cambia_la_clave():
+    assert normalizar_comercio('COMPRA JUMBO 123 LAS CONDES') == normalizar_comercio('COMPRA JUMBO 456') == 'COMPRA JUMBO'
+    assert normalizar_comercio('COMPRA LIDER EXPRESS 12 T4521 MAIPU') == 'COMPRA LIDER EXPRESS'
+
+    # Los números detrás de palabras de operación no cortan: el comercio viene después
+    assert normalizar_comercio('COMPRA 123456 JUMBO') == normalizar_comercio('COMPRA 987 JUMBO 12 NUNOA') == 'COMPRA # JUMBO'
+    assert normalizar_comercio('CUOTA 3/12 FALABELLA') == 'CUOTA # FALABELLA'
+    assert normalizar_comercio('PAGO ENEL') == 'PAGO ENEL'
+
+    # Las reglas se siguen buscando en todo el detalle, también detrás de la sucursal
+    assert categorizar_transaccion('PAGO EN LINEA 123 NETFLIX') == 'Gasto - Entretenimiento'
+
+
+def test_menos_claves_y_mismo_resultado():
+    detalles = generar_detalles(5000)
+    claves = normalizar_comercios(pd.Series(detalles))
+    assert claves.nunique() * 10 <= len(set(detalles))
+
+    reglas = compilar_reglas(definir_categorias())
+    df = aplicar_categorizacion(pd.DataFrame({'detalle': detalles}), reglas=reglas)
+    esperado = []
+    for detalle in detalles:
+        if reglas.detector_nombres.buscar(detalle.upper()) is not None:
+            esperado.append('Transferencias')
+        else:
+            esperado.append(reglas.categoria_por_palabras(detalle.upper()) or 'Sin categorizar')
+    assert df['categoria'].tolist() == esperado
+
+
+def test_palabra_clave_numerica():
+    categorias = definir_categorias()
+    categorias['Gasto - Arriendo Depto'] = ['76123456']
+    reglas = compilar_reglas(categorias, [('Gasto - Tarjeta Empresa', ['4521'], {'monto_min': 1.0})])
+
+    detalles = ['COMPRA XYZQ 123', 'TRANSF 76123456 INMOBILIARIA', 'PAGO XYZQ 4521', 'PAGO XYZQ 9999']
+    assert [categorizar_transaccion(d, monto=1000, reglas=reglas) for d in detalles] == [
+        'Sin categorizar', 'Gasto - Arriendo Depto', 'Gasto - Tarjeta Empresa', 'Sin categorizar'
+    ]
+    df = aplicar_categorizacion(pd.DataFrame({'detalle': detalles, 'monto': [1000.0] * 4}), reglas=reglas)
+    assert df['categoria'].tolist() == [
+        'Sin categorizar', 'Gasto - Arriendo Depto', 'Gasto - Tarjeta Empresa', 'Sin categorizar'
+    ]
+
+    indice = IndicePalabrasTransacciones()
+    indice.agregar(range(len(detalles)), detalles)
+    assert indice.buscar('76123456') == {1}
+
+
+def test_migracion_base_antigua():
+    carpeta = tempfile.mkdtemp()
+    db_path = os.path.join(carpeta, 'finanzas_test.db')
+    conexion = sqlite3.connect(db_path)
+    conexion.execute("""
+        CREATE TABLE transacciones (
+            id INTEGER PRIMARY KEY, fecha DATE NOT NULL, detalle VARCHAR(500) NOT NULL,
+            monto FLOAT NOT NULL, tipo VARCHAR(50) NOT NULL, categoria VARCHAR(100) NOT NULL,
+            año INTEGER NOT NULL, mes INTEGER NOT NULL, dia INTEGER NOT NULL, semana INTEGER NOT NULL,
+            tipo_regla VARCHAR(100), created_at DATETIME, fecha_modificacion DATETIME
+        )
+    """)
+    conexion.execute("""
+        CREATE TABLE categorias_custom (
+            id INTEGER PRIMARY KEY, nombre VARCHAR(100) NOT NULL UNIQUE, palabras_clave VARCHAR(2000) NOT NULL,
+            descripcion VARCHAR(500), activa INTEGER, created_at DATETIME, updated_at DATETIME
+        )
+    """)
+    conexion.execute("""
+        CREATE TABLE estadisticas_reglas (
+            id INTEGER PRIMARY KEY, categoria VARCHAR(100) NOT NULL, palabra_clave VARCHAR(200) NOT NULL,
+            aciertos INTEGER NOT NULL, evaluaciones INTEGER NOT NULL, actualizado DATETIME,
+            UNIQUE (categoria, palabra_clave)
+        )
+    """)
+    conexion.executemany("""
+        INSERT INTO transacciones (fecha, detalle, monto, tipo, categoria, año, mes, dia, semana)
+        VALUES (?, ?, 1000, 'Gasto', 'Gasto - Alimentos', 2024, 1, 1, 1)
+    """, [('2024-01-01', 'COMPRA JUMBO 123'), ('2024-01-02', 'COMPRA JUMBO 456 LAS CONDES')])
+    conexion.commit()
+    conexion.close()
+
+    def columnas(tabla):
+        return {fila[1] for fila in sqlite3.connect(db_path).execute(f"PRAGMA table_info({tabla})")}
+
+    # El constructor no altera tablas existentes: la migración es solo el script
+    DatabaseManager(db_path=db_path).cerrar_conexion()
+    assert 'merchant_key' not in columnas('transacciones')
+
+    assert migrate_database(db_path)
+    assert {'merchant_key', 'palabra_regla', 'campo_regla', 'posicion_regla', 'canal'} <= columnas('transacciones')
+    assert {'condiciones', 'patrones'} <= columnas('categorias_custom')
+    assert 'corrida' in columnas('estadisticas_reglas')
+    indices = [fila[1] for fila in sqlite3.connect(db_path).execute("PRAGMA index_list(transacciones)")]
+    assert 'ix_transacciones_merchant_key' in indices
+
+    db = DatabaseManager(db_path=db_path)
+    assert {t.merchant_key for t in db.session.query(Transaccion).all()} == {'COMPRA JUMBO'}
+    db.cerrar_conexion()
+
+    # Cada migración queda registrada y no se vuelve a aplicar
+    conexion = sqlite3.connect(db_path)
+    versiones = [fila[0] for fila in conexion.execute("SELECT version FROM migraciones_esquema ORDER BY version")]
+    assert versiones == [version for version, _, _ in MIGRACIONES]
+    assert aplicar_migraciones(conexion) == []
+    conexion.close()
+
+
+if __name__ == "__main__":
+    test_normalizacion()
+    test_sucursal_no_cambia_la_clave()
+    test_menos_claves_y_mismo_resultado()
+    test_palabra_clave_numerica()
+    test_migracion_base_antigua()
+    print("✅ Clave de comercio funcionando")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Verifica la partición de reglas por tipo de movimiento:
+1. Un gasto solo se evalúa contra reglas de gasto y neutrales (y un ingreso al revés)
+2. Dentro de la partición se respeta el orden de declaración original
+3. Por claves únicas y fila por fila se obtiene lo mismo
+4. La API de reglas expone la partición
+"""
+
+import os
+import random
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.categorizar import (
+    aplicar_categorizacion, categorizar_transaccion, compilar_reglas, definir_categorias,
+    obtener_reglas_categorizacion, particion_categoria, registro_reglas
+)
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+def categoria_recorrido_restringido(texto, categorias, permitidas):
+    """Recorrido original categoría por categoría, solo con las particiones permitidas"""
+    for categoria, palabras in categorias.items():
+        if particion_categoria(categoria) not in permitidas:
+            continue
+        for palabra in palabras:
+            if palabra in texto:
+                return categoria
+    return None
+
+
+def test_gasto_no_evalua_reglas_de_ingreso():
+    assert categorizar_transaccion('PAGO SUELDO EMPRESA') == 'Ingreso - Sueldos'
+    assert categorizar_transaccion('PAGO SUELDO EMPRESA', tipo='Ingreso') == 'Ingreso - Sueldos'
+    assert categorizar_transaccion('PAGO SUELDO EMPRESA', tipo='Gasto') != 'Ingreso - Sueldos'
+    assert categorizar_transaccion('COMPRA UBER', tipo='Ingreso') != 'Gasto - Transporte'
+
+
+def test_orden_dentro_de_la_particion():
+    categorias = definir_categorias()
+    reglas = compilar_reglas(categorias)
+    vocabulario = [p for palabras in categorias.values() for p in palabras]
+    azar = random.Random(17)
+
+    assert len(reglas.matcher_para('gasto').patrones) < len(reglas.matcher.patrones)
+    for _ in range(500):
+        texto = ' '.join(azar.choice(vocabulario) for _ in range(azar.randint(1, 3)))
+        assert reglas.categoria_por_palabras(texto, particion='gasto') == \
+            categoria_recorrido_restringido(texto, categorias, ('gasto', 'neutral'))
+        assert reglas.categoria_por_palabras(texto, particion='ingreso') == \
+            categoria_recorrido_restringido(texto, categorias, ('ingreso', 'neutral'))
+
+
+def test_claves_unicas_igual_a_fila_por_fila():
+    df = pd.DataFrame({
+        'detalle': ['PAGO SUELDO EMPRESA', 'PAGO SUELDO EMPRESA', 'COMPRA UBER', 'COMPRA UBER', 'XYZ'] * 20,
+        'tipo': ['Gasto', 'Ingreso', 'Gasto', None, 'Ingreso'] * 20,
+    })
+    por_filas = aplicar_categorizacion(df.copy(), por_claves_unicas=False)
+    por_claves = aplicar_categorizacion(df.copy())
+    assert por_filas['categoria'].tolist() == por_claves['categoria'].tolist()
+    assert por_claves['categoria'].tolist()[:4] == [
+        categorizar_transaccion('PAGO SUELDO EMPRESA', tipo='Gasto'), 'Ingreso - Sueldos',
+        'Gasto - Transporte', 'Gasto - Transporte'
+    ]
+
+
+def test_api_reglas_expone_particion():
+    reglas = {regla['categoria']: regla for regla in obtener_reglas_categorizacion()}
+    assert reglas['Ingreso - Sueldos']['particion'] == 'ingreso'
+    assert reglas['Gasto - Alimentos']['aplica_a_tipos'] == ['Gasto']
+    assert reglas['Transferencias']['aplica_a_tipos'] == ['Gasto', 'Ingreso']
+
+
+if __name__ == "__main__":
+    test_gasto_no_evalua_reglas_de_ingreso()
+    test_orden_dentro_de_la_particion()
+    test_claves_unicas_igual_a_fila_por_fila()
+    test_api_reglas_expone_particion()
+    print("✅ Partición de reglas por tipo funcionando")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Verifica la recategorización incremental al editar categorías personalizadas:
+1. El índice de palabras encuentra las mismas filas que un recorrido completo
+2. Solo se recalculan las transacciones que contienen palabras agregadas o quitadas
+3. Las sobrescrituras manuales se respetan
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import aplicar_categorizacion, registro_reglas
+from utils.fechas import agregar_columnas_tiempo
+from utils.indice_palabras import IndicePalabrasTransacciones
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+DETALLES = [
+    'VETERINARIO LOS LEONES',
+    'PETSHOP PROVIDENCIA',
+    'VETERINARIO CENTRAL',
+    'COMPRA UBER',
+    'XYZ SERVICIOS',
+]
+
+
+def crear_db_con_transacciones():
+    carpeta = tempfile.mkdtemp()
+    db = DatabaseManager(db_path=os.path.join(carpeta, 'finanzas_test.db'))
+
+    df = pd.DataFrame({
+        'fecha': pd.to_datetime(['2024-01-0%d' % (i + 1) for i in range(len(DETALLES))]),
+        'detalle': DETALLES,
+        'monto': [1000.0 * (i + 1) for i in range(len(DETALLES))],
+        'tipo': ['Gasto'] * len(DETALLES),
+    })
+    df = agregar_columnas_tiempo(aplicar_categorizacion(df))
+    db.guardar_dataframe(df)
+    return db
+
+
+def categorias_por_detalle(db):
+    return {t.detalle: (t.categoria, t.tipo_regla) for t in db.session.query(Transaccion).all()}
+
+
+def test_indice_igual_a_recorrido():
+    indice = IndicePalabrasTransacciones()
+    textos = DETALLES * 3
+    indice.agregar(range(len(textos)), textos)
+
+    for palabra in ['VET', 'LEONES', 'UBER', 'ER', 'A', 'NO EXISTE', 'PETSHOP PROV']:
+        esperado = {i for i, texto in enumerate(textos) if palabra in texto}
+        assert indice.buscar(palabra) == esperado, palabra
+
+
+def test_crear_y_editar_categoria_recalcula_solo_afectadas():
+    db = crear_db_con_transacciones()
+
+    # Sobrescritura manual que no debe tocarse
+    manual = db.session.query(Transaccion).filter(Transaccion.detalle == 'VETERINARIO CENTRAL').first()
+    db.actualizar_categoria_transaccion(manual.id, 'Gasto - Salud')
+
+    categoria = db.crear_categoria_custom('Gasto - Mascotas', ['VETERINARIO'])
+    assert categoria['recategorizacion'] == {'transacciones_afectadas': 2, 'transacciones_actualizadas': 1}
+
+    resultado = categorias_por_detalle(db)
+    assert resultado['VETERINARIO LOS LEONES'] == ('Gasto - Mascotas', 'mapeo_por_palabra_clave')
+    assert resultado['VETERINARIO CENTRAL'] == ('Gasto - Salud', 'sobrescritura_manual')
+    assert resultado['PETSHOP PROVIDENCIA'][0] == 'Sin categorizar'
+
+    # Agregar PETSHOP solo afecta a esa fila
+    categoria = db.actualizar_categoria_custom(categoria['id'], palabras_clave=['VETERINARIO', 'PETSHOP'])
+    assert categoria['recategorizacion'] == {'transacciones_afectadas': 1, 'transacciones_actualizadas': 1}
+    assert categorias_por_detalle(db)['PETSHOP PROVIDENCIA'][0] == 'Gasto - Mascotas'
+
+    # Eliminar la categoría devuelve las filas a las reglas predefinidas
+    db.eliminar_categoria_custom(categoria['id'])
+    resultado = categorias_por_detalle(db)
+    assert resultado['VETERINARIO LOS LEONES'][0] == 'Sin categorizar'
+    assert resultado['PETSHOP PROVIDENCIA'][0] == 'Sin categorizar'
+    assert resultado['VETERINARIO CENTRAL'] == ('Gasto - Salud', 'sobrescritura_manual')
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_indice_igual_a_recorrido()
+    test_crear_y_editar_categoria_recalcula_solo_afectadas()
+    print("✅ Recategorización incremental funcionando")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Verifica el registro de reglas del proceso:
+1. Las categorías personalizadas se cargan una sola vez
+2. Crear, editar o eliminar una categoría refresca la instantánea
+3. El categorizador aplica las reglas personalizadas
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager
+from utils.categorizar import registro_reglas, categorizar_transaccion
+
+
+def test_carga_una_vez_hasta_invalidar():
+    llamadas = []
+
+    def origen():
+        llamadas.append(1)
+        return [{'nombre_categoria': 'Gasto - Mascotas', 'palabras_clave': ['veterinario']}]
+
+    registro_reglas.configurar_origen(origen)
+    primera = registro_reglas.obtener()
+    assert registro_reglas.obtener() is primera
+    assert categorizar_transaccion('CLINICA VETERINARIO') == 'Gasto - Salud'
+    assert categorizar_transaccion('PAGO VETERINARIO') == 'Gasto - Mascotas'
+    assert len(llamadas) == 1
+
+    registro_reglas.invalidar()
+    registro_reglas.obtener()
+    assert len(llamadas) == 2
+    registro_reglas.configurar_origen(lambda: [])
+
+
+def test_cambios_en_bd_refrescan_reglas():
+    carpeta = tempfile.mkdtemp()
+    db = DatabaseManager(db_path=os.path.join(carpeta, 'finanzas_test.db'))
+    registro_reglas.configurar_origen(db.obtener_categorias_custom)
+
+    assert categorizar_transaccion('PETSHOP CENTRAL') == 'Sin categorizar'
+
+    categoria = db.crear_categoria_custom('Gasto - Mascotas', ['PETSHOP'])
+    assert categorizar_transaccion('PETSHOP CENTRAL') == 'Gasto - Mascotas'
+
+    db.actualizar_categoria_custom(categoria['id'], nombre_categoria='Gasto - Animales')
+    assert categorizar_transaccion('PETSHOP CENTRAL') == 'Gasto - Animales'
+
+    db.eliminar_categoria_custom(categoria['id'])
+    assert categorizar_transaccion('PETSHOP CENTRAL') == 'Sin categorizar'
+
+    registro_reglas.configurar_origen(lambda: [])
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_carga_una_vez_hasta_invalidar()
+    test_cambios_en_bd_refrescan_reglas()
+    print("✅ Registro de reglas funcionando")
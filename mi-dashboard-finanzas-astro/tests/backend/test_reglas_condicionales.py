@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Verifica las reglas condicionales (palabras clave + monto, día, tipo y canal):
+1. Las condiciones se validan y normalizan
+2. La tabla de decisión da lo mismo que evaluar regla por regla en cada fila, en lote
+   o con los valores de una sola transacción
+3. "COPEC bajo 5.000 es snack" prevalece sobre la regla de combustible
+4. Las categorías personalizadas con condiciones se guardan y recategorizan
+5. Categorizar una sola transacción aplica las mismas reglas condicionales que el lote
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import (
+    aplicar_categorizacion, categorizar_transaccion, categorizar_transaccion_explicada, compilar_reglas,
+    definir_categorias, particion_categoria, registro_reglas
+)
+from utils.comercios import normalizar_comercio
+from utils.condiciones import normalizar_condiciones
+from utils.fechas import agregar_columnas_tiempo
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+CONDICIONALES = [
+    ('Gasto - Snacks', ['COPEC', 'PRONTO'], {'monto_max': 5000.0}),
+    ('Gasto - Arriendo', ['INMOBILIARIA', 'ARRIENDO'], {'dias_mes': [1, 2], 'tipos': ['Gasto']}),
+    ('Gasto - Fin de semana', ['COPEC', 'BAR'], {'dias_semana': [5, 6], 'prioridad': 1}),
+    ('Ingreso - Ventas web', ['VENTA'], {'canales': ['INTERNET'], 'monto_min': 1000.0}),
+]
+
+
+def evaluar_fila_por_fila(fila):
+    """Referencia: revisa cada regla en cada fila y se queda con la de mayor prioridad"""
+    textos = [normalizar_comercio(fila['detalle']), str(fila['nombre_destino']).upper().strip()]
+    fecha = pd.Timestamp(fila['fecha'])
+    particion = {'Gasto': 'gasto', 'Ingreso': 'ingreso'}.get(fila['tipo'], '')
+    mejor = None
+    for orden, (categoria, palabras, condiciones) in enumerate(CONDICIONALES):
+        if not any(normalizar_comercio(p) in texto for p in palabras for texto in textos):
+            continue
+        if not (condiciones.get('monto_min', float('-inf')) <= fila['monto'] <= condiciones.get('monto_max', float('inf'))):
+            continue
+        if 'dias_mes' in condiciones and fecha.day not in condiciones['dias_mes']:
+            continue
+        if 'dias_semana' in condiciones and fecha.weekday() not in condiciones['dias_semana']:
+            continue
+        if 'tipos' in condiciones and fila['tipo'] not in condiciones['tipos']:
+            continue
+        if 'canales' in condiciones and not any(c in str(fila['canal']).upper() for c in condiciones['canales']):
+            continue
+        if particion and particion_categoria(categoria) not in (particion, 'neutral'):
+            continue
+        clave = (condiciones.get('prioridad', 0), -orden)
+        if mejor is None or clave > mejor[0]:
+            mejor = (clave, categoria)
+    return mejor[1] if mejor else None
+
+
+def crear_dataframe(cantidad, semilla=3):
+    azar = random.Random(semilla)
+    comercios = ['COPEC RUTA 5', 'PRONTO COPEC', 'INMOBILIARIA SUR', 'BAR LOS AMIGOS', 'VENTA PRODUCTO', 'XYZ', 'UBER']
+    return pd.DataFrame({
+        'fecha': pd.to_datetime('2024-01-01') + pd.to_timedelta([azar.randint(0, 90) for _ in range(cantidad)], unit='D'),
+        'detalle': [f"{azar.choice(comercios)} {azar.randint(1, 99)}" for _ in range(cantidad)],
+        'nombre_destino': [azar.choice(['', 'ARRIENDO DEPTO', 'JUAN']) for _ in range(cantidad)],
+        'monto': [float(azar.choice([800, 3000, 5000, 5001, 20000])) for _ in range(cantidad)],
+        'tipo': [azar.choice(['Gasto', 'Gasto', 'Ingreso', None]) for _ in range(cantidad)],
+        'canal': [azar.choice(['INTERNET', 'Sucursal Centro', None]) for _ in range(cantidad)],
+    })
+
+
+def test_validacion_condiciones():
+    assert normalizar_condiciones({'dias_mes': [15, 1, 1], 'canales': [' internet ']}) == {
+        'dias_mes': [1, 15], 'canales': ['INTERNET']
+    }
+    assert normalizar_condiciones({'prioridad': 2}) == {}
+    for invalidas in ({'dias_mes': [0]}, {'dias_semana': [7]}, {'tipos': ['Otro']},
+                      {'monto_min': 10, 'monto_max': 5}, {'color': 'rojo'}):
+        try:
+            normalizar_condiciones(invalidas)
+            assert False, invalidas
+        except ValueError:
+            pass
+
+
+def test_tabla_igual_a_fila_por_fila():
+    reglas = compilar_reglas(definir_categorias(), CONDICIONALES)
+    df = crear_dataframe(3000)
+    sin_condicionales = aplicar_categorizacion(df.copy(), reglas=compilar_reglas(definir_categorias()))
+    resultado = aplicar_categorizacion(df.copy(), reglas=reglas)
+
+    for i, fila in df.iterrows():
+        esperado = evaluar_fila_por_fila(fila)
+        if esperado is None:
+            assert resultado.at[i, 'categoria'] == sin_condicionales.at[i, 'categoria']
+            assert resultado.at[i, 'tipo_regla'] == sin_condicionales.at[i, 'tipo_regla']
+        else:
+            assert resultado.at[i, 'categoria'] == esperado, (fila.to_dict(), resultado.loc[i].to_dict())
+            assert resultado.at[i, 'tipo_regla'] == 'regla_condicional'
+            assert resultado.at[i, 'palabra_regla'] is not None
+
+    # El camino fila por fila aplica las mismas reglas condicionales
+    por_filas = aplicar_categorizacion(df.copy(), reglas=reglas, por_claves_unicas=False)
+    assert por_filas['categoria'].tolist() == resultado['categoria'].tolist()
+
+    # La tabla evaluada con los valores de una transacción coincide con la evaluación en lote
+    tabla = reglas.tabla_condicional[1]
+    en_lote = tabla.evaluar(df)
+    for i, fila in enumerate(df.head(300).itertuples()):
+        assert (tabla.evaluar_valores(fila.monto, fila.fecha, fila.tipo, fila.canal) == en_lote[i]).all()
+    assert tabla.evaluar_valores().tolist() == tabla.evaluar(pd.DataFrame(index=[0]))[0].tolist()
+
+
+def test_snack_en_bencinera():
+    reglas = compilar_reglas(definir_categorias(), CONDICIONALES[:1])
+    df = pd.DataFrame({
+        'fecha': pd.to_datetime(['2024-03-04', '2024-03-04']),
+        'detalle': ['COPEC LAS CONDES 123', 'COPEC LAS CONDES 123'],
+        'monto': [3500.0, 42000.0],
+        'tipo': ['Gasto', 'Gasto'],
+    })
+    df = aplicar_categorizacion(df, reglas=reglas)
+    assert df['categoria'].tolist() == ['Gasto - Snacks', 'Gasto - Transporte']
+    assert (df.at[0, 'palabra_regla'], df.at[0, 'campo_regla'], df.at[0, 'posicion_regla']) == ('COPEC', 'detalle', 0)
+
+
+def test_categoria_custom_con_condiciones():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    df = pd.DataFrame({
+        'fecha': pd.to_datetime(['2024-03-04', '2024-03-05']),
+        'detalle': ['COPEC LAS CONDES', 'COPEC RUTA 68'],
+        'monto': [3500.0, 42000.0],
+        'tipo': ['Gasto', 'Gasto'],
+        'canal': ['POS', 'POS'],
+    })
+    db.guardar_dataframe(agregar_columnas_tiempo(aplicar_categorizacion(df)))
+
+    try:
+        db.crear_categoria_custom('Gasto - Snacks', [], condiciones={'monto_max': 5000})
+        assert False, "Se esperaba error por falta de palabras clave"
+    except Exception as e:
+        assert 'palabra clave' in str(e)
+
+    categoria = db.crear_categoria_custom('Gasto - Snacks', ['COPEC'], condiciones={'monto_max': 5000})
+    assert categoria['condiciones'] == {'monto_max': 5000.0}
+    categorias = {t.detalle: t.categoria for t in db.session.query(Transaccion).all()}
+    assert categorias == {'COPEC LAS CONDES': 'Gasto - Snacks', 'COPEC RUTA 68': 'Gasto - Transporte'}
+
+    # Cambiar solo las condiciones también recategoriza
+    db.actualizar_categoria_custom(categoria['id'], condiciones={'monto_max': 50000})
+    categorias = {t.detalle: t.categoria for t in db.session.query(Transaccion).all()}
+    assert set(categorias.values()) == {'Gasto - Snacks'}
+    assert db.obtener_reglas_vigentes().condicionales[0][0] == 'Gasto - Snacks'
+    db.cerrar_conexion()
+
+
+def test_una_transaccion_igual_a_lote():
+    reglas = compilar_reglas(definir_categorias(), CONDICIONALES)
+    df = crear_dataframe(400, semilla=5)
+    resultado = aplicar_categorizacion(df.copy(), reglas=reglas)
+
+    for i, fila in df.iterrows():
+        categoria, tipo_regla, explicacion = categorizar_transaccion_explicada(
+            fila['detalle'], fila['nombre_destino'], '', fila['monto'], reglas=reglas, tipo=fila['tipo'],
+            fecha=fila['fecha'], canal=fila['canal']
+        )
+        esperado = resultado.loc[i]
+        assert (categoria, tipo_regla) == (esperado['categoria'], esperado['tipo_regla']), fila.to_dict()
+        if tipo_regla == 'regla_condicional':
+            assert explicacion == (esperado['palabra_regla'], esperado['campo_regla'], esperado['posicion_regla'])
+
+    assert categorizar_transaccion('COPEC LAS CONDES', monto=3500, reglas=reglas, tipo='Gasto') == 'Gasto - Snacks'
+    assert categorizar_transaccion('COPEC LAS CONDES', monto=42000, reglas=reglas, tipo='Gasto') == 'Gasto - Transporte'
+
+
+if __name__ == "__main__":
+    test_validacion_condiciones()
+    test_tabla_igual_a_fila_por_fila()
+    test_snack_en_bencinera()
+    test_categoria_custom_con_condiciones()
+    test_una_transaccion_igual_a_lote()
+    print("✅ Reglas condicionales funcionando")
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Verifica las reglas de expresiones regulares de las categorías personalizadas:
+1. Los patrones inválidos o patológicos se rechazan al validar
+2. La alternancia única da lo mismo que buscar regla por regla con re.search
+3. La alternancia se compila una vez por reglas y versión (cache LRU)
+4. Las categorías personalizadas con patrones se guardan y recategorizan
+5. Cada texto distinto se recorre una vez por partición y campo, sin importar cuántas reglas haya
+6. Los modificadores globales ((?i), (?x)) se rechazan y una regla guardada inválida no rompe la categorización
+7. Categorizar una sola transacción aplica las mismas expresiones regulares que el lote
+"""
+
+import os
+import random
+import re
+import sys
+import tempfile
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import (
+    ReglasCompiladas, aplicar_categorizacion, categorizar_transaccion, categorizar_transaccion_explicada,
+    compilar_reglas, definir_categorias, particion_categoria, registro_reglas
+)
+from utils.fechas import agregar_columnas_tiempo
+from utils.patrones import AlternanciaPatrones, combinar_patrones, compilar_alternancia, validar_patron
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+EXPRESIONES = [
+    (1, 'Gasto - Tarjeta de crédito', [r'^PAGO\s+TC\s+\d{4}', r'PAGO\s+TARJETA']),
+    (2, 'Ingreso - Devoluciones', [r'DEVOL\w*\s+N?\d+']),
+    (3, 'Gasto - Cuotas', [r'CUOTA\s+\d{1,2}/\d{1,2}']),
+    (4, 'Transferencias', [r'^TEF\s+\d{8,9}-[\dK]\b']),
+]
+
+
+def evaluar_fila_por_fila(fila):
+    """Referencia: busca cada patrón por separado y elige la coincidencia más a la izquierda del primer campo"""
+    particion = {'Gasto': 'gasto', 'Ingreso': 'ingreso'}.get(fila['tipo'], '')
+    for campo in ('detalle', 'nombre_destino'):
+        texto = str(fila[campo]).upper().strip()
+        mejor = None
+        orden = 0
+        for _, categoria, patrones in EXPRESIONES:
+            permitida = not particion or particion_categoria(categoria) in (particion, 'neutral')
+            for patron in patrones:
+                coincidencia = re.search(patron, texto, re.IGNORECASE)
+                if permitida and coincidencia and (mejor is None or (coincidencia.start(), orden) < mejor[0]):
+                    mejor = ((coincidencia.start(), orden), categoria, patron, campo)
+                orden += 1
+        if mejor:
+            return mejor[1:] + (mejor[0][0],)
+    return None
+
+
+def crear_dataframe(cantidad, semilla=5):
+    azar = random.Random(semilla)
+    plantillas = [
+        'PAGO TC {n4} BANCO', 'PAGO  TC  {n4}', 'COMPRA PAGO TC {n4}', 'DEVOLUCION {n} LIDER', 'DEVOL N{n} JUMBO',
+        'CUOTA {c}/12 FALABELLA', 'TEF {rut} JUAN', 'UBER {n}', 'JUMBO {n}', 'COPEC RUTA {n}', 'XYZ {n}',
+    ]
+    return pd.DataFrame({
+        'detalle': [
+            azar.choice(plantillas).format(
+                n4=azar.randint(1000, 9999), n=azar.randint(1, 9999), c=azar.randint(1, 12),
+                rut=f"{azar.randint(5000000, 25000000)}-{azar.choice('0123456789K')}"
+            )
+            for _ in range(cantidad)
+        ],
+        'nombre_destino': [azar.choice(['', '', 'PAGO TARJETA VISA', 'MARIA']) for _ in range(cantidad)],
+        'monto': [float(azar.randint(1000, 90000)) for _ in range(cantidad)],
+        'tipo': [azar.choice(['Gasto', 'Gasto', 'Ingreso', None]) for _ in range(cantidad)],
+    })
+
+
+def test_validacion_patrones():
+    assert validar_patron(r'  ^PAGO\s+TC\s+\d{4} ') == r'^PAGO\s+TC\s+\d{4}'
+    assert validar_patron(r'(\w+\s){3}') == r'(\w+\s){3}'
+    for invalido in ('', '[', 'X' * 500, r'\d*', r'(?P<tarjeta>TC)', r'(A)\1',
+                     r'(A+)+$', r'(\w+\s?)+X', r'(A|AB)*C', r'(.*A){12}'):
+        try:
+            validar_patron(invalido)
+            assert False, invalido
+        except ValueError:
+            pass
+
+
+def test_alternancia_igual_a_regla_por_regla():
+    reglas = compilar_reglas(definir_categorias(), (), EXPRESIONES)
+    df = crear_dataframe(3000)
+    sin_expresiones = aplicar_categorizacion(df.copy(), reglas=compilar_reglas(definir_categorias()))
+    resultado = aplicar_categorizacion(df.copy(), reglas=reglas)
+
+    for i, fila in df.iterrows():
+        esperado = evaluar_fila_por_fila(fila)
+        if esperado is None:
+            assert resultado.at[i, 'categoria'] == sin_expresiones.at[i, 'categoria']
+            assert resultado.at[i, 'tipo_regla'] == sin_expresiones.at[i, 'tipo_regla']
+        else:
+            categoria, patron, campo, posicion = esperado
+            assert resultado.at[i, 'categoria'] == categoria, (fila.to_dict(), resultado.loc[i].to_dict())
+            assert resultado.at[i, 'tipo_regla'] == 'expresion_regular'
+            assert (resultado.at[i, 'palabra_regla'], resultado.at[i, 'campo_regla'],
+                    resultado.at[i, 'posicion_regla']) == (patron, campo, posicion)
+
+    # El camino fila por fila aplica las mismas expresiones
+    por_filas = aplicar_categorizacion(df.copy(), reglas=reglas, por_claves_unicas=False)
+    assert por_filas['categoria'].tolist() == resultado['categoria'].tolist()
+
+
+def test_compilacion_por_id_y_version():
+    compilar_alternancia.cache_clear()
+    for _ in range(2):
+        reglas = ReglasCompiladas(definir_categorias(), (), EXPRESIONES)
+        for particion in (None, 'gasto', 'ingreso'):
+            reglas.alternancia_para(particion)
+    # Una alternancia por partición, reutilizada por las reglas compiladas de nuevo
+    info = compilar_alternancia.cache_info()
+    assert info.misses == 3 and info.hits == 3
+    assert ReglasCompiladas(definir_categorias(), (), EXPRESIONES).alternancia_para(None)[0] is reglas.alternancia_para(None)[0]
+
+    # Editar una regla compila de nuevo la alternancia
+    editadas = [EXPRESIONES[0][:2] + ([r'^PAGO\s+TC'],)] + EXPRESIONES[1:]
+    alternancia, _ = ReglasCompiladas(definir_categorias(), (), editadas).alternancia_para(None)
+    assert compilar_alternancia.cache_info().misses == 4
+    assert alternancia is not reglas.alternancia_para(None)[0]
+
+
+def test_categoria_custom_con_patrones():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    df = pd.DataFrame({
+        'fecha': pd.to_datetime(['2024-03-04', '2024-03-05', '2024-03-06']),
+        'detalle': ['PAGO TC 4455 BANCO', 'PAGO TC XX', 'JUMBO LAS CONDES'],
+        'monto': [150000.0, 2000.0, 42000.0],
+        'tipo': ['Gasto', 'Gasto', 'Gasto'],
+    })
+    db.guardar_dataframe(agregar_columnas_tiempo(aplicar_categorizacion(df)))
+
+    try:
+        db.crear_categoria_custom('Gasto - Tarjeta', [], patrones=[r'(A+)+$'])
+        assert False, "Se esperaba error por patrón patológico"
+    except Exception as e:
+        assert 'cuantificadores anidados' in str(e)
+
+    categoria = db.crear_categoria_custom('Gasto - Tarjeta', [], patrones=[r'^PAGO\s+TC\s+\d{4}'])
+    assert categoria['patrones'] == [r'^PAGO\s+TC\s+\d{4}']
+    transacciones = {t.detalle: t for t in db.session.query(Transaccion).all()}
+    assert transacciones['PAGO TC 4455 BANCO'].categoria == 'Gasto - Tarjeta'
+    assert transacciones['PAGO TC 4455 BANCO'].tipo_regla == 'expresion_regular'
+    assert transacciones['PAGO TC XX'].categoria != 'Gasto - Tarjeta'
+
+    # Cambiar los patrones recategoriza lo que entra y lo que sale
+    db.actualizar_categoria_custom(categoria['id'], patrones=[r'^PAGO\s+TC\s+[A-Z]{2}$'])
+    categorias = {t.detalle: t.categoria for t in db.session.query(Transaccion).all()}
+    assert categorias['PAGO TC XX'] == 'Gasto - Tarjeta'
+    assert categorias['PAGO TC 4455 BANCO'] != 'Gasto - Tarjeta'
+    assert db.obtener_reglas_vigentes().expresiones[0][1] == 'Gasto - Tarjeta'
+
+    # Eliminarla devuelve las filas a las demás reglas
+    db.eliminar_categoria_custom(categoria['id'])
+    categorias = {t.detalle: t.categoria for t in db.session.query(Transaccion).all()}
+    assert 'Gasto - Tarjeta' not in categorias.values()
+    db.cerrar_conexion()
+
+
+def test_un_recorrido_por_texto_distinto():
+    df = pd.concat([crear_dataframe(5000, semilla=11)] * 4, ignore_index=True)
+    particiones = df['tipo'].map({'Gasto': 'gasto', 'Ingreso': 'ingreso'}).fillna('')
+    distintos = sum(
+        len(pd.DataFrame({'particion': particiones, 'texto': df[campo].str.strip()}).drop_duplicates())
+        for campo in ('detalle', 'nombre_destino')
+    )
+
+    def busquedas(expresiones):
+        reglas = compilar_reglas(definir_categorias(), (), expresiones)
+        with mock.patch.object(AlternanciaPatrones, 'buscar', autospec=True,
+                               side_effect=AlternanciaPatrones.buscar) as buscar:
+            aplicar_categorizacion(df.copy(), reglas=reglas)
+        return buscar.call_count
+
+    # Los campos siguientes solo se revisan en las filas sin coincidencia
+    assert 0 < busquedas(EXPRESIONES) <= distintos < len(df)
+    assert busquedas(EXPRESIONES * 3) == busquedas(EXPRESIONES)
+
+
+def test_modificadores_globales():
+    assert validar_patron(r'(?i:pago)\s+tc') == r'(?i:pago)\s+tc'
+    for global_ in (r'(?i)^pago\s+tc', r'(?x) pago \s+ tc', r'(?s)pago.tc'):
+        try:
+            validar_patron(global_)
+            assert False, global_
+        except ValueError as e:
+            assert 'modificadores globales' in str(e)
+
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    try:
+        db.crear_categoria_custom('Gasto - Tarjeta', [], patrones=[r'(?i)^pago\s+tc'])
+        assert False, "Se esperaba error por modificador global"
+    except Exception as e:
+        assert 'modificadores globales' in str(e)
+    db.cerrar_conexion()
+
+    # Una regla ya guardada con un patrón no combinable se omite sin romper las demás
+    guardadas = [(90, 'Gasto - Tarjeta', [r'(?i)^pago\s+tc']), (91, 'Gasto - Cuotas', [r'CUOTA\s+\d+'])]
+    alternancia = AlternanciaPatrones([(id_regla, 'v1', patrones) for id_regla, _, patrones in guardadas])
+    assert alternancia.buscar('PAGO TC 1234') == (None, None, None)
+    assert alternancia.buscar('CUOTA 3') == (1, r'CUOTA\s+\d+', 0)
+    assert combinar_patrones([r'(?x) a', r'CUOTA']).search('CUOTA 3') is not None
+
+    df = pd.DataFrame({'detalle': ['PAGO TC 1234', 'CUOTA 3/12'], 'tipo': ['Gasto', 'Gasto']})
+    resultado = aplicar_categorizacion(df, reglas=compilar_reglas(definir_categorias(), (), guardadas))
+    assert resultado['categoria'].tolist()[1] == 'Gasto - Cuotas'
+
+
+def test_una_transaccion_igual_a_lote():
+    reglas = compilar_reglas(definir_categorias(), (), EXPRESIONES)
+    df = crear_dataframe(400, semilla=9)
+    resultado = aplicar_categorizacion(df.copy(), reglas=reglas)
+
+    for i, fila in df.iterrows():
+        explicada = categorizar_transaccion_explicada(
+            fila['detalle'], fila['nombre_destino'], '', fila['monto'], reglas=reglas, tipo=fila['tipo']
+        )
+        esperado = resultado.loc[i]
+        assert explicada[:2] == (esperado['categoria'], esperado['tipo_regla']), fila.to_dict()
+        if explicada[1] == 'expresion_regular':
+            assert explicada[2] == (esperado['palabra_regla'], esperado['campo_regla'], esperado['posicion_regla'])
+
+    assert categorizar_transaccion('CUOTA 3/12 FALABELLA', reglas=reglas, tipo='Gasto') == 'Gasto - Cuotas'
+
+
+if __name__ == "__main__":
+    test_validacion_patrones()
+    test_alternancia_igual_a_regla_por_regla()
+    test_compilacion_por_id_y_version()
+    test_categoria_custom_con_patrones()
+    test_un_recorrido_por_texto_distinto()
+    test_modificadores_globales()
+    test_una_transaccion_igual_a_lote()
+    print("✅ Reglas de expresiones regulares funcionando")
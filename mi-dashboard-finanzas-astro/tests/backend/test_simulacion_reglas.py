@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Verifica la simulación de cambios de palabras clave (qué pasaría si...):
+1. Los movimientos simulados son los mismos que produce guardar la edición
+2. La simulación no modifica la tabla de transacciones
+3. Se puede simular una categoría nueva y palabras que no afectan a nadie
+4. Una categoría guardada desactualizada no cuenta como cambio y las reglas de
+   expresiones regulares también se evalúan
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.bd import DatabaseManager, Transaccion
+from utils.categorizar import aplicar_categorizacion, registro_reglas
+from utils.fechas import agregar_columnas_tiempo
+
+# Solo reglas predefinidas, sin abrir la base de datos por defecto
+registro_reglas.configurar_origen(lambda: [])
+
+
+DETALLES = [
+    'VETERINARIO LOS LEONES',
+    'PETSHOP PROVIDENCIA 12',
+    'PETSHOP PROVIDENCIA 47',
+    'VETERINARIO CENTRAL',
+    'COMPRA UBER',
+    'XYZ SERVICIOS',
+]
+
+
+def crear_db_con_transacciones():
+    db = DatabaseManager(db_path=os.path.join(tempfile.mkdtemp(), 'finanzas_test.db'))
+    df = pd.DataFrame({
+        'fecha': pd.to_datetime(['2024-01-0%d' % (i + 1) for i in range(len(DETALLES))]),
+        'detalle': DETALLES,
+        'monto': [1000.0 * (i + 1) for i in range(len(DETALLES))],
+        'tipo': ['Gasto'] * len(DETALLES),
+    })
+    db.guardar_dataframe(agregar_columnas_tiempo(aplicar_categorizacion(df)))
+    return db
+
+
+def categorias_por_id(db):
+    return {t.id: (t.categoria, t.tipo_regla) for t in db.session.query(Transaccion).all()}
+
+
+def test_simulacion_igual_a_guardar():
+    db = crear_db_con_transacciones()
+    categoria = db.crear_categoria_custom('Gasto - Mascotas', ['VETERINARIO'])
+    manual = db.session.query(Transaccion).filter(Transaccion.detalle == 'VETERINARIO CENTRAL').first()
+    db.actualizar_categoria_transaccion(manual.id, 'Gasto - Salud')
+
+    antes = categorias_por_id(db)
+    simulacion = db.simular_cambio_palabras('Gasto - Mascotas', agregar=['petshop'], quitar=['VETERINARIO'])
+    assert categorias_por_id(db) == antes
+
+    # Afectadas: las dos de PETSHOP y VETERINARIO LOS LEONES (la manual no se cuenta)
+    assert simulacion['transacciones_afectadas'] == 3
+    assert simulacion['transacciones_que_cambian'] == 3
+
+    db.actualizar_categoria_custom(categoria['id'], palabras_clave=['petshop'])
+    despues = categorias_por_id(db)
+    movidas = {i: (antes[i][0], despues[i][0]) for i in antes if antes[i][0] != despues[i][0]}
+
+    assert {e['id']: (e['categoria_actual'], e['categoria_nueva']) for e in simulacion['ejemplos']} == movidas
+    conteos = {}
+    for desde, hacia in movidas.values():
+        conteos[(desde, hacia)] = conteos.get((desde, hacia), 0) + 1
+    assert {(m['desde'], m['hacia']): m['transacciones'] for m in simulacion['movimientos']} == conteos
+    assert simulacion['movimientos'][0]['transacciones'] == 2
+    db.cerrar_conexion()
+
+
+def test_categoria_nueva_y_sin_afectadas():
+    db = crear_db_con_transacciones()
+
+    simulacion = db.simular_cambio_palabras('Gasto - Servicios Varios', agregar=['XYZ'], max_ejemplos=1)
+    assert simulacion['transacciones_que_cambian'] == 1
+    assert simulacion['movimientos'] == [
+        {'desde': 'Sin categorizar', 'hacia': 'Gasto - Servicios Varios', 'transacciones': 1}
+    ]
+
+    simulacion = db.simular_cambio_palabras('Gasto - Mascotas', agregar=['NO EXISTE'])
+    assert simulacion['transacciones_afectadas'] == 0
+    assert simulacion['movimientos'] == [] and simulacion['ejemplos'] == []
+    db.cerrar_conexion()
+
+
+def test_compara_reglas_vigentes_con_hipoteticas():
+    db = crear_db_con_transacciones()
+
+    # Categoría guardada desactualizada: las reglas vigentes dan Transporte
+    uber = db.session.query(Transaccion).filter(Transaccion.detalle == 'COMPRA UBER').first()
+    uber.categoria = 'Gasto - Otros'
+    db.session.commit()
+
+    # Una categoría nueva va después de Transporte, así que UBER no se mueve
+    simulacion = db.simular_cambio_palabras('Gasto - Apps', agregar=['UBER'])
+    assert simulacion['transacciones_afectadas'] == 1
+    assert simulacion['transacciones_desactualizadas'] == 1
+    assert simulacion['transacciones_que_cambian'] == 0
+    assert simulacion['movimientos'] == [] and simulacion['ejemplos'] == []
+
+    # Una expresión regular prevalece sobre la palabra clave simulada
+    db.crear_categoria_custom('Gasto - Regalos', [], patrones=[r'PETSHOP\s+PROVIDENCIA\s+4\d'])
+    simulacion = db.simular_cambio_palabras('Gasto - Mascotas', agregar=['PETSHOP'])
+    assert simulacion['reglas_regex_evaluadas'] == 1
+    assert simulacion['transacciones_afectadas'] == 2
+    assert [(e['detalle'], e['categoria_actual'], e['categoria_nueva']) for e in simulacion['ejemplos']] == [
+        ('PETSHOP PROVIDENCIA 12', 'Sin categorizar', 'Gasto - Mascotas')
+    ]
+    db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    test_simulacion_igual_a_guardar()
+    test_categoria_nueva_y_sin_afectadas()
+    test_compara_reglas_vigentes_con_hipoteticas()
+    print("✅ Simulación de cambios de reglas funcionando")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Verifica las sugerencias en lote para transacciones sin categorizar:
+1. El autómata encuentra todas las palabras clave contenidas en un texto
+2. Las sugerencias en lote son iguales a sugerir fila por fila con el recorrido original
+3. Las filas se agrupan por categoría sugerida
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from utils.categorizar import compilar_reglas, definir_categorias, sugerir_categorias_lote
+
+
+def sugerir_recorrido_completo(detalle, categorias):
+    """Implementación original: recorre cada palabra clave de cada categoría"""
+    if not detalle:
+        return None
+    detalle_upper = detalle.upper()
+    sugerencias = []
+    for categoria, palabras_clave in categorias.items():
+        coincidencias = [palabra for palabra in palabras_clave if palabra in detalle_upper]
+        if coincidencias:
+            sugerencias.append({
+                'categoria': categoria,
+                'score': len(coincidencias) * 10 + sum(len(p) for p in coincidencias),
+                'palabras_encontradas': coincidencias,
+                'confianza': 'alta' if len(coincidencias) > 1 else 'media'
+            })
+    sugerencias.sort(key=lambda x: x['score'], reverse=True)
+    if not sugerencias:
+        return None
+    return {
+        'categoria_sugerida': sugerencias[0]['categoria'],
+        'confianza': sugerencias[0]['confianza'],
+        'palabras_encontradas': sugerencias[0]['palabras_encontradas'],
+        'score': sugerencias[0]['score']
+    }
+
+
+def generar_detalles(categorias, cantidad, semilla=5):
+    azar = random.Random(semilla)
+    vocabulario = [p for palabras in categorias.values() for p in palabras] + ['XYZ', 'SANTIAGO', '123']
+    return [' '.join(azar.choice(vocabulario) for _ in range(azar.randint(1, 4))).lower()
+            for _ in range(cantidad)]
+
+
+def test_buscar_todas_igual_a_contencion():
+    categorias = definir_categorias()
+    matcher = compilar_reglas(categorias).matcher
+
+    for detalle in generar_detalles(categorias, 300):
+        texto = detalle.upper()
+        esperado = [i for i, (_, palabra) in enumerate(matcher.patrones) if palabra in texto]
+        assert matcher.buscar_todas(texto) == esperado, detalle
+
+
+def test_lote_igual_a_fila_por_fila():
+    categorias = definir_categorias()
+    reglas = compilar_reglas(categorias)
+    detalles = generar_detalles(categorias, 500) * 2 + ['', None, 'XYZ SIN NADA']
+
+    lote = sugerir_categorias_lote(detalles, reglas=reglas)
+
+    assert lote['sugerencias'] == [sugerir_recorrido_completo(d, categorias) for d in detalles]
+    for categoria, posiciones in lote['por_categoria'].items():
+        assert all(lote['sugerencias'][p]['categoria_sugerida'] == categoria for p in posiciones)
+    total_agrupadas = sum(len(p) for p in lote['por_categoria'].values())
+    assert total_agrupadas == sum(1 for s in lote['sugerencias'] if s)
+
+
+if __name__ == "__main__":
+    test_buscar_todas_igual_a_contencion()
+    test_lote_igual_a_fila_por_fila()
+    print("✅ Sugerencias en lote equivalentes a las sugerencias por fila")
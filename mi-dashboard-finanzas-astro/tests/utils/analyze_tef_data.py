@@ -2,7 +2,20 @@
 import pandas as pd
 import os
 from utils.leer_excel import cargar_y_limpiar_tef_cartola
-from utils.categorizar import aplicar_categorizacion
+from utils.categorizar import categorizar_en_flujo
+
+
+def cargar_archivos_tef(data_dir, archivos_tef):
+    """Carga los archivos TEF de a uno, informando los que fallan"""
+    for archivo in archivos_tef:
+        print(f"\nProcesando: {archivo}")
+        try:
+            df = cargar_y_limpiar_tef_cartola(os.path.join(data_dir, archivo))
+            print(f"  - Transacciones: {len(df)}")
+            yield df
+        except Exception as e:
+            print(f"  - Error: {e}")
+
 
 def analizar_datos_tef():
     """Analiza los datos TEF reales para identificar transacciones sin categorizar"""
@@ -14,45 +27,41 @@ def analizar_datos_tef():
     print(f"=== ANÁLISIS DE DATOS TEF REALES ===\n")
     print(f"Archivos encontrados: {len(archivos_tef)}")
     
-    # Procesar todos los archivos TEF
-    df_total = pd.DataFrame()
+    # Procesar los archivos TEF en flujo: cada archivo se categoriza y se resume
+    # por separado, sin acumular todas las transacciones en un solo DataFrame
+    total = 0
+    fecha_min = fecha_max = None
+    categorias = pd.Series(dtype='int64')
+    por_tipo = pd.DataFrame(columns=['cantidad', 'monto'])
+    sin_categorizar = []
     
-    for archivo in archivos_tef:
-        print(f"\nProcesando: {archivo}")
-        ruta_archivo = os.path.join(data_dir, archivo)
-        
-        try:
-            # Cargar y limpiar datos TEF
-            df = cargar_y_limpiar_tef_cartola(ruta_archivo)
-            print(f"  - Transacciones: {len(df)}")
-            
-            # Aplicar categorización
-            df = aplicar_categorizacion(df)
-            
-            # Agregar al DataFrame total
-            df_total = pd.concat([df_total, df], ignore_index=True)
-            
-        except Exception as e:
-            print(f"  - Error: {e}")
+    for df in categorizar_en_flujo(cargar_archivos_tef(data_dir, archivos_tef)):
+        total += len(df)
+        fecha_min = min(df['fecha'].min(), fecha_min) if fecha_min is not None else df['fecha'].min()
+        fecha_max = max(df['fecha'].max(), fecha_max) if fecha_max is not None else df['fecha'].max()
+        categorias = categorias.add(df['categoria'].value_counts(), fill_value=0)
+        resumen_tipo = df.groupby('tipo')['monto'].agg(cantidad='size', monto='sum')
+        por_tipo = por_tipo.add(resumen_tipo, fill_value=0)
+        sin_categorizar.append(df.loc[df['categoria'] == 'Sin categorizar', ['detalle', 'nombre_destino', 'comentario']])
     
-    if df_total.empty:
+    if total == 0:
         print("No se pudieron procesar datos")
         return
     
     print(f"\n=== RESUMEN TOTAL ===")
-    print(f"Total transacciones: {len(df_total)}")
-    print(f"Rango de fechas: {df_total['fecha'].min()} a {df_total['fecha'].max()}")
+    print(f"Total transacciones: {total}")
+    print(f"Rango de fechas: {fecha_min} a {fecha_max}")
     
     # Analizar categorización
     print(f"\n=== ANÁLISIS DE CATEGORIZACIÓN ===")
-    categorias = df_total['categoria'].value_counts()
+    categorias = categorias.astype(int).sort_values(ascending=False)
     print("Distribución por categorías:")
     for categoria, cantidad in categorias.items():
-        porcentaje = (cantidad / len(df_total)) * 100
+        porcentaje = (cantidad / total) * 100
         print(f"  {categoria}: {cantidad} ({porcentaje:.1f}%)")
     
-    # Analizar transacciones sin categorizar
-    sin_categorizar = df_total[df_total['categoria'] == 'Sin categorizar']
+    # Analizar transacciones sin categorizar (solo se conservan esas filas)
+    sin_categorizar = pd.concat(sin_categorizar, ignore_index=True)
     
     if len(sin_categorizar) > 0:
         print(f"\n=== TRANSACCIONES SIN CATEGORIZAR ({len(sin_categorizar)}) ===")
@@ -77,13 +86,17 @@ def analizar_datos_tef():
     
     # Análisis por tipo de transacción
     print(f"\n=== ANÁLISIS POR TIPO ===")
-    tipos = df_total['tipo'].value_counts()
-    for tipo, cantidad in tipos.items():
-        porcentaje = (cantidad / len(df_total)) * 100
-        monto_total = df_total[df_total['tipo'] == tipo]['monto'].sum()
-        print(f"  {tipo}: {cantidad} transacciones ({porcentaje:.1f}%) - Total: ${monto_total:,.0f}")
+    for tipo, fila in por_tipo.sort_values('cantidad', ascending=False).iterrows():
+        cantidad = int(fila['cantidad'])
+        porcentaje = (cantidad / total) * 100
+        print(f"  {tipo}: {cantidad} transacciones ({porcentaje:.1f}%) - Total: ${fila['monto']:,.0f}")
     
-    return df_total
+    return {
+        'total': total,
+        'categorias': categorias,
+        'por_tipo': por_tipo,
+        'sin_categorizar': sin_categorizar
+    }
 
 if __name__ == "__main__":
     analizar_datos_tef()